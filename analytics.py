@@ -0,0 +1,286 @@
+"""
+Whole-history analytics over player valuations, read from a columnar Parquet snapshot.
+
+load_data.py writes the snapshot next to the SQLite database after every load that changes
+player_valuations: one hive partition per season (season=2023/ holds 2023/24, July to June),
+rows ordered by competition inside each season so row-group statistics can skip competitions.
+The query functions read only the columns they aggregate (column pruning) and hand their season
+and competition filters to the Parquet reader (predicate pushdown: whole partitions and row
+groups are skipped without being decoded).
+
+pyarrow is optional. Without it, or before a snapshot has been written, the same functions
+answer from SQLite, which scans the row-oriented table instead.
+"""
+import json
+import os
+import shutil
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+
+# pyarrow is optional: only the Parquet snapshot and the 'parquet' backend need it
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# --- Configuration ---
+DATABASE = os.environ.get('TRANSFERMARKT_DB', 'transfermarkt_data.db')
+SNAPSHOT_DIR = "analytics_snapshot" # Parquet datasets, one subdirectory each
+VALUATIONS_DATASET = "player_valuations"
+SNAPSHOT_BATCH_ROWS = 200_000 # Rows fetched from SQLite per record batch while writing
+SNAPSHOT_ROW_GROUP_ROWS = 64 * 1024 # Smaller groups let competition filters skip more of a season
+BACKENDS = ('parquet', 'sqlite')
+# Lower bounds of the value_distribution buckets, in EUR; the last bucket is open-ended
+VALUE_BUCKET_EDGES = (0, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000, 25_000_000, 50_000_000, 100_000_000)
+
+LEAGUE_COLUMN = "player_club_domestic_competition_id"
+# Season a 'YYYY-MM-DD' date belongs to, named by its starting year (European seasons start in July)
+SEASON_SQL = "(CAST(substr(date, 1, 4) AS INTEGER) - (CAST(substr(date, 6, 2) AS INTEGER) < 7))"
+
+
+def snapshot_path(snapshot_dir=SNAPSHOT_DIR, dataset=VALUATIONS_DATASET):
+    return os.path.join(snapshot_dir, dataset)
+
+
+def snapshot_available(snapshot_dir=SNAPSHOT_DIR):
+    """True when the Parquet backend can be used: pyarrow is installed and a snapshot was written."""
+    return PYARROW_AVAILABLE and os.path.isdir(snapshot_path(snapshot_dir))
+
+
+def _valuation_schema():
+    """Columns of the snapshot files; season is not stored in them, it is the partition directory."""
+    return pa.schema([
+        ("player_id", pa.int64()),
+        ("date", pa.date32()),
+        ("market_value_in_eur", pa.int64()),
+        ("current_club_id", pa.int64()),
+        (LEAGUE_COLUMN, pa.string()),
+    ])
+
+
+def season_of(day):
+    """Season (starting year) of a 'YYYY-MM-DD' date, as SEASON_SQL computes it."""
+    return int(day[:4]) - (int(day[5:7]) < 7)
+
+
+def _season_bounds(season):
+    """[start, end) of a season as 'YYYY-MM-DD' text, which the date index can range-scan."""
+    return f"{season:04d}-07-01", f"{season + 1:04d}-07-01"
+
+
+def _season_batches(conn, schema, seasons=None):
+    """
+    Reads player_valuations (rows with a date; only `seasons` when given) in one pass, in table
+    order, and returns {season: [record batches]}. Sorting in SQLite would double the read time;
+    the columnar batches are compact enough (~35 bytes a row) to sort per season in Arrow instead.
+    """
+    where, args = "date IS NOT NULL", ()
+    if seasons is not None:
+        where += " AND date >= ? AND date < ?" # Index range; seasons in between are dropped below
+        args = (_season_bounds(min(seasons))[0], _season_bounds(max(seasons))[1])
+    cursor = conn.execute(f"""
+        SELECT player_id, date, market_value_in_eur, current_club_id, {LEAGUE_COLUMN}
+        FROM player_valuations
+        WHERE {where}
+    """, args)
+    by_season = {}
+    while True:
+        rows = cursor.fetchmany(SNAPSHOT_BATCH_ROWS)
+        if not rows:
+            return by_season
+        player_ids, dates, values, club_ids, leagues = zip(*rows)
+        dates = pc.strptime(pa.array(dates, pa.string()), format="%Y-%m-%d", unit="s", error_is_null=True)
+        dates = dates.cast(pa.date32())
+        # SEASON_SQL, computed here: per-row SQL expressions slow the read down by a third
+        row_seasons = pc.subtract(pc.year(dates), pc.less(pc.month(dates), 7).cast(pa.int64()))
+        batch = pa.RecordBatch.from_arrays([
+            pa.array(player_ids, pa.int64()),
+            dates,
+            pa.array(values, pa.int64()),
+            pa.array(club_ids, pa.int64()),
+            pa.array(leagues, pa.string()),
+        ], schema=schema)
+        for season in pc.unique(row_seasons).to_pylist():
+            if season is not None and (seasons is None or season in seasons): # None: unparseable date
+                by_season.setdefault(season, []).append(batch.filter(pc.equal(row_seasons, season)))
+
+
+def write_valuations_snapshot(conn, snapshot_dir=SNAPSHOT_DIR, seasons=None):
+    """
+    Writes player_valuations from `conn` as a season-partitioned Parquet dataset under snapshot_dir.
+    With `seasons`, only those partitions are rewritten (an incremental load only touches recent
+    seasons), provided a snapshot exists to patch. The new files are written to a scratch
+    directory first and then moved into place, so a reader sees either the old or the new
+    version of each season.
+    Returns True on success.
+    """
+    if not PYARROW_AVAILABLE:
+        print("pyarrow is not installed; skipping the Parquet snapshot (pip install pyarrow).")
+        return False
+    target = snapshot_path(snapshot_dir)
+    scratch = target + ".new"
+    if not os.path.isdir(target):
+        seasons = None # Nothing to patch yet
+    label = "all seasons" if seasons is None else "seasons " + ", ".join(str(s) for s in sorted(seasons))
+    print(f"Writing Parquet snapshot of player_valuations ({label}) to {target}...")
+    try:
+        shutil.rmtree(scratch, ignore_errors=True)
+        os.makedirs(scratch)
+        schema = _valuation_schema()
+        by_season = _season_batches(conn, schema, seasons)
+        written = 0
+        for season in sorted(by_season):
+            # Ordered by competition, so each row group's statistics cover few competitions
+            table = pa.Table.from_batches(by_season.pop(season), schema).sort_by([(LEAGUE_COLUMN, "ascending")])
+            partition = os.path.join(scratch, f"season={season}")
+            os.makedirs(partition)
+            pq.write_table(table, os.path.join(partition, "part-0.parquet"),
+                           row_group_size=SNAPSHOT_ROW_GROUP_ROWS, compression="zstd")
+            written += table.num_rows
+        # Each swap moves the old version aside, moves the new one into place and only then
+        # deletes the old one, so the gap a reader can fall into is two renames long
+        previous = target + ".old"
+        shutil.rmtree(previous, ignore_errors=True) # Left behind if an earlier swap was interrupted
+        if seasons is None:
+            if os.path.isdir(target):
+                os.rename(target, previous)
+            os.rename(scratch, target)
+        else:
+            os.makedirs(previous)
+            for partition in sorted(os.listdir(scratch)):
+                destination = os.path.join(target, partition)
+                if os.path.isdir(destination):
+                    os.rename(destination, os.path.join(previous, partition))
+                os.rename(os.path.join(scratch, partition), destination)
+            shutil.rmtree(scratch, ignore_errors=True)
+        shutil.rmtree(previous, ignore_errors=True)
+        print(f"Parquet snapshot written: {written} rows, {len(os.listdir(target))} season partitions.")
+        return True
+    except (OSError, sqlite3.Error, pa.ArrowException) as e:
+        print(f"Error writing the Parquet snapshot: {e}")
+        shutil.rmtree(scratch, ignore_errors=True)
+        return False
+
+
+# --- Queries ---
+def _resolve_backend(backend, snapshot_dir):
+    if backend is None:
+        return 'parquet' if snapshot_available(snapshot_dir) else 'sqlite'
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}; choose from {list(BACKENDS)}")
+    if backend == 'parquet' and not snapshot_available(snapshot_dir):
+        raise RuntimeError(f"No Parquet snapshot at {snapshot_path(snapshot_dir)} (or pyarrow is not installed)")
+    return backend
+
+
+def _connect(database):
+    # Built like api.py's pool URIs, so paths containing '?', '#' or spaces are escaped
+    return sqlite3.connect(f"{Path(os.path.abspath(database)).as_uri()}?mode=ro", uri=True)
+
+
+def _dataset_filter(seasons, leagues, *extra):
+    """Pushdown filter: seasons prune partitions, competitions prune row groups by their statistics."""
+    conditions = list(extra)
+    if seasons is not None:
+        conditions.append(ds.field("season").isin(list(seasons)))
+    if leagues is not None:
+        conditions.append(ds.field(LEAGUE_COLUMN).isin(list(leagues)))
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def _sql_filter(seasons, leagues):
+    where, args = "date IS NOT NULL", []
+    if seasons is not None:
+        where += f" AND {SEASON_SQL} IN (SELECT value FROM json_each(?))"
+        args.append(json.dumps(list(seasons)))
+    if leagues is not None:
+        where += f" AND {LEAGUE_COLUMN} IN (SELECT value FROM json_each(?))"
+        args.append(json.dumps(list(leagues)))
+    return where, args
+
+
+def league_value_trends(seasons=None, leagues=None, backend=None, database=DATABASE, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Market value trend per season and competition: valued players, valuations, mean and highest
+    value. Optionally restricted to some seasons (starting years) and competition ids.
+    Returns a list of dicts ordered by season, then competition.
+    """
+    if _resolve_backend(backend, snapshot_dir) == 'parquet':
+        dataset = ds.dataset(snapshot_path(snapshot_dir), format="parquet", partitioning="hive")
+        table = dataset.to_table(columns=["season", LEAGUE_COLUMN, "player_id", "market_value_in_eur"],
+                                 filter=_dataset_filter(seasons, leagues))
+        grouped = table.group_by(["season", LEAGUE_COLUMN]).aggregate([
+            ("player_id", "count_distinct"),
+            ("market_value_in_eur", "count"),
+            ("market_value_in_eur", "mean"),
+            ("market_value_in_eur", "max"),
+        ])
+        rows = [(row["season"], row[LEAGUE_COLUMN], row["player_id_count_distinct"], row["market_value_in_eur_count"],
+                 row["market_value_in_eur_mean"], row["market_value_in_eur_max"]) for row in grouped.to_pylist()]
+    else:
+        where, args = _sql_filter(seasons, leagues)
+        conn = _connect(database)
+        try:
+            rows = conn.execute(f"""
+                SELECT {SEASON_SQL} AS season, {LEAGUE_COLUMN}, COUNT(DISTINCT player_id),
+                       COUNT(market_value_in_eur), AVG(market_value_in_eur), MAX(market_value_in_eur)
+                FROM player_valuations
+                WHERE {where}
+                GROUP BY season, {LEAGUE_COLUMN}
+            """, args).fetchall()
+        finally:
+            conn.close()
+
+    trends = [{
+        'season': season,
+        'league_id': league_id,
+        'players': players,
+        'valuations': valuations,
+        'mean_value_eur': round(mean) if mean is not None else None,
+        'max_value_eur': highest,
+    } for season, league_id, players, valuations, mean, highest in rows]
+    return sorted(trends, key=lambda trend: (trend['season'], trend['league_id'] or ''))
+
+
+def value_distribution(seasons=None, leagues=None, edges=VALUE_BUCKET_EDGES, backend=None, database=DATABASE,
+                       snapshot_dir=SNAPSHOT_DIR):
+    """
+    Histogram of valuations by market value: one {'min_eur', 'max_eur', 'valuations'} bucket per
+    edge (max_eur is exclusive, None for the last bucket). Same filters as league_value_trends.
+    """
+    edges = sorted(edges)
+    if _resolve_backend(backend, snapshot_dir) == 'parquet':
+        dataset = ds.dataset(snapshot_path(snapshot_dir), format="parquet", partitioning="hive")
+        table = dataset.to_table(columns=["market_value_in_eur"],
+                                 filter=_dataset_filter(seasons, leagues, ds.field("market_value_in_eur").is_valid()))
+        values = table.column("market_value_in_eur").to_numpy()
+        buckets = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, None)
+        counts = np.bincount(buckets, minlength=len(edges)).tolist()
+    else:
+        where, args = _sql_filter(seasons, leagues)
+        bucket_sql = " ".join(f"WHEN market_value_in_eur >= {int(edge)} THEN {i}"
+                              for i, edge in reversed(list(enumerate(edges))))
+        conn = _connect(database)
+        try:
+            counts = [0] * len(edges)
+            for bucket, count in conn.execute(f"""
+                SELECT CASE {bucket_sql} ELSE 0 END AS bucket, COUNT(*)
+                FROM player_valuations
+                WHERE {where} AND market_value_in_eur IS NOT NULL
+                GROUP BY bucket
+            """, args):
+                counts[bucket] += count
+        finally:
+            conn.close()
+
+    upper = list(edges[1:]) + [None]
+    return [{'min_eur': low, 'max_eur': high, 'valuations': count} for low, high, count in zip(edges, upper, counts)]
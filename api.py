@@ -1,35 +1,373 @@
+import base64
+import json
+import logging
+import os
+import queue
 import sqlite3
-from flask import Flask, jsonify, request
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date
+from functools import wraps
+from pathlib import Path
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS # Import CORS
+import instrumentation
+from player_search import NAMES_TABLE, SEARCH_INDEX_ROWS, SEARCH_PROBE_ROWS, fold_name, name_match_tiers
+from timeseries import BUCKET_PERIODS, bucket_last, lttb
 
 # --- Configuration ---
-DATABASE = 'transfermarkt_data.db'
+DATABASE = os.environ.get('TRANSFERMARKT_DB', 'transfermarkt_data.db') # Override e.g. for wsgi.py / load tests
+DB_POOL_SIZE = 16 # Idle read-only connections kept open per process (extra ones are opened on demand)
+SQLITE_CACHE_SIZE_KIB = 64 * 1024 # Page cache per connection (PRAGMA cache_size, in KiB)
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024 # Bytes of the DB file memory-mapped per connection (PRAGMA mmap_size)
+RESPONSE_CACHE_MAX_ENTRIES = 2048 # Cached JSON bodies kept per process (least recently used are evicted)
+RESPONSE_CACHE_TTL_SECONDS = 600 # Upper bound on an entry's age, even if the data version never moves
+DATA_VERSION_CHECK_INTERVAL = 1.0 # Seconds between reads of the data_version stamp written by the loaders
+STREAM_CHUNK_ROWS = 500 # NDJSON rows serialized per chunk written to the client
+MAX_BATCH_IDS = 500 # Player ids accepted by one /api/players/batch call
+SQLITE_MIN_INTEGER, SQLITE_MAX_INTEGER = -2 ** 63, 2 ** 63 - 1 # Larger ids would reach SQLite as REALs
+BATCH_FIELDS = ('details', 'latest_value', 'valuations', 'form') # Selectable per-player sections
+DEFAULT_BATCH_FIELDS = ('details', 'latest_value')
+VALUATION_SHAPES = ('rows', 'columns') # ?shape= for /valuations: list of objects (default) or parallel arrays
+
+log = logging.getLogger("api") # Per-request messages are DEBUG; timings and slow queries go through instrumentation.py
 
 # --- Flask App Setup ---
 app = Flask(__name__)
-CORS(app) # Enable CORS for all routes by default
+CORS(app, expose_headers=['X-Next-Cursor', 'X-Cache', 'ETag']) # Enable CORS for all routes by default; let browsers read the paging header
+instrumentation.install(app) # Request/SQL/serialization timings, slow-query log, /metrics
+
+# --- Database Connection Pool ---
+class ConnectionPool:
+    """
+    Process-wide pool of read-only SQLite connections.
+    Connections are opened once, tuned with cache/mmap pragmas and handed out to whichever
+    thread serves a request, so schema parsing and page-cache warm-up are paid once per
+    connection instead of once per request. A pool created before a fork (e.g. by a
+    pre-forking WSGI server) is discarded in the child and rebuilt lazily.
+    """
+    def __init__(self, database, size=DB_POOL_SIZE):
+        self.database = database
+        self.size = size
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue(maxsize=size) # LIFO keeps the warmest connections in use
+        self._wal_checked = False
+        self._lock = threading.Lock()
+
+    def _ensure_wal_mode(self):
+        """Switches the database to WAL once, so readers never block on (or block) the loaders."""
+        with self._lock:
+            if self._wal_checked:
+                return
+            self._wal_checked = True
+            try:
+                conn = sqlite3.connect(self.database)
+                try:
+                    conn.execute("PRAGMA journal_mode=WAL;")
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                log.warning(f"Could not enable WAL mode on {self.database}: {e}")
+
+    def _open(self):
+        self._ensure_wal_mode()
+        uri = f"{Path(os.path.abspath(self.database)).as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row # Return rows as dict-like objects
+        conn.execute(f"PRAGMA cache_size = -{int(SQLITE_CACHE_SIZE_KIB)};")
+        conn.execute(f"PRAGMA mmap_size = {int(SQLITE_MMAP_SIZE)};")
+        conn.execute("PRAGMA temp_store = MEMORY;")
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._open()
+
+    def release(self, conn, discard=False):
+        if discard:
+            conn.close()
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def idle_count(self):
+        """Connections currently waiting in the pool (approximate while other threads acquire and release)."""
+        return self._idle.qsize()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Returns this process's connection pool, (re)creating it after a fork or a DATABASE change."""
+    global _pool
+    pool = _pool
+    if pool is None or pool._pid != os.getpid() or pool.database != DATABASE:
+        with _pool_lock:
+            if _pool is None or _pool._pid != os.getpid() or _pool.database != DATABASE:
+                _pool = ConnectionPool(DATABASE)
+            pool = _pool
+    return pool
+
+@contextmanager
+def read_connection():
+    """Borrows a pooled read-only connection; connections that hit an error are discarded, not reused."""
+    pool = get_pool()
+    conn = pool.acquire()
+    failed = False
+    try:
+        yield conn
+    except sqlite3.Error:
+        failed = True
+        raise
+    finally:
+        pool.release(conn, discard=failed)
 
 # --- Database Helper Function ---
 def query_db(query, args=(), one=False):
-    """ Queries the database and returns results as a list of dicts. """
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row # Return rows as dict-like objects
-    cur = conn.cursor()
+    """ Queries the database (read-only, pooled connection) and returns results as a list of dicts. """
     try:
-        cur.execute(query, args)
-        rv = cur.fetchall()
-        conn.close()
+        with read_connection() as conn:
+            started = time.perf_counter() if instrumentation.ENABLED else None
+            rv = conn.execute(query, args).fetchall()
+            if started is not None:
+                instrumentation.record_query(conn, query, args, time.perf_counter() - started, len(rv))
         # Convert Row objects to dictionaries
         results = [dict(row) for row in rv]
         return (results[0] if results else None) if one else results
     except sqlite3.Error as e:
-        print(f"Database error: {e}")
-        conn.close()
+        log.error(f"Database error: {e}")
         return None # Or raise an exception
     except Exception as e:
-        print(f"Error in query_db: {e}")
-        conn.close()
+        log.error(f"Error in query_db: {e}")
+        return None
+
+# --- Response Cache ---
+class ResponseCache:
+    """
+    Bounded LRU + TTL cache of pre-serialized JSON response bodies.
+    Entries are tagged with the data_version stamp that load_data.py / update_player_form.py bump
+    after writing; once the stamp moves, every older entry is treated as a miss. The stamp is
+    re-read at most every `version_check_interval` seconds, so a hit normally costs no SQLite
+    access at all. Without a data_version table (older databases) only the TTL applies.
+    """
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, ttl=RESPONSE_CACHE_TTL_SECONDS,
+                 version_check_interval=DATA_VERSION_CHECK_INTERVAL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self._entries = OrderedDict() # key -> (data_version, expires_at, body)
+        self._lock = threading.Lock()
+        self._database = None
+        self._version = None
+        self._version_checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _read_data_version(self):
+        try:
+            with read_connection() as conn:
+                row = conn.execute("SELECT version FROM data_version WHERE id = 1;").fetchone()
+            return row[0] if row else None
+        except sqlite3.Error:
+            return None # No stamp table yet
+
+    def current_version(self):
+        """Returns the data version, re-reading it once the check interval has passed."""
+        now = time.monotonic()
+        with self._lock:
+            if self._database == DATABASE and now - self._version_checked_at < self.version_check_interval:
+                return self._version
+        version = self._read_data_version()
+        with self._lock:
+            if self._database != DATABASE:
+                self._entries.clear() # Pointed at another database: nothing cached applies
+                self._database = DATABASE
+            elif version != self._version and self._entries:
+                self.invalidations += 1
+                self._entries.clear()
+            self._version = version
+            self._version_checked_at = now
+        return version
+
+    def get(self, key):
+        """Returns the cached value for key, or None on a miss (absent, expired or from an older data version)."""
+        version = self.current_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key, value, version):
+        with self._lock:
+            if version != self._version:
+                return # The data changed while this value was being built
+            self._entries[key] = (version, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version_checked_at = 0.0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'data_version': self._version,
+            }
+
+response_cache = ResponseCache()
+
+def cached_response(view=None, *, vary=None):
+    """
+    Serves a GET endpoint from response_cache, keyed by path and the decoded query arguments (as a
+    tuple, so an escaped '&' or '=' inside a value can't collide with a different query). `vary`,
+    if given, returns more key parts for responses that depend on something else (e.g. the date).
+    Only complete 200 responses are stored (body plus the X-Next-Cursor paging header and the
+    ETag, so hits don't rehash the body); errors, 404s and streamed responses always go through
+    to the handler.
+    """
+    if view is None:
+        return lambda view: cached_response(view, vary=vary)
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = (request.path, tuple(sorted(request.args.items(multi=True))))
+        if vary is not None:
+            key += (vary(),)
+        version = response_cache.current_version()
+        cached = response_cache.get(key)
+        if cached is not None:
+            body, headers = cached
+            return Response(body, mimetype='application/json', headers={**headers, 'X-Cache': 'HIT'})
+        response = app.make_response(view(*args, **kwargs))
+        if response.status_code == 200 and not response.is_streamed:
+            response.add_etag()
+            headers = {name: response.headers[name] for name in ('X-Next-Cursor', 'ETag') if name in response.headers}
+            response_cache.put(key, (response.get_data(), headers), version)
+        response.headers['X-Cache'] = 'MISS'
+        return response
+    return wrapper
+
+def conditional_response(view):
+    """
+    Adds a strong ETag (hash of the body) to complete 200 responses and answers a matching
+    If-None-Match with an empty 304, so a client re-opening the same chart or page revalidates
+    instead of downloading it again. Cache-Control: no-cache makes browsers ask every time, which
+    keeps them current after a data reload. Place it above @cached_response, which stores the ETag.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        response = app.make_response(view(*args, **kwargs))
+        if response.status_code != 200 or response.is_streamed:
+            return response
+        response.add_etag() # No-op when cached_response already set one
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+    return wrapper
+
+# --- Pagination and Streaming ---
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(kind, values):
+    """Opaque keyset cursor: the sort key of the last row returned, tagged with the ordering it belongs to."""
+    raw = json.dumps([kind, *values], separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(token, kind, length):
+    """Inverse of encode_cursor; raises InvalidCursor for tampered tokens or cursors from another ordering."""
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Malformed cursor: {e}")
+    if not isinstance(decoded, list) or len(decoded) != length + 1 or decoded[0] != kind:
+        raise InvalidCursor("Cursor does not belong to this listing")
+    # Only scalars SQLite can bind; a nested list or object would otherwise fail in the query as a 500
+    if not all(value is None or isinstance(value, (str, int, float)) for value in decoded[1:]):
+        raise InvalidCursor("Cursor values must be strings, numbers or null")
+    return decoded[1:]
+
+def _public(row):
+    """Drops the underscore-prefixed sort-key columns that only exist to build the next cursor."""
+    return {k: v for k, v in row.items() if not k.startswith('_')}
+
+def stream_ndjson(query, args=(), endpoint=None):
+    """
+    Yields newline-delimited JSON, one object per row, as SQLite produces the rows.
+    The pooled connection is held until the client has consumed (or abandoned) the stream, and
+    no full result list is ever built, so memory stays flat for exports of any size.
+    The generator runs after the view has returned, so the endpoint label for the SQL timing is
+    passed in rather than read from the request.
+    """
+    with read_connection() as conn:
+        sql_seconds = 0.0
+        row_count = 0
+        started = time.perf_counter()
+        cursor = conn.execute(query, args)
+        while True:
+            rows = cursor.fetchmany(STREAM_CHUNK_ROWS)
+            sql_seconds += time.perf_counter() - started
+            if not rows:
+                break
+            row_count += len(rows)
+            yield "".join(json.dumps(_public(dict(row)), ensure_ascii=False) + "\n" for row in rows)
+            started = time.perf_counter() # Time spent waiting on the client isn't SQL time
+        if instrumentation.ENABLED:
+            instrumentation.record_query(conn, query, args, sql_seconds, row_count, endpoint=endpoint)
+
+def paginated_response(query, params, limit, cursor_kind, cursor_columns):
+    """
+    Runs a keyset-paginated list query (which must end in LIMIT :limit) and returns the response.
+    ?format=ndjson streams every row up to `limit`; otherwise one extra row is fetched to decide
+    whether to send X-Next-Cursor, built from the last row's `cursor_columns`. `limit` must be at
+    least 1; the endpoints answer smaller values with a 400.
+    """
+    if request.args.get('format') == 'ndjson':
+        params['limit'] = limit
+        return Response(stream_ndjson(query, params, endpoint=request.endpoint), mimetype='application/x-ndjson')
+
+    params['limit'] = limit + 1
+    rows = query_db(query, args=params)
+    if rows is None:
         return None
+    response = jsonify([_public(row) for row in rows[:limit]])
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        response.headers['X-Next-Cursor'] = encode_cursor(cursor_kind, [last[column] for column in cursor_columns])
+    return response
 
 # --- API Endpoints ---
 @app.route('/')
@@ -37,22 +375,40 @@ def index():
     return "Welcome to the Transfermarkt Data API! Try /api/leagues or /api/players/search"
 
 @app.route('/api/leagues', methods=['GET'])
+@conditional_response
+@cached_response
 def get_leagues():
     """ Endpoint to fetch all leagues. """
-    print("Received request for /api/leagues")
+    log.debug("Received request for /api/leagues")
     leagues = query_db("SELECT competition_id AS league_id, name, country_name AS country FROM leagues ORDER BY name")
     if leagues is not None:
-        print(f"Found {len(leagues)} leagues.")
+        log.debug(f"Found {len(leagues)} leagues.")
         return jsonify(leagues)
     else:
-        print("Failed to fetch leagues from database.")
+        log.error("Failed to fetch leagues from database.")
         return jsonify({"error": "Failed to fetch leagues"}), 500
 
 @app.route('/api/players/<int:player_id>/valuations', methods=['GET'])
+@conditional_response
+@cached_response
 def get_player_valuations(player_id):
-    """ Endpoint to fetch historical valuations for a specific player. """
-    print(f"Received request for valuations for player_id: {player_id}")
-    
+    """
+    Endpoint to fetch historical valuations for a specific player.
+    Optional, for charts: ?bucket=month|quarter|year keeps the last valuation of each period,
+    ?points=N thins the series to N points with LTTB (peaks and drops are kept), and
+    ?shape=columns returns {"date": [...], "market_value_in_eur": [...]} instead of one object per row.
+    """
+    log.debug(f"Received request for valuations for player_id: {player_id}")
+    points = request.args.get('points', type=int) # e.g., ?points=100
+    bucket = request.args.get('bucket')           # e.g., ?bucket=month
+    shape = request.args.get('shape', default='rows')
+    if 'points' in request.args and (points is None or points < 2):
+        return jsonify({"error": "points must be an integer of at least 2"}), 400
+    if bucket is not None and bucket not in BUCKET_PERIODS:
+        return jsonify({"error": f"bucket must be one of {list(BUCKET_PERIODS)}"}), 400
+    if shape not in VALUATION_SHAPES:
+        return jsonify({"error": f"shape must be one of {list(VALUATION_SHAPES)}"}), 400
+
     # Query to get date and market value, ordered by date
     query = """
         SELECT 
@@ -67,25 +423,97 @@ def get_player_valuations(player_id):
     
     if valuations is not None:
         # If query ran but found no valuations for this player, return empty list
-        print(f"Found {len(valuations)} valuation records for player_id: {player_id}.")
+        log.debug(f"Found {len(valuations)} valuation records for player_id: {player_id}.")
+        if bucket is not None:
+            valuations = bucket_last(valuations, bucket)
+        if points is not None:
+            valuations = lttb(valuations, points)
+        if shape == 'columns':
+            return jsonify({"date": [row['date'] for row in valuations],
+                            "market_value_in_eur": [row['market_value_in_eur'] for row in valuations]})
         return jsonify(valuations) 
     else:
         # This branch is hit if query_db itself returned None (database error)
-        print(f"Failed to fetch valuations for player_id: {player_id} from database.")
+        log.error(f"Failed to fetch valuations for player_id: {player_id} from database.")
         return jsonify({"error": "Failed to fetch player valuations"}), 500
 
+def _name_search_candidates(folded, joins, where, params, wanted, after=None):
+    """
+    Returns up to `wanted` [rank, name_folded, player_id] name matches in (rank, name, id) order,
+    after the (rank, name, id) cursor `after` if given, or None on a database error.
+    The tiers of name_match_tiers are queried best first, each only for what the page still
+    needs. A tier backed by an index first reads at most SEARCH_INDEX_ROWS ids from it: when that
+    is all of them, only those names are sorted. Otherwise its matches are common, and the next
+    SEARCH_PROBE_ROWS names read in order fill the page; the unbounded index lookup is left for
+    when the other filters make them rare again. `joins`/`where`/`params` carry those filters
+    (e.g. the league) against alias s.
+    """
+    tiers, name_params = name_match_tiers(folded)
+    candidates = []
+    for rank, match_sql, ids_sql in tiers:
+        if len(candidates) >= wanted:
+            break
+        if after is not None and rank < after[0]:
+            continue # Tiers the cursor has already paged past
+        tier_params = dict(params, **name_params, tier_limit=wanted - len(candidates))
+        after_sql = ""
+        if after is not None and rank == after[0]:
+            after_sql = " AND (s.name_folded, s.player_id) > (:after_name, :after_id)"
+            tier_params['after_name'], tier_params['after_id'] = after[1], after[2]
+
+        def tier_query(source, restrict):
+            return (f"SELECT {rank} AS match_rank, s.player_id, s.name_folded FROM {source} s{joins}{where}"
+                    f"{match_sql}{restrict} ORDER BY s.name_folded, s.player_id LIMIT :tier_limit")
+        if not ids_sql:
+            rows = query_db(tier_query(NAMES_TABLE, after_sql), tier_params)
+        else:
+            ids = query_db(f"{ids_sql} LIMIT {SEARCH_INDEX_ROWS}", tier_params)
+            if ids is None:
+                return None
+            rows = None
+            if len(ids) < SEARCH_INDEX_ROWS:
+                # Every match is in hand: rank just those names
+                tier_params['ids'] = json.dumps([row['player_id'] for row in ids])
+                rows = query_db(tier_query(NAMES_TABLE, " AND s.player_id IN (SELECT value FROM json_each(:ids))" + after_sql),
+                                tier_params)
+            else:
+                # Names in order, up to the name SEARCH_PROBE_ROWS further on (an index-only skip):
+                # matches that are common fill the page early in that range
+                probe_end = query_db(f"SELECT name_folded FROM {NAMES_TABLE} s WHERE 1=1{after_sql}"
+                                     f" ORDER BY s.name_folded, s.player_id LIMIT 1 OFFSET {SEARCH_PROBE_ROWS}", tier_params)
+                if probe_end is None:
+                    return None
+                probe_sql = after_sql
+                if probe_end:
+                    probe_sql += " AND s.name_folded <= :probe_end"
+                    tier_params['probe_end'] = probe_end[0]['name_folded']
+                rows = query_db(tier_query(NAMES_TABLE, probe_sql), tier_params)
+                if rows is not None and probe_end and len(rows) < tier_params['tier_limit']:
+                    rows = query_db(tier_query(NAMES_TABLE, f" AND s.player_id IN ({ids_sql})" + after_sql), tier_params)
+        if rows is None:
+            return None
+        candidates += [[row['match_rank'], row['name_folded'], row['player_id']] for row in rows]
+    return candidates
+
 @app.route('/api/players/search', methods=['GET'])
 def search_players():
-    """ Endpoint to search/filter players. """
+    """
+    Endpoint to search/filter players.
+    Paged with keyset cursors: pass the X-Next-Cursor header of one page as ?cursor= to get the
+    next. ?format=ndjson streams the rows as newline-delimited JSON instead of one array.
+    """
     # Get query parameters
     league_id_filter = request.args.get('league') # e.g., ?league=GB1
     name_filter = request.args.get('name')       # e.g., ?name=Smith
     limit = request.args.get('limit', default=50, type=int) # Default limit
+    cursor = request.args.get('cursor')          # e.g., ?cursor=<X-Next-Cursor of the previous page>
 
-    print(f"Received player search request: league='{league_id_filter}', name='{name_filter}', limit={limit}")
+    log.debug(f"Received player search request: league='{league_id_filter}', name='{name_filter}', limit={limit}")
+    if limit < 1:
+        return jsonify({"error": "limit must be a positive integer"}), 400
 
-    # Base query
-    query = """
+    # Columns returned for each player
+    select = """
         SELECT
             p.player_id,
             p.name,
@@ -94,47 +522,73 @@ def search_players():
             p.date_of_birth, 
             c.name as club_name,
             c.domestic_competition_id as league_id,
-            -- Subquery to get the latest market value for each player
-            (SELECT pv.market_value_in_eur 
-             FROM player_valuations pv 
-             WHERE pv.player_id = p.player_id 
-             ORDER BY pv.date DESC 
-             LIMIT 1) as current_market_value_eur
-        FROM players p
+            -- Latest market value, precomputed by load_data.py (one indexed lookup per player)
+            cv.market_value_in_eur as current_market_value_eur
+    """
+    joins = """
         LEFT JOIN clubs c ON p.current_club_id = c.club_id
-        WHERE 1=1 
-    """ # Start with a condition that's always true
-    
-    params = []
+        LEFT JOIN player_current_value cv ON cv.player_id = p.player_id
+    """
+    where = " WHERE 1=1" # Start with a condition that's always true
+    params = {}
 
     # Add filters dynamically
     if league_id_filter:
-        query += " AND c.domestic_competition_id = ?"
-        params.append(league_id_filter)
-    
-    if name_filter:
-        query += " AND p.name LIKE ?"
-        params.append(f"%{name_filter}%") # Use wildcard for partial matches
+        where += " AND c.domestic_competition_id = :league"
+        params['league'] = league_id_filter
 
-    # Add ordering and limit
-    query += " ORDER BY p.name LIMIT ?"
-    params.append(limit)
+    try:
+        folded_name = fold_name(name_filter)
+        if folded_name:
+            # Accent/case-insensitive match through the player_search indexes (built by load_data.py),
+            # ranked exact, prefix, word prefix, anywhere. Only the page's candidates are looked up
+            # by rank tier; the display columns are joined in afterwards, for those rows only.
+            after = decode_cursor(cursor, 'rank', 3) if cursor else None
+            if after is not None and (not isinstance(after[0], int) or isinstance(after[0], bool)):
+                raise InvalidCursor("Cursor rank must be an integer")
+            joins_for_filter = " JOIN players p ON p.player_id = s.player_id LEFT JOIN clubs c ON p.current_club_id = c.club_id"
+            candidates = _name_search_candidates(folded_name, joins_for_filter if league_id_filter else "",
+                                                 where, params, limit + 1, after)
+            if candidates is None:
+                log.error("Failed to fetch player search candidates.")
+                return jsonify({"error": "Failed to search players"}), 500
+            params = {'candidates': json.dumps(candidates, ensure_ascii=False)}
+            query = (select + ", m.match_rank AS _match_rank, m.name_folded AS _name_folded"
+                     + " FROM (SELECT key AS position, json_extract(value, '$[0]') AS match_rank,"
+                     + " json_extract(value, '$[1]') AS name_folded, json_extract(value, '$[2]') AS player_id"
+                     + " FROM json_each(:candidates)) m JOIN players p ON p.player_id = m.player_id" + joins
+                     + " ORDER BY m.position LIMIT :limit")
+            cursor_kind, cursor_columns = 'rank', ('_match_rank', '_name_folded', 'player_id')
+        else:
+            if cursor:
+                params['after_name'], params['after_id'] = decode_cursor(cursor, 'name', 2)
+                if params['after_name'] is None: # Players without a name sort first
+                    where += " AND (p.name IS NOT NULL OR p.player_id > :after_id)"
+                else:
+                    where += " AND p.name >= :after_name AND (p.name > :after_name OR p.player_id > :after_id)"
+            # Add ordering and limit (player_id breaks ties between equal names, so pages never overlap)
+            query = select + " FROM players p" + joins + where + " ORDER BY p.name, p.player_id LIMIT :limit"
+            cursor_kind, cursor_columns = 'name', ('name', 'player_id')
+    except InvalidCursor as e:
+        log.warning(f"Rejected search cursor: {e}")
+        return jsonify({"error": "Invalid cursor"}), 400
 
-    print(f"Executing query: {query} with params: {params}")
-    players = query_db(query, args=params)
+    response = paginated_response(query, params, limit, cursor_kind, cursor_columns)
 
-    if players is not None:
+    if response is not None:
         # Could calculate age here if needed, or leave for frontend
-        print(f"Found {len(players)} players matching criteria.")
-        return jsonify(players)
+        log.debug("Player search response ready.")
+        return response
     else:
-        print("Failed to fetch players based on search criteria.")
+        log.error("Failed to fetch players based on search criteria.")
         return jsonify({"error": "Failed to search players"}), 500
 
 @app.route('/api/players/<int:player_id>', methods=['GET'])
+@conditional_response
+@cached_response
 def get_player_details(player_id):
     """ Endpoint to fetch details for a specific player. """
-    print(f"Received request for details for player_id: {player_id}")
+    log.debug(f"Received request for details for player_id: {player_id}")
 
     # Query to get player details, joining with club for club name
     query = """
@@ -147,31 +601,27 @@ def get_player_details(player_id):
             p.current_club_id,
             c.name as club_name,
             c.domestic_competition_id as league_id,
-             -- Optionally include latest market value here too if needed by the caller
-            (SELECT pv.market_value_in_eur 
-             FROM player_valuations pv 
-             WHERE pv.player_id = p.player_id 
-             ORDER BY pv.date DESC 
-             LIMIT 1) as current_market_value_eur
+            cv.market_value_in_eur as current_market_value_eur
         FROM players p
         LEFT JOIN clubs c ON p.current_club_id = c.club_id
+        LEFT JOIN player_current_value cv ON cv.player_id = p.player_id
         WHERE p.player_id = ?;
     """
     
     player_details = query_db(query, args=(player_id,), one=True) # Use one=True as we expect only one result
     
     if player_details:
-        print(f"Found details for player_id: {player_id}")
+        log.debug(f"Found details for player_id: {player_id}")
         return jsonify(player_details)
     else:
         # If query ran but found no player with that ID
-        print(f"Player details not found for player_id: {player_id}")
+        log.debug(f"Player details not found for player_id: {player_id}")
         return jsonify({"error": "Player not found"}), 404
 
 @app.route('/api/players/<int:player_id>/form', methods=['GET'])
 def get_player_form(player_id):
     """ Endpoint to fetch recent form data for a player from the database. """
-    print(f"Received request for form data for player_id: {player_id}")
+    log.debug(f"Received request for form data for player_id: {player_id}")
     
     # Query the pre-calculated form stats table
     query = """
@@ -188,62 +638,256 @@ def get_player_form(player_id):
     form_data = query_db(query, args=(player_id,), one=True) # Use one=True
     
     if form_data:
-        print(f"Found pre-calculated form data for player_id: {player_id}")
+        log.debug(f"Found pre-calculated form data for player_id: {player_id}")
         # Optionally format timestamp if needed, otherwise return as is
         # form_data['calculation_timestamp'] = form_data['calculation_timestamp'].isoformat() if form_data.get('calculation_timestamp') else None
         return jsonify(form_data)
     else:
         # If query ran but found no form data row for this player
-        print(f"No pre-calculated form data found for player_id: {player_id}")
+        log.debug(f"No pre-calculated form data found for player_id: {player_id}")
         return jsonify({"error": "Form data not available for this player"}), 404
 
-@app.route('/api/players/top', methods=['GET'])
-def get_top_players():
-    """ Endpoint to fetch top N players by current market value. """
-    limit = request.args.get('limit', default=10, type=int)
-    print(f"Received request for top {limit} players by market value.")
+def _parse_batch_request():
+    """
+    Reads ids/fields from a JSON body ({"ids": [...], "fields": [...]}) or the query string
+    (?ids=1,2,3&fields=details,valuations). Returns (ids, fields), ids de-duplicated in request order.
+    Raises ValueError with a client-facing message for bad input.
+    """
+    body = request.get_json(silent=True) if request.method == 'POST' else None
+    if body is not None:
+        if not isinstance(body, dict):
+            raise ValueError("Expected a JSON object with 'ids' and optional 'fields'")
+        raw_ids = body.get('ids') or []
+        raw_fields = body.get('fields') or list(DEFAULT_BATCH_FIELDS)
+    else:
+        raw_ids = [i for i in request.args.get('ids', '').split(',') if i.strip()]
+        raw_fields = [f for f in request.args.get('fields', '').split(',') if f.strip()] or list(DEFAULT_BATCH_FIELDS)
+    if not isinstance(raw_ids, list) or not isinstance(raw_fields, list):
+        raise ValueError("'ids' and 'fields' must be lists")
+
+    # int() alone would take JSON true as id 1, truncate 1.7 to 1 and turn 1e300 into a 301-digit id
+    if any(isinstance(i, (bool, float)) for i in raw_ids):
+        raise ValueError("Player ids must be integers")
+    try:
+        ids = list(dict.fromkeys(int(i) for i in raw_ids))
+    except (TypeError, ValueError):
+        raise ValueError("Player ids must be integers")
+    if any(not SQLITE_MIN_INTEGER <= i <= SQLITE_MAX_INTEGER for i in ids):
+        raise ValueError("Player ids must be 64-bit integers")
+    if not ids:
+        raise ValueError("No player ids given")
+    if len(ids) > MAX_BATCH_IDS:
+        raise ValueError(f"At most {MAX_BATCH_IDS} player ids per request")
+
+    fields = [str(f).strip() for f in raw_fields]
+    unknown = [f for f in fields if f not in BATCH_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields {unknown}; choose from {list(BATCH_FIELDS)}")
+    return ids, set(fields)
+
+@app.route('/api/players/batch', methods=['GET', 'POST'])
+def get_players_batch():
+    """
+    Endpoint to fetch several players at once, e.g. for a squad or comparison view.
+    Answers with one set-based query per requested section (at most three in total) however
+    many ids are asked for, instead of one /api/players/<id>, /valuations and /form call each.
+    """
+    try:
+        ids, fields = _parse_batch_request()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    log.debug(f"Received batch request for {len(ids)} players, fields: {sorted(fields)}")
 
-    # Query to find the latest valuation date for each player
-    # Then join back to get player details and the value on that latest date.
-    # This uses a subquery to find the max date per player.
+    # The ids travel as one JSON array parameter, so the statement text (and SQLite's cached
+    # plan for it) is the same for every batch size
+    id_list = json.dumps(ids)
+
+    # Details and the latest value come from the same row; it also tells us which ids exist
     query = """
         SELECT
             p.player_id,
             p.name,
             p.position,
             p.sub_position,
-            c.name AS club_name,
-            pv.market_value_in_eur AS current_market_value_eur
+            p.date_of_birth, 
+            p.current_club_id,
+            c.name as club_name,
+            c.domestic_competition_id as league_id,
+            cv.market_value_in_eur as current_market_value_eur,
+            cv.date as current_market_value_date
         FROM players p
-        JOIN clubs c ON p.current_club_id = c.club_id
-        JOIN player_valuations pv ON p.player_id = pv.player_id
-        JOIN (
+        LEFT JOIN clubs c ON p.current_club_id = c.club_id
+        LEFT JOIN player_current_value cv ON cv.player_id = p.player_id
+        WHERE p.player_id IN (SELECT value FROM json_each(?));
+    """
+    rows = query_db(query, args=(id_list,))
+    if rows is None:
+        log.error("Failed to fetch batch player details.")
+        return jsonify({"error": "Failed to fetch players"}), 500
+    found = {row['player_id']: row for row in rows}
+
+    valuations_by_player = {}
+    if 'valuations' in fields:
+        valuations = query_db("""
+            SELECT player_id, date, market_value_in_eur
+            FROM player_valuations
+            WHERE player_id IN (SELECT value FROM json_each(?))
+            ORDER BY player_id, date ASC;
+        """, args=(id_list,))
+        if valuations is None:
+            log.error("Failed to fetch batch valuations.")
+            return jsonify({"error": "Failed to fetch player valuations"}), 500
+        for valuation in valuations:
+            player_id = valuation.pop('player_id')
+            valuations_by_player.setdefault(player_id, []).append(valuation)
+
+    form_by_player = {}
+    if 'form' in fields:
+        form_rows = query_db("""
             SELECT 
                 player_id, 
-                MAX(date) as max_date 
-            FROM player_valuations 
-            GROUP BY player_id
-        ) latest_val ON pv.player_id = latest_val.player_id AND pv.date = latest_val.max_date
-        WHERE pv.market_value_in_eur IS NOT NULL -- Exclude players with no valuation
-        ORDER BY pv.market_value_in_eur DESC
-        LIMIT ?;
+                average_rating_last_10 AS avgRating, 
+                goals_last_10 AS goalsLast10, 
+                assists_last_10 AS assistsLast10,
+                calculation_timestamp
+            FROM player_form_stats 
+            WHERE player_id IN (SELECT value FROM json_each(?));
+        """, args=(id_list,))
+        # No form table yet (update_player_form.py never ran) reads as "no form data" for everyone
+        form_by_player = {row['player_id']: row for row in form_rows or []}
+
+    players = []
+    for player_id in ids:
+        row = found.get(player_id)
+        if row is None:
+            continue
+        entry = {'player_id': player_id}
+        if 'details' in fields:
+            entry['details'] = {k: v for k, v in row.items() if k != 'current_market_value_date'}
+        if 'latest_value' in fields:
+            entry['latest_value'] = {'date': row['current_market_value_date'],
+                                     'market_value_in_eur': row['current_market_value_eur']}
+        if 'valuations' in fields:
+            entry['valuations'] = valuations_by_player.get(player_id, [])
+        if 'form' in fields:
+            entry['form'] = form_by_player.get(player_id)
+        players.append(entry)
+
+    not_found = [player_id for player_id in ids if player_id not in found]
+    log.debug(f"Found {len(players)} of {len(ids)} requested players.")
+    return jsonify({"players": players, "not_found": not_found})
+
+def _age_filter_day():
+    """Cache key part for /api/players/top: ages are counted from today, so those pages change at midnight."""
+    if 'min_age' in request.args or 'max_age' in request.args:
+        return date.today().isoformat()
+    return None
+
+@app.route('/api/players/top', methods=['GET'])
+@conditional_response
+@cached_response(vary=_age_filter_day)
+def get_top_players():
     """
+    Endpoint to fetch top N players by current market value.
+    Optional filters: ?league=GB1, ?club=<club_id>, ?position=Attack, ?sub_position=Centre-Forward,
+    ?min_age= / ?max_age= (whole years, inclusive).
+    Pages on (market value, player_id) the same way /api/players/search does: ?cursor= takes the
+    previous page's X-Next-Cursor, and ?format=ndjson streams the rows.
+    """
+    limit = request.args.get('limit', default=10, type=int)
+    cursor = request.args.get('cursor')
+    filters = {name: request.args.get(name) for name in ('league', 'position', 'sub_position')}
+    filters['club'] = request.args.get('club', type=int)
+    min_age = request.args.get('min_age', type=int)
+    max_age = request.args.get('max_age', type=int)
+    log.debug(f"Received request for top {limit} players by market value: {filters}, age {min_age}-{max_age}.")
+    for name, value in (('club', filters['club']), ('min_age', min_age), ('max_age', max_age)):
+        if name in request.args and value is None:
+            return jsonify({"error": f"{name} must be an integer"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+
+    where = "lb.market_value_in_eur IS NOT NULL" # Exclude players with no valuation
+    params = {}
+    for name, column in (('league', 'league_id'), ('club', 'club_id'), ('position', 'position'), ('sub_position', 'sub_position')):
+        if filters[name] is not None:
+            where += f" AND lb.{column} = :{name}"
+            params[name] = filters[name]
+    # Ages become birth-date bounds, so the filter is a plain comparison on the row
+    today = date.today()
+    if min_age is not None:
+        where += " AND lb.date_of_birth <= :born_by"
+        params['born_by'] = _years_before(today, min_age).isoformat()
+    if max_age is not None:
+        where += " AND lb.date_of_birth > :born_after"
+        params['born_after'] = _years_before(today, max_age + 1).isoformat()
+    if cursor:
+        try:
+            params['after_value'], params['after_id'] = decode_cursor(cursor, 'value', 2)
+        except InvalidCursor as e:
+            log.warning(f"Rejected top players cursor: {e}")
+            return jsonify({"error": "Invalid cursor"}), 400
+        # Written as a range plus tie-break (rather than a row-value comparison) so SQLite keeps
+        # walking the value index in order instead of sorting
+        where += (" AND lb.market_value_in_eur <= :after_value"
+                  " AND (lb.market_value_in_eur < :after_value OR lb.player_id > :after_id)")
 
-    params = [limit]
+    # player_leaderboard (maintained by load_data.py) holds every valued player with their club,
+    # league and position. Each filter has an index ordered by market value, so SQLite walks
+    # it from the top and stops after `limit` matching rows, whatever the table size.
+    query = f"""
+        SELECT
+            lb.player_id,
+            lb.name,
+            lb.position,
+            lb.sub_position,
+            lb.club_name,
+            lb.market_value_in_eur AS current_market_value_eur
+        FROM player_leaderboard lb
+        WHERE {where}
+        ORDER BY lb.market_value_in_eur DESC, lb.player_id
+        LIMIT :limit;
+    """
 
-    print(f"Executing query: {query} with params: {params}")
-    top_players = query_db(query, args=params)
+    response = paginated_response(query, params, limit, 'value', ('current_market_value_eur', 'player_id'))
 
-    if top_players is not None:
-        print(f"Found {len(top_players)} top players.")
-        return jsonify(top_players)
+    if response is not None:
+        log.debug("Top players response ready.")
+        return response
     else:
-        print("Failed to fetch top players.")
+        log.error("Failed to fetch top players.")
         return jsonify({"error": "Failed to fetch top players"}), 500
 
+def _years_before(day, years):
+    """The same calendar day `years` earlier (28 Feb standing in for 29 Feb in non-leap years)."""
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """ Endpoint reporting response cache hit/miss metrics for this process. """
+    return jsonify(response_cache.stats())
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """ Prometheus scrape endpoint: request/SQL/serialization metrics plus cache and pool gauges for this process. """
+    cache = response_cache.stats()
+    gauges = [
+        ('api_response_cache_hits', "Response cache hits since start.", cache['hits']),
+        ('api_response_cache_misses', "Response cache misses since start.", cache['misses']),
+        ('api_response_cache_entries', "Entries currently in the response cache.", cache['entries']),
+        ('api_response_cache_evictions', "Entries evicted by the LRU bound.", cache['evictions']),
+        ('api_response_cache_invalidations', "Cache flushes caused by a data_version bump.", cache['invalidations']),
+        ('api_db_pool_idle_connections', "Idle read-only SQLite connections in the pool.", get_pool().idle_count()),
+    ]
+    body = instrumentation.registry.render(instrumentation.LABEL_NAMES, gauges)
+    return Response(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/api/test/<int:test_id>', methods=['GET'])
 def test_dynamic_route(test_id):
-    print(f"!!! TEST ROUTE HIT with ID: {test_id} !!!")
+    log.debug(f"!!! TEST ROUTE HIT with ID: {test_id} !!!")
     return jsonify({"message": f"Test successful for ID {test_id}"})
 
 # Add more endpoints here later, e.g.:
@@ -254,7 +898,9 @@ def test_dynamic_route(test_id):
 
 # --- Run the App ---
 if __name__ == '__main__':
-    # Runs the Flask development server
+    # Runs the Flask development server (single process, for local development only).
+    # For production, serve wsgi.py with gunicorn: gunicorn -c gunicorn.conf.py wsgi:app
+    logging.basicConfig(level=logging.INFO)
     # Debug=True enables auto-reloading and detailed error pages
     # Specify a different port (e.g., 5001)
     app.run(debug=True, port=5001) 
\ No newline at end of file
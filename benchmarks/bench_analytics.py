@@ -0,0 +1,77 @@
+"""
+Benchmark: whole-history aggregates over player_valuations from SQLite vs. the Parquet snapshot.
+
+Builds a synthetic database (30k players x 70 valuations, ~2.1M rows, by default), writes the
+season-partitioned snapshot load_data.py would write, then times each analytics.py query on
+both backends (median of REPEATS runs, results checked to be equal). Without pyarrow only the
+SQLite column is measured.
+
+Usage: python benchmarks/bench_analytics.py [num_players] [valuations_per_player]
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics
+from synthetic_db import build_synthetic_db
+
+REPEATS = 5
+QUERIES = [
+    ("trends, full history", analytics.league_value_trends, {}),
+    ("trends, one league", analytics.league_value_trends, {'leagues': ['GB1']}),
+    ("trends, 3 seasons", analytics.league_value_trends, {'seasons': [2020, 2021, 2022]}),
+    ("distribution, full history", analytics.value_distribution, {}),
+    ("distribution, league+season", analytics.value_distribution, {'seasons': [2022], 'leagues': ['ES1']}),
+]
+
+
+def median_ms(function, **kwargs):
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        result = function(**kwargs)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("num_players", type=int, nargs="?", default=30_000)
+    parser.add_argument("valuations_per_player", type=int, nargs="?", default=70)
+    args = parser.parse_args()
+    num_players, per_player = args.num_players, args.valuations_per_player
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = build_synthetic_db(os.path.join(tmp_dir, "bench.db"), num_players=num_players,
+                                     valuations_per_player=per_player)
+        snapshot_dir = os.path.join(tmp_dir, "snapshot")
+        print(f"Synthetic DB: {num_players * per_player:,} valuations")
+        if analytics.PYARROW_AVAILABLE:
+            conn = sqlite3.connect(db_path)
+            started = time.perf_counter()
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                assert analytics.write_valuations_snapshot(conn, snapshot_dir)
+            conn.close()
+            size = sum(os.path.getsize(os.path.join(root, name))
+                       for root, _dirs, names in os.walk(snapshot_dir) for name in names)
+            print(f"Parquet snapshot written in {time.perf_counter() - started:.2f} s ({size / 2**20:.1f} MiB; "
+                  f"SQLite file {os.path.getsize(db_path) / 2**20:.1f} MiB)")
+        else:
+            print("pyarrow is not installed: measuring the SQLite backend only (pip install pyarrow).")
+
+        print(f"{'query':<30}{'sqlite ms':>11}{'parquet ms':>12}{'speedup':>9}")
+        for label, function, filters in QUERIES:
+            common = dict(filters, database=db_path, snapshot_dir=snapshot_dir)
+            sqlite_ms, sqlite_result = median_ms(function, backend='sqlite', **common)
+            if not analytics.PYARROW_AVAILABLE:
+                print(f"{label:<30}{sqlite_ms:>11.1f}{'-':>12}{'-':>9}")
+                continue
+            parquet_ms, parquet_result = median_ms(function, backend='parquet', **common)
+            assert parquet_result == sqlite_result, f"Results differ for {label}"
+            print(f"{label:<30}{sqlite_ms:>11.1f}{parquet_ms:>12.1f}{sqlite_ms / parquet_ms:>8.1f}x")
@@ -0,0 +1,92 @@
+"""
+Benchmark: connect-per-request (the previous query_db) vs. the pooled read-only connections in api.py.
+
+Drives a mix of GET endpoints through Flask's test client from 1, 8 and 32 threads against a
+synthetic database, once with the old query_db swapped in and once with the pooled one, and
+reports requests/s and p50/p99 latency for each.
+
+Usage: python benchmarks/bench_api_db.py [requests_per_thread]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api
+from synthetic_db import LEAGUES, build_synthetic_db
+
+THREAD_COUNTS = (1, 8, 32)
+
+
+def connect_per_request_query_db(query, args=(), one=False):
+    """The previous implementation: a fresh connection (and cold page cache) for every query."""
+    conn = sqlite3.connect(api.DATABASE)
+    conn.row_factory = sqlite3.Row
+    try:
+        rv = conn.execute(query, args).fetchall()
+        results = [dict(row) for row in rv]
+        return (results[0] if results else None) if one else results
+    finally:
+        conn.close()
+
+
+def make_urls(count, num_players, seed=3):
+    rng = random.Random(seed)
+    urls = []
+    for _ in range(count):
+        player_id = rng.randint(1, num_players)
+        urls.append(rng.choice([
+            f"/api/players/{player_id}",
+            f"/api/players/{player_id}/valuations",
+            f"/api/players/search?league={rng.choice(LEAGUES)[0]}&limit=20",
+            "/api/leagues",
+        ]))
+    return urls
+
+
+def run_load(threads, urls_per_thread):
+    def worker(urls):
+        client = api.app.test_client()
+        latencies = []
+        for url in urls:
+            started = time.perf_counter()
+            response = client.get(url)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code in (200, 404), (url, response.status_code)
+        return latencies
+
+    started = time.perf_counter()
+    # The handlers print every request; keep that out of the measurement output
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(worker, urls_per_thread[:threads]))
+    wall = time.perf_counter() - started
+    latencies = sorted(l for thread_latencies in results for l in thread_latencies)
+    return len(latencies) / wall, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99) - 1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("requests_per_thread", type=int, nargs="?", default=200)
+    requests_per_thread = parser.parse_args().requests_per_thread
+    num_players = 30_000
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        api.DATABASE = build_synthetic_db(os.path.join(tmp_dir, "bench.db"), num_players=num_players)
+        urls_per_thread = [make_urls(requests_per_thread, num_players, seed=i) for i in range(max(THREAD_COUNTS))]
+        pooled_query_db = api.query_db
+        print(f"Synthetic DB: {num_players:,} players; {requests_per_thread} requests per thread")
+        print(f"{'mode':<22}{'threads':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for label, implementation in (("connect-per-request", connect_per_request_query_db), ("pooled read-only", pooled_query_db)):
+            api.query_db = implementation
+            for threads in THREAD_COUNTS:
+                rps, p50, p99 = run_load(threads, urls_per_thread)
+                print(f"{label:<22}{threads:>8}{rps:>10.0f}{p50 * 1000:>10.2f}{p99 * 1000:>10.2f}")
+        api.query_db = pooled_query_db
+        api.get_pool().close_all()
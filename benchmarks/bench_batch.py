@@ -0,0 +1,79 @@
+"""
+Benchmark: per-player calls (/api/players/<id>, /valuations, /form) vs. one /api/players/batch call.
+
+Fetches details, valuation history and form for squads of 25, 100 and 500 random players of a
+synthetic database both ways through Flask's test client and reports the time per squad and the
+number of SQL queries issued.
+
+Usage: python benchmarks/bench_batch.py [repeats]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api
+from synthetic_db import build_synthetic_db
+
+SQUAD_SIZES = (25, 100, 500)
+NUM_PLAYERS = 30_000
+
+
+def per_player(client, ids):
+    for player_id in ids:
+        client.get(f"/api/players/{player_id}")
+        client.get(f"/api/players/{player_id}/valuations")
+        client.get(f"/api/players/{player_id}/form")
+
+
+def batched(client, ids):
+    response = client.post("/api/players/batch", json={'ids': ids, 'fields': ['details', 'valuations', 'form']})
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+
+def measure(client, fetch, squads):
+    queries = []
+    original_query_db = api.query_db
+    def counting_query_db(*args, **kwargs):
+        queries.append(1)
+        return original_query_db(*args, **kwargs)
+    api.query_db = counting_query_db
+    try:
+        started = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            for ids in squads:
+                api.response_cache.clear() # Measure the database work, not cache hits
+                fetch(client, ids)
+        elapsed = time.perf_counter() - started
+    finally:
+        api.query_db = original_query_db
+    return elapsed / len(squads), len(queries) / len(squads)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("repeats", type=int, nargs="?", default=5)
+    repeats = parser.parse_args().repeats
+    rng = random.Random(8)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        api.DATABASE = build_synthetic_db(os.path.join(tmp_dir, "bench.db"), num_players=NUM_PLAYERS)
+        conn = api.sqlite3.connect(api.DATABASE)
+        conn.execute("CREATE TABLE player_form_stats (player_id INTEGER PRIMARY KEY, average_rating_last_10 REAL, "
+                     "goals_last_10 INTEGER, assists_last_10 INTEGER, calculation_timestamp TEXT);")
+        conn.executemany("INSERT INTO player_form_stats VALUES (?, 7.0, 3, 2, '2025-01-01 00:00:00');",
+                         [(i,) for i in range(1, NUM_PLAYERS + 1, 2)])
+        conn.commit()
+        conn.close()
+        client = api.app.test_client()
+        print(f"{'squad':>6}{'mode':>12}{'ms/squad':>12}{'queries':>10}")
+        for size in SQUAD_SIZES:
+            squads = [rng.sample(range(1, NUM_PLAYERS + 1), size) for _ in range(repeats)]
+            for label, fetch in (("per-player", per_player), ("batch", batched)):
+                per_squad, queries = measure(client, fetch, squads)
+                print(f"{size:>6}{label:>12}{per_squad * 1000:>12.1f}{queries:>10.0f}")
+        api.get_pool().close_all()
@@ -0,0 +1,102 @@
+"""
+Benchmark: whole-file pd.read_csv + DataFrame.to_sql (previous loader) vs. the chunked
+executemany loader in load_data.py, on a synthetic player_valuations.csv, with the parsing done
+on the writer's thread (streaming) and in a process pool of WORKERS processes (pool).
+
+Each load runs in its own subprocess so peak RSS (ru_maxrss) is measured cleanly; the streaming
+loader's peak should stay flat as the CSV grows, the previous loader's grows with it. For the pool
+it is the writer process's peak (each worker holds about one block). The streaming times include
+building the table's two indexes, which to_sql never created. The pool only pays off with spare
+cores: on one core it adds the cost of shipping rows between processes.
+
+Usage: WORKERS=4 python benchmarks/bench_csv_load.py [num_rows ...]
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import date, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+HEADER = "player_id,date,market_value_in_eur,current_club_id,player_club_domestic_competition_id\n"
+LEAGUE_CODES = ["GB1", "ES1", "FR1", "IT1", "L1", "NL1", "PO1", "TR1"]
+WORKERS = int(os.environ.get("WORKERS", max(2, os.cpu_count() or 1)))
+
+
+def write_csv(path, num_rows, seed=3):
+    rng = random.Random(seed)
+    start = date(2004, 1, 1)
+    with open(path, "w") as f:
+        f.write(HEADER)
+        for _ in range(num_rows):
+            day = start + timedelta(days=rng.randint(0, 7300))
+            f.write(f"{rng.randint(1, 500_000)},{day.isoformat()},{rng.randint(1, 2000) * 25_000},"
+                    f"{rng.randint(1, 3000)},{rng.choice(LEAGUE_CODES)}\n")
+
+
+def previous_loader(conn, csv_path):
+    """load_csv_to_table as it was: the whole file in one DataFrame, then to_sql."""
+    import pandas as pd
+    df = pd.read_csv(csv_path)
+    df['date'] = pd.to_datetime(df['date'], errors='coerce').dt.strftime('%Y-%m-%d')
+    df['market_value_in_eur'] = pd.to_numeric(df['market_value_in_eur'], errors='coerce').fillna(0).astype(int)
+    df.to_sql('player_valuations', conn, if_exists='replace', index=False)
+
+
+def streaming_loader(conn, csv_path, workers=1):
+    """Chunked load into a staging table, then the swap that builds the table's indexes."""
+    from load_data import bulk_load_pragmas, define_schema, load_csv_to_table, parse_pool, swap_in_staging_tables
+    define_schema(conn)
+    with bulk_load_pragmas(conn), parse_pool(workers) as pool:
+        assert load_csv_to_table(conn, 'player_valuations', csv_path, pool)
+    assert swap_in_staging_tables(conn, ['player_valuations']) == ['player_valuations']
+
+
+def run_child(mode, csv_path, db_path):
+    """Runs one load in this (fresh) process and prints its stats as JSON."""
+    conn = sqlite3.connect(db_path)
+    started = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        if mode == "previous":
+            previous_loader(conn, csv_path)
+        else:
+            streaming_loader(conn, csv_path, WORKERS if mode == "pool" else 1)
+    elapsed = time.perf_counter() - started
+    rows = conn.execute("SELECT COUNT(*) FROM player_valuations").fetchone()[0]
+    conn.close()
+    print(json.dumps({'seconds': elapsed, 'rows': rows,
+                      'peak_rss_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "--child":
+        run_child(*sys.argv[2:])
+        sys.exit(0)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("num_rows", type=int, nargs="*", default=[500_000, 2_000_000])
+    sizes = parser.parse_args().num_rows
+    print(f"{'rows':>10}  {'loader':<12}{'seconds':>9}{'rows/s':>12}{'peak RSS MiB':>14}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for num_rows in sizes:
+            csv_path = os.path.join(tmp_dir, "player_valuations.csv")
+            write_csv(csv_path, num_rows)
+            for mode in ("previous", "streaming", "pool"):
+                db_path = os.path.join(tmp_dir, f"{mode}.db")
+                if os.path.exists(db_path):
+                    os.remove(db_path)
+                output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", mode, csv_path, db_path],
+                                        cwd=REPO_ROOT, check=True, capture_output=True, text=True).stdout
+                stats = json.loads(output.strip().splitlines()[-1])
+                assert stats['rows'] == num_rows, stats
+                label = f"pool x{WORKERS}" if mode == "pool" else mode
+                print(f"{num_rows:>10}  {label:<12}{stats['seconds']:>9.2f}{num_rows / stats['seconds']:>12,.0f}"
+                      f"{stats['peak_rss_mib']:>14.0f}")
@@ -0,0 +1,103 @@
+"""
+Benchmark: correlated latest-valuation subqueries vs. the materialized player_current_value table.
+
+Prints EXPLAIN QUERY PLAN and the median latency of the search, details and top-N queries,
+first as api.py used to run them and then against player_current_value.
+
+Usage: python benchmarks/bench_current_value.py [num_players]
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_data import rebuild_player_current_value
+from synthetic_db import build_synthetic_db
+
+REPEATS = 20
+
+BEFORE = {
+    "search (league=GB1, limit 50)": ("""
+        SELECT p.player_id, p.name, c.name,
+               (SELECT pv.market_value_in_eur FROM player_valuations pv
+                WHERE pv.player_id = p.player_id ORDER BY pv.date DESC LIMIT 1) AS current_market_value_eur
+        FROM players p LEFT JOIN clubs c ON p.current_club_id = c.club_id
+        WHERE 1=1 AND c.domestic_competition_id = ? ORDER BY p.name LIMIT ?""", ("GB1", 50)),
+    "details (one player)": ("""
+        SELECT p.player_id, p.name, c.name,
+               (SELECT pv.market_value_in_eur FROM player_valuations pv
+                WHERE pv.player_id = p.player_id ORDER BY pv.date DESC LIMIT 1) AS current_market_value_eur
+        FROM players p LEFT JOIN clubs c ON p.current_club_id = c.club_id
+        WHERE p.player_id = ?""", (1234,)),
+    "top 10": ("""
+        SELECT p.player_id, p.name, c.name, pv.market_value_in_eur
+        FROM players p
+        JOIN clubs c ON p.current_club_id = c.club_id
+        JOIN player_valuations pv ON p.player_id = pv.player_id
+        JOIN (SELECT player_id, MAX(date) AS max_date FROM player_valuations GROUP BY player_id) latest_val
+          ON pv.player_id = latest_val.player_id AND pv.date = latest_val.max_date
+        WHERE pv.market_value_in_eur IS NOT NULL
+        ORDER BY pv.market_value_in_eur DESC LIMIT ?""", (10,)),
+}
+
+AFTER = {
+    "search (league=GB1, limit 50)": ("""
+        SELECT p.player_id, p.name, c.name, cv.market_value_in_eur AS current_market_value_eur
+        FROM players p LEFT JOIN clubs c ON p.current_club_id = c.club_id
+        LEFT JOIN player_current_value cv ON cv.player_id = p.player_id
+        WHERE 1=1 AND c.domestic_competition_id = ? ORDER BY p.name LIMIT ?""", ("GB1", 50)),
+    "details (one player)": ("""
+        SELECT p.player_id, p.name, c.name, cv.market_value_in_eur AS current_market_value_eur
+        FROM players p LEFT JOIN clubs c ON p.current_club_id = c.club_id
+        LEFT JOIN player_current_value cv ON cv.player_id = p.player_id
+        WHERE p.player_id = ?""", (1234,)),
+    "top 10": ("""
+        SELECT p.player_id, p.name, c.name, cv.market_value_in_eur
+        FROM player_current_value cv
+        JOIN players p ON p.player_id = cv.player_id
+        JOIN clubs c ON p.current_club_id = c.club_id
+        WHERE cv.market_value_in_eur IS NOT NULL
+        ORDER BY cv.market_value_in_eur DESC LIMIT ?""", (10,)),
+}
+
+
+def run(conn, label, queries):
+    print(f"\n===== {label} =====")
+    results = {}
+    for name, (sql, args) in queries.items():
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", args).fetchall()
+        timings = []
+        for _ in range(REPEATS):
+            started = time.perf_counter()
+            results[name] = conn.execute(sql, args).fetchall()
+            timings.append(time.perf_counter() - started)
+        print(f"\n-- {name}: median {statistics.median(timings) * 1000:.2f} ms")
+        for row in plan:
+            print(f"   {row[-1]}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("num_players", type=int, nargs="?", default=30_000)
+    num_players = parser.parse_args().num_players
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = build_synthetic_db(os.path.join(tmp_dir, "bench.db"), num_players=num_players,
+                                  derived_tables=False)
+        conn = sqlite3.connect(path)
+        before = run(conn, f"BEFORE: correlated subqueries ({num_players:,} players)", BEFORE)
+        started = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            rebuild_player_current_value(conn)
+        print(f"\n(player_current_value rebuilt in {time.perf_counter() - started:.2f} s)")
+        after = run(conn, "AFTER: player_current_value", AFTER)
+        for name in BEFORE:
+            assert sorted(before[name], key=repr) == sorted(after[name], key=repr), f"Results differ for {name}"
+        print("\nAll result sets identical.")
+        conn.close()
@@ -0,0 +1,128 @@
+"""
+Benchmark: full reload vs. `load_data.py --incremental` for a weekly-style snapshot.
+
+Writes synthetic Kaggle-style CSVs (clubs, players, and a valuation history), loads them the way
+load_data.py does, then writes the next "week": a few thousand new valuations dated after
+everything already loaded, a few hundred players with a changed market value, and some new
+players. That snapshot is applied both ways, including the derived tables each path refreshes,
+and the resulting tables are checked to be identical.
+
+Usage: python benchmarks/bench_incremental_load.py [num_valuations] [num_players]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_data import (apply_incremental_load, bulk_load_pragmas, define_schema, load_csv_to_table,
+                       rebuild_player_current_value, rebuild_player_leaderboard, swap_in_staging_tables)
+from player_search import rebuild_player_search_index
+
+TABLES = ["clubs", "players", "player_valuations"]
+NUM_CLUBS = 400
+NEW_VALUATIONS = 5_000
+CHANGED_PLAYERS = 300
+NEW_PLAYERS = 50
+LAST_DAY = date(2024, 6, 30)
+
+
+def write_snapshot(tmp_dir, num_valuations, num_players, week, seed=23):
+    """Writes the CSVs for snapshot `week` (0 = initial load, 1 = the week after) and returns their paths."""
+    # Separate generators per file, so week 1 repeats week 0's rows before adding its own
+    rng = random.Random(seed)
+    paths = {table: os.path.join(tmp_dir, f"{table}.csv") for table in TABLES}
+    with open(paths["clubs"], "w") as f:
+        f.write("club_id,club_code,name,domestic_competition_id,squad_size,stadium_seats\n")
+        for club_id in range(1, NUM_CLUBS + 1):
+            f.write(f"{club_id},club-{club_id},Club {club_id},GB1,25,{rng.randint(5, 80) * 1000}\n")
+    with open(paths["players"], "w") as f:
+        f.write("player_id,name,current_club_id,date_of_birth,position,sub_position,height_in_cm,market_value_in_eur\n")
+        for player_id in range(1, num_players + 1 + (NEW_PLAYERS if week else 0)):
+            value = rng.randint(1, 2000) * 25_000
+            if week and player_id <= CHANGED_PLAYERS:
+                value += 25_000
+            f.write(f"{player_id},Player {player_id},{rng.randint(1, NUM_CLUBS)},"
+                    f"{rng.randint(1985, 2006)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)} 00:00:00,"
+                    f"Attack,Centre-Forward,{rng.randint(165, 200)}.0,{value}.0\n")
+    with open(paths["player_valuations"], "w") as f:
+        f.write("player_id,date,market_value_in_eur,current_club_id,player_club_domestic_competition_id\n")
+        rng = random.Random(seed + 1)
+        start = LAST_DAY - timedelta(days=7300)
+        for _ in range(num_valuations):
+            day = start + timedelta(days=rng.randint(0, 7300))
+            f.write(f"{rng.randint(1, num_players)},{day.isoformat()},{rng.randint(1, 2000) * 25_000},"
+                    f"{rng.randint(1, NUM_CLUBS)},GB1\n")
+        if week:
+            rng = random.Random(seed + 2)
+            # One new valuation per player at most, as (player_id, date) identifies a valuation
+            for player_id in rng.sample(range(1, num_players + NEW_PLAYERS + 1), NEW_VALUATIONS):
+                day = LAST_DAY + timedelta(days=rng.randint(1, 7))
+                f.write(f"{player_id},{day.isoformat()},"
+                        f"{rng.randint(1, 2000) * 25_000},{rng.randint(1, NUM_CLUBS)},GB1\n")
+    return paths
+
+
+def full_load(conn, paths):
+    """What load_data.py does without --incremental."""
+    define_schema(conn)
+    with bulk_load_pragmas(conn):
+        for table in TABLES:
+            assert load_csv_to_table(conn, table, paths[table])
+    assert swap_in_staging_tables(conn, TABLES) == TABLES
+    rebuild_player_current_value(conn)
+    rebuild_player_leaderboard(conn)
+    rebuild_player_search_index(conn)
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        result = function(*args)
+    return time.perf_counter() - started, result
+
+
+def table_contents(conn):
+    return {
+        'players': conn.execute("SELECT * FROM players ORDER BY player_id").fetchall(),
+        'valuations': conn.execute("SELECT player_id, date, market_value_in_eur FROM player_valuations "
+                                   "ORDER BY player_id, date, market_value_in_eur").fetchall(),
+        'leaderboard': conn.execute("SELECT * FROM player_leaderboard ORDER BY player_id").fetchall(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("num_valuations", type=int, nargs="?", default=1_000_000)
+    parser.add_argument("num_players", type=int, nargs="?", default=30_000)
+    args = parser.parse_args()
+    num_valuations, num_players = args.num_valuations, args.num_players
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        full_db, incremental_db = (os.path.join(tmp_dir, name) for name in ("full.db", "incremental.db"))
+        paths = write_snapshot(tmp_dir, num_valuations, num_players, week=0)
+        for path in (full_db, incremental_db):
+            conn = sqlite3.connect(path)
+            initial_seconds, _ = timed(full_load, conn, paths)
+            conn.close()
+        print(f"Initial load: {num_valuations:,} valuations, {num_players:,} players in {initial_seconds:.2f} s")
+
+        paths = write_snapshot(tmp_dir, num_valuations, num_players, week=1)
+        conn = sqlite3.connect(full_db)
+        full_seconds, _ = timed(full_load, conn, paths)
+        full_contents = table_contents(conn)
+        conn.close()
+        conn = sqlite3.connect(incremental_db)
+        incremental_seconds, (ok, changed) = timed(apply_incremental_load, conn, TABLES, paths)
+        assert ok and changed
+        assert table_contents(conn) == full_contents, "Incremental load diverged from the full reload"
+        conn.close()
+
+        print(f"Weekly snapshot (+{NEW_VALUATIONS:,} valuations, {CHANGED_PLAYERS} changed and {NEW_PLAYERS} new players):")
+        print(f"{'full reload':<14}{full_seconds:>8.2f} s")
+        print(f"{'incremental':<14}{incremental_seconds:>8.2f} s")
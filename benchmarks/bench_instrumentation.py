@@ -0,0 +1,59 @@
+"""
+Benchmark: per-request overhead of instrumentation.py (API_INSTRUMENTATION on vs. off).
+
+Sends the same uncached requests through Flask's test client with instrumentation disabled and
+enabled (default 1% request-log sampling), alternating the two in short paired rounds so drift in
+machine load hits both equally, and reports the median time per request and the median difference.
+
+Usage: python benchmarks/bench_instrumentation.py [rounds]
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api
+import instrumentation
+from synthetic_db import build_synthetic_db
+
+NUM_PLAYERS = 30_000
+REQUESTS_PER_ROUND = 300
+
+
+def run(client, urls):
+    api.response_cache.max_entries = 0 # Every request does its SQL and serialization
+    started = time.perf_counter()
+    for url in urls:
+        client.get(url)
+    return (time.perf_counter() - started) / len(urls)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("rounds", type=int, nargs="?", default=30)
+    rounds = parser.parse_args().rounds
+    logging.getLogger("api.requests").disabled = True # Measure the sampling decision, not the log handler
+    rng = random.Random(4)
+    urls = [rng.choice([f"/api/players/{rng.randint(1, NUM_PLAYERS)}", "/api/players/top?limit=25",
+                        f"/api/players/{rng.randint(1, NUM_PLAYERS)}/valuations"]) for _ in range(REQUESTS_PER_ROUND)]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        api.DATABASE = build_synthetic_db(os.path.join(tmp_dir, "bench.db"), num_players=NUM_PLAYERS)
+        client = api.app.test_client()
+        run(client, urls) # Warm up the pool and page cache
+        off, on = [], []
+        for i in range(rounds):
+            for enabled in ((False, True) if i % 2 == 0 else (True, False)):
+                instrumentation.ENABLED = enabled
+                (on if enabled else off).append(run(client, urls))
+        difference = statistics.median(b - a for a, b in zip(off, on))
+        print(f"{rounds} paired rounds of {REQUESTS_PER_ROUND} requests (medians)")
+        print(f"instrumentation off: {statistics.median(off) * 1e6:8.1f} us/request")
+        print(f"instrumentation on:  {statistics.median(on) * 1e6:8.1f} us/request")
+        print(f"overhead:            {difference * 1e6:8.1f} us/request ({100 * difference / statistics.median(off):+.1f}%)")
+        api.get_pool().close_all()
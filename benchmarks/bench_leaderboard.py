@@ -0,0 +1,111 @@
+"""
+Benchmark: filtered top-100 from joins over player_current_value vs. the player_leaderboard table.
+
+For each table size, builds a synthetic database, then runs a set of /api/players/top filters
+(league, club, position, sub_position, league + position, age ranges) two ways: the join the
+endpoint would need without player_leaderboard, and the SQL /api/players/top actually runs.
+Reports the median latency of each; the leaderboard column should stay flat as the table grows.
+
+Usage: python benchmarks/bench_leaderboard.py [num_players ...]
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import unittest.mock
+from contextlib import redirect_stdout
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api
+from load_data import rebuild_player_current_value, rebuild_player_leaderboard
+from synthetic_db import build_synthetic_db
+
+REPEATS = 20
+TOP_N = 100
+FILTERS = [
+    ("none", {}),
+    ("league", {'league': 'GB1'}),
+    ("club", {'club': 1001}),
+    ("position", {'position': 'Defender'}),
+    ("sub_position", {'sub_position': 'Left-Back'}),
+    ("league + position", {'league': 'ES1', 'position': 'Goalkeeper'}),
+    ("age 18-21", {'min_age': 18, 'max_age': 21}),
+    ("league + age <= 23", {'league': 'IT1', 'max_age': 23}),
+]
+JOIN_COLUMNS = {'league': 'c.domestic_competition_id', 'club': 'c.club_id', 'position': 'p.position',
+                'sub_position': 'p.sub_position'}
+
+
+def join_query(filters):
+    """The filtered top-N as a join over player_current_value, players and clubs."""
+    where, params = "cv.market_value_in_eur IS NOT NULL", {}
+    for name, column in JOIN_COLUMNS.items():
+        if name in filters:
+            where += f" AND {column} = :{name}"
+            params[name] = filters[name]
+    if 'min_age' in filters:
+        where += " AND p.date_of_birth <= :born_by"
+        params['born_by'] = api._years_before(date.today(), filters['min_age']).isoformat()
+    if 'max_age' in filters:
+        where += " AND p.date_of_birth > :born_after"
+        params['born_after'] = api._years_before(date.today(), filters['max_age'] + 1).isoformat()
+    params['limit'] = TOP_N
+    return f"""
+        SELECT p.player_id, p.name, p.position, p.sub_position, c.name AS club_name,
+               cv.market_value_in_eur AS current_market_value_eur
+        FROM player_current_value cv
+        JOIN players p ON p.player_id = cv.player_id
+        JOIN clubs c ON p.current_club_id = c.club_id
+        WHERE {where}
+        ORDER BY cv.market_value_in_eur DESC, cv.player_id
+        LIMIT :limit""", params
+
+
+def leaderboard_query(filters):
+    """The SQL /api/players/top builds for `filters`, captured with query_db stubbed out."""
+    captured = {}
+    def capturing_query_db(query, args=(), one=False):
+        captured.update(query=query, args=dict(args, limit=TOP_N))
+        return []
+    with unittest.mock.patch.object(api, 'query_db', capturing_query_db), \
+         api.app.test_request_context('/api/players/top', query_string={**filters, 'limit': TOP_N}):
+        api.get_top_players.__wrapped__.__wrapped__()
+    return captured['query'], captured['args']
+
+
+def median_ms(conn, query, params):
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        rows = conn.execute(query, params).fetchall()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("num_players", type=int, nargs="*", default=[30_000, 120_000])
+    sizes = parser.parse_args().num_players
+    print(f"{'players':>9}  {'filter':<20}{'join ms':>10}{'leaderboard ms':>16}")
+    for num_players in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = build_synthetic_db(os.path.join(tmp_dir, "bench.db"), num_players=num_players,
+                                      derived_tables=False)
+            conn = sqlite3.connect(path)
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                rebuild_player_current_value(conn)
+                started = time.perf_counter()
+                rebuild_player_leaderboard(conn)
+                build_seconds = time.perf_counter() - started
+            print(f"{num_players:>9}  (player_leaderboard built in {build_seconds:.2f} s)")
+            for label, filters in FILTERS:
+                join_ms, join_rows = median_ms(conn, *join_query(filters))
+                board_ms, board_rows = median_ms(conn, *leaderboard_query(filters))
+                assert [r[0] for r in join_rows] == [r[0] for r in board_rows], f"Results differ for {label}"
+                print(f"{num_players:>9}  {label:<20}{join_ms:>10.2f}{board_ms:>16.2f}")
+            conn.close()
@@ -0,0 +1,164 @@
+"""
+HTTP load test for the API: requests/s and tail latency at 1, 8 and 64 concurrent clients.
+
+Starts the API in a subprocess (the Flask/werkzeug server by default, or gunicorn with
+gunicorn.conf.py when it is installed) against a database, then drives a mix of GET endpoints with closed-loop
+keep-alive clients for a fixed time per concurrency level. Use --url to test a server that is
+already running instead.
+
+Usage:
+  python benchmarks/bench_load.py                             # Flask dev server, synthetic 30k-player DB
+  python benchmarks/bench_load.py --server gunicorn           # needs `pip install gunicorn`
+  python benchmarks/bench_load.py --server gunicorn --db transfermarkt_data.db --workers 4 --threads 8
+  python benchmarks/bench_load.py --url http://127.0.0.1:5001 --duration 20
+"""
+import argparse
+import importlib.util
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+
+import requests
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from load_data import bump_data_version
+from synthetic_db import LEAGUES, build_synthetic_db
+
+CONCURRENCY_LEVELS = (1, 8, 64)
+NAME_QUERIES = ["haaland", "mbappe", "saka", "odegaard", "martinez", "rice", "wirtz", "musiala"]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def prepare_database(path, num_players):
+    """Builds a synthetic DB (with the derived tables api.py reads) and stamps its data version."""
+    build_synthetic_db(path, num_players=num_players)
+    conn = sqlite3.connect(path)
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        bump_data_version(conn)
+    conn.close()
+
+
+def start_server(kind, db_path, port, workers, threads, log_path):
+    env = {**os.environ, "TRANSFERMARKT_DB": os.path.abspath(db_path)}
+    if kind == "gunicorn":
+        env.update(API_BIND=f"127.0.0.1:{port}", API_WORKERS=str(workers), API_THREADS=str(threads), API_LOG_LEVEL="warning")
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"]
+    else:
+        command = [sys.executable, "-c",
+                   f"import api; api.app.run(host='127.0.0.1', port={port}, debug=False, threaded=True)"]
+    # Server output goes to a file: an undrained pipe would fill up and stall the server's logging
+    log_file = open(log_path, "wb")
+    process = subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+    log_file.close()
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            with open(log_path, "rb") as log:
+                raise SystemExit(f"Server exited early:\n{log.read().decode(errors='replace')[-2000:]}")
+        try:
+            requests.get(f"{url}/api/leagues", timeout=1)
+            return process, url
+        except requests.exceptions.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit("Server did not come up within 30 s")
+
+
+def make_url(rng, num_players):
+    player_id = rng.randint(1, num_players)
+    return rng.choice([
+        f"/api/players/{player_id}",
+        f"/api/players/{player_id}/valuations",
+        f"/api/players/search?league={rng.choice(LEAGUES)[0]}&limit=20",
+        f"/api/players/search?name={rng.choice(NAME_QUERIES)}&limit=20",
+        f"/api/players/top?limit={rng.choice([10, 25, 50])}",
+        "/api/leagues",
+    ])
+
+
+def run_level(base_url, clients, duration, num_players):
+    """Closed loop: each client sends its next request as soon as the previous one completes."""
+    latencies = [[] for _ in range(clients)]
+    errors = [0] * clients
+    stop_at = time.perf_counter() + duration
+
+    def client(index):
+        rng = random.Random(index)
+        session = requests.Session() # Keep-alive, like a browser or the Next.js server
+        while time.perf_counter() < stop_at:
+            url = base_url + make_url(rng, num_players)
+            started = time.perf_counter()
+            try:
+                response = session.get(url, timeout=30)
+                ok = response.status_code in (200, 404)
+            except requests.exceptions.RequestException:
+                ok = False
+            latencies[index].append(time.perf_counter() - started)
+            if not ok:
+                errors[index] += 1
+        session.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    ordered = sorted(l for client_latencies in latencies for l in client_latencies)
+    pick = lambda fraction: ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+    return len(ordered) / wall, pick(0.50), pick(0.99), pick(0.999), sum(errors)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Test an already running server instead of starting one.")
+    parser.add_argument("--server", choices=["gunicorn", "dev"], default="dev")
+    parser.add_argument("--db", help="Database to serve (default: a synthetic one in a temp dir).")
+    parser.add_argument("--num-players", type=int, default=30_000, help="Synthetic DB size / id range for requests.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per concurrency level.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=list(CONCURRENCY_LEVELS))
+    args = parser.parse_args()
+    if not args.url and args.server == "gunicorn" and importlib.util.find_spec("gunicorn") is None:
+        parser.error("gunicorn is not installed (pip install gunicorn); use --server dev for the Flask server")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        process = None
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            db_path = args.db
+            if db_path is None:
+                db_path = os.path.join(tmp_dir, "loadtest.db")
+                prepare_database(db_path, args.num_players)
+            process, base_url = start_server(args.server, db_path, free_port(), args.workers, args.threads,
+                                             os.path.join(tmp_dir, "server.log"))
+        try:
+            label = args.url or (f"gunicorn {args.workers} worker(s) x {args.threads} threads" if args.server == "gunicorn"
+                                 else "Flask dev server (threaded)")
+            print(f"Target: {label}; {args.duration:.0f} s per level; client CPUs: {os.cpu_count()}")
+            print(f"{'clients':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'p99.9 ms':>10}{'errors':>8}")
+            for clients in args.concurrency:
+                rps, p50, p99, p999, errors = run_level(base_url, clients, args.duration, args.num_players)
+                print(f"{clients:>8}{rps:>10.0f}{p50 * 1000:>10.2f}{p99 * 1000:>10.2f}{p999 * 1000:>10.2f}{errors:>8}")
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=30)
@@ -0,0 +1,108 @@
+"""
+Benchmark: /api/players/search?name=... via LIKE '%x%' (previous query) vs. the player_search indexes.
+
+Runs the same set of keystroke-style queries (pieces of names, 1-8 characters, with and without
+accents) both ways against a synthetic database and reports p50/p99 latency. The synthetic names
+reuse 40 words, so every word query matches ~1/20 of all players: a worst case for ranking.
+The "distinctive" rows type a surname plus part of the number that makes each synthetic name
+unique, which is closer to searching for one particular player. The index column times the
+whole search_players view (every rank tier it queries plus the final join), not just the SQL.
+
+Usage: python benchmarks/bench_name_search.py [num_players]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import unittest.mock
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api
+from load_data import rebuild_player_current_value
+from player_search import fold_name, rebuild_player_search_index
+from synthetic_db import FIRST_NAMES, LAST_NAMES, build_synthetic_db
+
+NUM_QUERIES = 400
+SELECT = """
+    SELECT p.player_id, p.name, p.position, p.sub_position, p.date_of_birth, c.name AS club_name,
+           c.domestic_competition_id AS league_id, cv.market_value_in_eur AS current_market_value_eur
+    FROM players p
+    LEFT JOIN clubs c ON p.current_club_id = c.club_id
+    LEFT JOIN player_current_value cv ON cv.player_id = p.player_id
+"""
+
+
+def like_search(conn, text):
+    return conn.execute(SELECT + " WHERE 1=1 AND p.name LIKE ? ORDER BY p.name LIMIT 50", (f"%{text}%",)).fetchall()
+
+
+def index_search(conn, text):
+    """Runs api.search_players for `text` as the endpoint would, with every query it makes going to `conn`."""
+    def conn_query_db(query, args=(), one=False):
+        return [dict(row) for row in conn.execute(query, args)]
+    with unittest.mock.patch.object(api, 'query_db', conn_query_db), \
+         api.app.test_request_context('/api/players/search', query_string={'name': text, 'limit': 50}):
+        response = api.search_players()
+    return response.get_json()
+
+
+def make_queries(seed=5):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(NUM_QUERIES):
+        word = rng.choice(FIRST_NAMES + LAST_NAMES)
+        if rng.random() < 0.5:
+            word = fold_name(word) # Typed without accents
+        start = rng.randint(0, max(0, len(word) - 2))
+        queries.append(word[start:start + rng.randint(2, 8)])
+    return queries
+
+
+def make_distinctive_queries(num_players, seed=6):
+    rng = random.Random(seed)
+    return [f"{fold_name(rng.choice(LAST_NAMES))} {str(rng.randint(1, num_players))[:3]}" for _ in range(NUM_QUERIES // 4)]
+
+
+def measure(conn, search, queries):
+    latencies = []
+    for text in queries:
+        started = time.perf_counter()
+        search(conn, text)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99) - 1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("num_players", type=int, nargs="?", default=30_000)
+    num_players = parser.parse_args().num_players
+    queries = make_queries()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = build_synthetic_db(os.path.join(tmp_dir, "bench.db"), num_players=num_players,
+                                  derived_tables=False)
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            rebuild_player_current_value(conn)
+            started = time.perf_counter()
+            rebuild_player_search_index(conn)
+            build_time = time.perf_counter() - started
+        print(f"Synthetic DB: {num_players:,} players; player_search built in {build_time:.2f} s")
+        print(f"{'query length':<14}{'mode':<12}{'p50 ms':>10}{'p99 ms':>10}")
+        for label, subset in (("1-2 chars", [q for q in queries if len(fold_name(q)) < 3]),
+                              ("3+ chars", [q for q in queries if len(fold_name(q)) >= 3]),
+                              ("distinctive", make_distinctive_queries(num_players))):
+            for text in subset:
+                index_search(conn, text) # Warm the page cache for each query once
+            for mode, search in (("LIKE", like_search), ("index", index_search)):
+                p50, p99 = measure(conn, search, subset)
+                print(f"{label:<14}{mode:<12}{p50 * 1000:>10.2f}{p99 * 1000:>10.2f}")
+        accented = len(index_search(conn, "mbappe")), len(like_search(conn, "mbappe"))
+        print(f"'mbappe' matches: index {accented[0]}, LIKE {accented[1]}")
+        conn.close()
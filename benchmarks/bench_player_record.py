@@ -0,0 +1,93 @@
+"""
+Memory benchmark: raw API player dicts vs. PlayerRecord.
+
+Builds a 10k-player fixture shaped like the /clubs/{id}/players payload, then measures with
+tracemalloc how many bytes per player stay alive when the scraper keeps
+  * before: the decoded API dicts, each tagged with 'clubName' (the old pipeline), and
+  * after:  one PlayerRecord per player, with the raw dicts released after extraction.
+
+Usage: python benchmarks/bench_player_record.py [num_players]
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transfermarkt_scraper import PlayerRecord
+
+PLAYERS_PER_CLUB = 25
+POSITIONS = ["Goalkeeper", "Centre-Back", "Left-Back", "Right-Back", "Defensive Midfield", "Central Midfield",
+             "Attacking Midfield", "Left Winger", "Right Winger", "Centre-Forward"]
+
+
+def make_payloads(num_players, seed=7):
+    """Returns a list of (club_name, JSON payload) pairs, as they would arrive from the API."""
+    rng = random.Random(seed)
+    payloads = []
+    for club_index in range(0, num_players, PLAYERS_PER_CLUB):
+        players = []
+        for i in range(club_index, min(club_index + PLAYERS_PER_CLUB, num_players)):
+            players.append({
+                "id": str(100000 + i),
+                "name": f"Player Number {i}",
+                "position": rng.choice(POSITIONS),
+                "dateOfBirth": f"{rng.randint(1985, 2006)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                "age": rng.randint(17, 39),
+                "nationality": ["Country"],
+                "height": rng.randint(165, 200),
+                "foot": rng.choice(["left", "right", "both"]),
+                "joinedOn": "2022-07-01",
+                "signedFrom": "Some Other Club",
+                "contract": "2027-06-30",
+                "marketValue": rng.randint(1, 2000) * 100_000,
+                "status": "Team captain" if i % 25 == 0 else None,
+            })
+        payloads.append((f"Club {club_index // PLAYERS_PER_CLUB}", json.dumps({"id": str(club_index), "players": players})))
+    return payloads
+
+
+def retained_bytes(build):
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    gc.collect()
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, len(kept)
+
+
+def keep_raw_dicts(payloads):
+    kept = []
+    for club_name, payload in payloads:
+        for player in json.loads(payload)["players"]:
+            player["clubName"] = club_name
+            kept.append(player)
+    return kept
+
+
+def keep_records(payloads):
+    kept = []
+    for club_name, payload in payloads:
+        kept.extend(PlayerRecord.from_api(player, club_name) for player in json.loads(payload)["players"])
+    return kept
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("num_players", type=int, nargs="?", default=10_000)
+    num_players = parser.parse_args().num_players
+    payloads = make_payloads(num_players)
+
+    before_bytes, before_count = retained_bytes(lambda: keep_raw_dicts(payloads))
+    after_bytes, after_count = retained_bytes(lambda: keep_records(payloads))
+    assert before_count == after_count == num_players
+
+    print(f"{num_players:,} players")
+    print(f"  before (API dicts): {before_bytes / num_players:7.0f} bytes/player ({before_bytes / 1024 / 1024:.2f} MiB)")
+    print(f"  after (PlayerRecord): {after_bytes / num_players:5.0f} bytes/player ({after_bytes / 1024 / 1024:.2f} MiB)")
+    print(f"  reduction: {before_bytes / after_bytes:.1f}x")
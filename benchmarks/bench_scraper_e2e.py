@@ -0,0 +1,120 @@
+"""
+End-to-end scraper benchmark against the local mock Transfermarkt API.
+
+Scenarios:
+  1. get_top_league_players_by_value for a single league (in-process, client-side latencies)
+  2. the full `python transfermarkt_scraper.py` run for all leagues (subprocess, server-side latencies)
+
+Each reports wall time, requests/s and p50/p99 request latency. Server behaviour (latency,
+error rate, 429 bursts) and the scraper's request budget are configurable from the command line.
+
+Usage: python benchmarks/bench_scraper_e2e.py --latency-ms 80 --requests-per-second 20 --max-concurrent-requests 8
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import transfermarkt_scraper
+from mock_transfermarkt_server import MockTransfermarktServer
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def report(label, wall_time, latencies, status_counts=None):
+    count = len(latencies)
+    print(f"\n== {label} ==")
+    print(f"  requests:      {count}")
+    print(f"  wall time:     {wall_time:.2f} s")
+    print(f"  throughput:    {count / wall_time if wall_time else 0:.1f} req/s")
+    print(f"  latency p50:   {percentile(latencies, 0.50) * 1000:.1f} ms")
+    print(f"  latency p99:   {percentile(latencies, 0.99) * 1000:.1f} ms")
+    if status_counts:
+        print(f"  status counts: {dict(sorted(status_counts.items()))}")
+
+
+def bench_single_league(server, args):
+    """Runs one league in-process, timing every HTTP call on the client side."""
+    transfermarkt_scraper.API_BASE_URL = server.base_url
+    transfermarkt_scraper.configure_request_budget(args.max_concurrent_requests, args.requests_per_second)
+    transfermarkt_scraper.configure_http_session(pool_size=args.max_concurrent_requests)
+    transfermarkt_scraper.reset_circuit_breakers()
+
+    latencies = []
+    original_http_get = transfermarkt_scraper.http_get
+
+    def timed_http_get(url, headers, timeout):
+        started = time.perf_counter()
+        try:
+            return original_http_get(url, headers=headers, timeout=timeout)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    transfermarkt_scraper.http_get = timed_http_get
+    server.reset_stats()
+    try:
+        started = time.perf_counter()
+        players = transfermarkt_scraper.get_top_league_players_by_value("Mock League", args.league, 100)
+        wall_time = time.perf_counter() - started
+    finally:
+        transfermarkt_scraper.http_get = original_http_get
+
+    report(f"get_top_league_players_by_value({args.league}) -> {len(players)} players", wall_time, latencies, server.status_counts)
+    print(f"  connections:   {transfermarkt_scraper.get_connection_stats()}")
+
+
+def bench_full_run(server, args):
+    """Runs the scraper's __main__ flow in a subprocess, using the server's view of request latency."""
+    env = {**os.environ, "TRANSFERMARKT_API_BASE_URL": server.base_url}
+    command = [sys.executable, os.path.join(REPO_ROOT, "transfermarkt_scraper.py"), "--no-cache",
+               "--max-concurrent-requests", str(args.max_concurrent_requests),
+               "--requests-per-second", str(args.requests_per_second)]
+    server.reset_stats()
+    with tempfile.TemporaryDirectory() as work_dir:
+        started = time.perf_counter()
+        result = subprocess.run(command, cwd=work_dir, env=env, capture_output=True, text=True)
+        wall_time = time.perf_counter() - started
+        output_path = os.path.join(work_dir, "top_players_by_market_value_api_v2.csv")
+        rows = sum(1 for _ in open(output_path, encoding='utf-8')) - 1 if os.path.exists(output_path) else 0
+
+    if result.returncode != 0:
+        print(result.stdout[-2000:])
+        print(result.stderr[-2000:])
+        raise SystemExit(f"Scraper exited with status {result.returncode}")
+    report(f"full __main__ run -> {rows} CSV rows (server-side latencies)", wall_time, list(server.latencies), server.status_counts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--burst-every", type=int, default=0)
+    parser.add_argument("--burst-length", type=int, default=0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--max-concurrent-requests", type=int, default=transfermarkt_scraper.MAX_CONCURRENT_REQUESTS)
+    parser.add_argument("--requests-per-second", type=float, default=20.0)
+    parser.add_argument("--league", default="GB1")
+    parser.add_argument("--skip-full-run", action="store_true")
+    args = parser.parse_args()
+
+    with MockTransfermarktServer(latency_ms=args.latency_ms, latency_jitter_ms=args.latency_jitter_ms,
+                                 error_rate=args.error_rate, burst_every=args.burst_every,
+                                 burst_length=args.burst_length, retry_after=args.retry_after) as mock_server:
+        print(f"Mock API at {mock_server.base_url}: latency {args.latency_ms}±{args.latency_jitter_ms} ms, "
+              f"error rate {args.error_rate}, 429 bursts {args.burst_length} every {args.burst_every}")
+        print(f"Scraper budget: {args.max_concurrent_requests} in flight, {args.requests_per_second} req/s")
+        bench_single_league(mock_server, args)
+        if not args.skip_full_run:
+            bench_full_run(mock_server, args)
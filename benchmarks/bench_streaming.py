@@ -0,0 +1,52 @@
+"""
+Benchmark: one big JSON array vs. the NDJSON stream for a full export from /api/players/search.
+
+Requests every player of a synthetic database (limit = all rows) both ways through Flask's test
+client and reports wall time and the peak Python memory allocated while building/consuming the
+response (tracemalloc). The NDJSON body is consumed chunk by chunk, as a client reading the socket would.
+
+Usage: python benchmarks/bench_streaming.py [num_players]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api
+from synthetic_db import build_synthetic_db
+
+
+def export(client, url):
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = client.get(url, buffered=False)
+    received = 0
+    for chunk in response.response:
+        received += len(chunk)
+    response.close()
+    elapsed = time.perf_counter() - started
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, received
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("num_players", type=int, nargs="?", default=30_000)
+    num_players = parser.parse_args().num_players
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        api.DATABASE = build_synthetic_db(os.path.join(tmp_dir, "bench.db"), num_players=num_players)
+        client = api.app.test_client()
+        print(f"Exporting all {num_players:,} players")
+        print(f"{'format':<10}{'seconds':>10}{'peak MiB':>12}{'body MiB':>12}")
+        for label, url in (("json", f"/api/players/search?limit={num_players}"),
+                           ("ndjson", f"/api/players/search?limit={num_players}&format=ndjson")):
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                elapsed, peak, received = export(client, url)
+            print(f"{label:<10}{elapsed:>10.2f}{peak / 2**20:>12.1f}{received / 2**20:>12.1f}")
+        api.get_pool().close_all()
@@ -0,0 +1,74 @@
+"""
+Micro-benchmark: full sort + slice vs. heap-based select_top_players.
+
+Builds synthetic leagues of 100k players (with a share of missing/invalid market values and
+many ties), checks that both approaches return exactly the same players in the same order,
+and reports the best-of-N wall time and peak traced memory of each.
+
+Usage: python benchmarks/bench_top_n.py [num_players] [top_n]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transfermarkt_scraper import get_market_value_int, select_top_players
+
+REPEATS = 5
+
+
+def make_players(count, seed=42):
+    rng = random.Random(seed)
+    players = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.05:
+            market_value = None
+        elif roll < 0.07:
+            market_value = 'not-a-number'
+        else:
+            # Coarse values so that plenty of players tie, which exercises the stable ordering
+            market_value = rng.randint(0, 2000) * 100_000
+        players.append({'id': str(i), 'name': f'Player {i}', 'marketValue': market_value})
+    return players
+
+
+def sort_and_slice(players, num_players):
+    """The previous implementation: sort the whole league (parsing twice per key), then slice."""
+    ordered = sorted(players, key=lambda p: get_market_value_int(p) if get_market_value_int(p) is not None else float('-inf'), reverse=True)
+    return [(get_market_value_int(p), p) for p in ordered[:num_players]]
+
+
+def measure(func, players, num_players):
+    best = float('inf')
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(players, num_players)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    func(players, num_players)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("num_players", type=int, nargs="?", default=100_000)
+    parser.add_argument("top_n", type=int, nargs="?", default=100)
+    args = parser.parse_args()
+    num_players, top_n = args.num_players, args.top_n
+    players = make_players(num_players)
+
+    expected = sort_and_slice(players, top_n)
+    actual = select_top_players(players, top_n)
+    assert [(v, p['id']) for v, p in actual] == [(v, p['id']) for v, p in expected], "Orderings differ!"
+    print(f"Orderings identical for top {top_n} of {num_players:,} players.")
+
+    for label, func in (("sort + slice", sort_and_slice), ("heap select", select_top_players)):
+        best, peak = measure(func, players, top_n)
+        print(f"{label:>13}: best of {REPEATS} = {best * 1000:8.1f} ms, peak extra memory = {peak / 1024:9.1f} KiB")
@@ -0,0 +1,87 @@
+"""
+Benchmark: /api/players/<id>/valuations payload size and latency per response variant.
+
+Builds a synthetic database of long-career players (300 weekly valuations each by default) and fetches
+every player's history through Flask's test client as full rows, columns, quarterly buckets,
+LTTB-downsampled to 100 points, and as a revalidation with a matching If-None-Match (304).
+Reports mean bytes per response (raw and gzip -6, as a compressing proxy would send them) and
+mean latency with the response cache cleared before every request.
+
+Usage: python benchmarks/bench_valuation_payload.py [valuations_per_player]
+"""
+import argparse
+import gzip
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api
+from synthetic_db import build_synthetic_db
+
+NUM_PLAYERS = 200
+VARIANTS = [
+    ("rows (default)", ""),
+    ("columns", "?shape=columns"),
+    ("bucket=quarter", "?bucket=quarter"),
+    ("points=100", "?points=100"),
+    ("points=100, columns", "?points=100&shape=columns"),
+]
+
+
+def add_long_histories(path, per_player, seed=19):
+    """Replaces the synthetic valuations with `per_player` weekly points per player (bounded random walk)."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("DELETE FROM player_valuations;")
+    rows = []
+    for player_id in range(1, NUM_PLAYERS + 1):
+        value, day = rng.randint(10, 400) * 100_000, date(2012, 1, 1)
+        for _ in range(per_player):
+            value = min(200_000_000, max(25_000, int(value * rng.uniform(0.9, 1.1))))
+            rows.append((player_id, day.isoformat(), value, None, None))
+            day += timedelta(days=7)
+    conn.executemany("INSERT INTO player_valuations VALUES (?, ?, ?, ?, ?);", rows)
+    conn.commit()
+    conn.close()
+
+
+def measure(client, query, etags=None):
+    sizes, gzipped, latencies = [], [], []
+    for player_id in range(1, NUM_PLAYERS + 1):
+        headers = {'If-None-Match': etags[player_id]} if etags else {}
+        api.response_cache.clear() # Measure the query + downsampling + serialization, not cache hits
+        started = time.perf_counter()
+        response = client.get(f"/api/players/{player_id}/valuations{query}", headers=headers)
+        latencies.append(time.perf_counter() - started)
+        body = response.get_data()
+        sizes.append(len(body))
+        gzipped.append(len(gzip.compress(body, 6)) if body else 0)
+    count = len(sizes)
+    return sum(sizes) / count, sum(gzipped) / count, sum(latencies) / count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("valuations_per_player", type=int, nargs="?", default=300)
+    per_player = parser.parse_args().valuations_per_player
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        api.DATABASE = build_synthetic_db(os.path.join(tmp_dir, "bench.db"), num_players=NUM_PLAYERS)
+        add_long_histories(api.DATABASE, per_player)
+        client = api.app.test_client()
+        print(f"Synthetic DB: {NUM_PLAYERS} players x {per_player} valuations")
+        print(f"{'variant':<24}{'bytes':>10}{'gzip bytes':>12}{'ms':>8}")
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            results = [(label, measure(client, query)) for label, query in VARIANTS]
+            etags = {player_id: client.get(f"/api/players/{player_id}/valuations?points=100").headers['ETag']
+                     for player_id in range(1, NUM_PLAYERS + 1)}
+            results.append(("304 revalidation", measure(client, "?points=100", etags)))
+        for label, (size, gzipped, latency) in results:
+            print(f"{label:<24}{size:>10.0f}{gzipped:>12.0f}{latency * 1000:>8.2f}")
+        api.get_pool().close_all()
@@ -0,0 +1,103 @@
+"""
+Builds a synthetic transfermarkt_data.db for API/loader benchmarks.
+
+The tables and columns mirror what load_data.py produces from the Kaggle CSVs and what api.py
+queries, at a configurable scale (default: ~30k players with ~15 valuations each), including the
+derived tables (player_current_value, player_leaderboard, the player_search index) the API reads.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+from contextlib import redirect_stdout
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_data import rebuild_player_current_value, rebuild_player_leaderboard
+from player_search import rebuild_player_search_index
+
+LEAGUES = [("GB1", "premier-league", "England"), ("ES1", "laliga", "Spain"), ("FR1", "ligue-1", "France"),
+           ("IT1", "serie-a", "Italy"), ("L1", "bundesliga", "Germany"), ("NL1", "eredivisie", "Netherlands"),
+           ("PO1", "liga-portugal", "Portugal"), ("TR1", "super-lig", "Turkey")]
+POSITIONS = {
+    "Goalkeeper": ["Goalkeeper"],
+    "Defender": ["Centre-Back", "Left-Back", "Right-Back"],
+    "Midfield": ["Defensive Midfield", "Central Midfield", "Attacking Midfield"],
+    "Attack": ["Left Winger", "Right Winger", "Centre-Forward"],
+}
+FIRST_NAMES = ["Kylian", "Erling", "Jude", "Vinícius", "Bukayo", "Jamal", "Pedri", "Florian", "Rodrygo", "Phil",
+               "Martin", "Declan", "Federico", "Lautaro", "Rafael", "Khvicha", "Joško", "Dušan", "Gonçalo", "Müller"]
+LAST_NAMES = ["Mbappé", "Haaland", "Bellingham", "Júnior", "Saka", "Musiala", "González", "Wirtz", "Goes", "Foden",
+              "Ødegaard", "Rice", "Valverde", "Martínez", "Leão", "Kvaratskhelia", "Gvardiol", "Vlahović", "Ramos", "Šeško"]
+
+
+def build_synthetic_db(path, num_players=30_000, valuations_per_player=15, clubs_per_league=20, seed=11,
+                       derived_tables=True):
+    """
+    Creates (or replaces) the SQLite file at path and fills it with deterministic synthetic data.
+    Pass derived_tables=False to leave the derived tables out, e.g. to time their rebuild.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE leagues (competition_id TEXT PRIMARY KEY, competition_code TEXT, name TEXT, country_name TEXT);
+        CREATE TABLE clubs (club_id INTEGER PRIMARY KEY, name TEXT, domestic_competition_id TEXT);
+        CREATE TABLE players (player_id INTEGER PRIMARY KEY, name TEXT, current_club_id INTEGER, date_of_birth DATE,
+                              position TEXT, sub_position TEXT, foot TEXT, height_in_cm INTEGER,
+                              country_of_citizenship TEXT, image_url TEXT, agent_name TEXT);
+        CREATE TABLE player_valuations (player_id INTEGER NOT NULL, date DATE, market_value_in_eur INTEGER,
+                                        current_club_id INTEGER, player_club_domestic_competition_id TEXT);
+    """)
+    conn.executemany("INSERT INTO leagues VALUES (?, ?, ?, ?);",
+                     [(code, slug, slug.replace('-', ' ').title(), country) for code, slug, country in LEAGUES])
+    clubs = []
+    for league_index, (code, _slug, _country) in enumerate(LEAGUES):
+        for i in range(clubs_per_league):
+            clubs.append(((league_index + 1) * 1000 + i, f"{code} Club {i + 1}", code))
+    conn.executemany("INSERT INTO clubs VALUES (?, ?, ?);", clubs)
+
+    players = []
+    valuations = []
+    start = date(2010, 1, 1)
+    for player_id in range(1, num_players + 1):
+        club_id, _club_name, league_id = rng.choice(clubs)
+        position = rng.choice(list(POSITIONS))
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {player_id}"
+        birth = date(rng.randint(1984, 2007), rng.randint(1, 12), rng.randint(1, 28))
+        players.append((player_id, name, club_id, birth.isoformat(), position, rng.choice(POSITIONS[position]),
+                        rng.choice(["left", "right", "both"]), rng.randint(165, 200), "Country", None, None))
+        value = rng.randint(1, 400) * 100_000
+        day = start + timedelta(days=rng.randint(0, 900))
+        for _ in range(valuations_per_player):
+            value = max(25_000, int(value * rng.uniform(0.7, 1.5)))
+            valuations.append((player_id, day.isoformat(), value, club_id, league_id))
+            day += timedelta(days=rng.randint(60, 200))
+    conn.executemany("INSERT INTO players VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);", players)
+    rng.shuffle(valuations) # Loaded CSVs are not clustered by player
+    conn.executemany("INSERT INTO player_valuations VALUES (?, ?, ?, ?, ?);", valuations)
+    conn.executescript("""
+        CREATE INDEX idx_player_valuations_player_date ON player_valuations (player_id, date);
+        CREATE INDEX idx_player_valuations_date ON player_valuations (date);
+        CREATE INDEX idx_players_club ON players (current_club_id);
+        CREATE INDEX idx_clubs_league ON clubs (domestic_competition_id);
+    """)
+    conn.commit()
+    if derived_tables:
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            rebuild_player_current_value(conn)
+            rebuild_player_leaderboard(conn)
+            rebuild_player_search_index(conn)
+    conn.close()
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("target", type=str, nargs="?", default="synthetic_transfermarkt_data.db")
+    target = parser.parse_args().target
+    build_synthetic_db(target)
+    print(f"Wrote {target}")
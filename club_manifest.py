@@ -0,0 +1,97 @@
+"""
+Per-club roster manifest for incremental scraping.
+
+The manifest remembers, for every club the scraper has fetched, when its roster was last
+downloaded, a content hash of that roster and the roster itself. On the next run only clubs
+whose entry is older than the refresh interval are fetched again; the rest are served from
+the manifest and merged with the fresh rosters before the sort and top-N step.
+"""
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+# --- Configuration ---
+DEFAULT_MANIFEST_FILE = "club_manifest.json"
+CLUB_REFRESH_INTERVAL_HOURS = 24 # Re-fetch a club's roster if the stored copy is older than this
+
+
+def roster_content_hash(players):
+    """Stable SHA-256 of a roster, independent of dict key order."""
+    payload = json.dumps(players, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ClubManifest:
+    """JSON-file backed store of {club_id: fetched_at, content_hash, roster}. Safe to share between threads."""
+    def __init__(self, path=DEFAULT_MANIFEST_FILE, refresh_interval_hours=CLUB_REFRESH_INTERVAL_HOURS):
+        self.path = path
+        self.refresh_interval = timedelta(hours=refresh_interval_hours)
+        self.reused = 0
+        self.refetched = 0
+        self.changed = 0
+        self._lock = threading.Lock()
+        self._clubs = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    data = json.load(f)
+                clubs = data.get('clubs', {}) if isinstance(data, dict) else None
+                if not isinstance(clubs, dict):
+                    raise ValueError("expected a JSON object with a 'clubs' object")
+                self._clubs = clubs
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not read club manifest {path}: {e}. Starting from an empty manifest.")
+
+    def get_fresh_roster(self, club_id, now=None):
+        """Returns a copy of the stored roster if it is within the refresh interval, else None."""
+        now = now or datetime.now()
+        with self._lock:
+            entry = self._clubs.get(str(club_id))
+            if entry is None:
+                return None
+            try:
+                fetched_at = datetime.fromisoformat(entry['fetched_at'])
+            except (KeyError, TypeError, ValueError):
+                return None
+            if now - fetched_at >= self.refresh_interval:
+                return None
+            self.reused += 1
+            return [dict(player) for player in entry.get('players', [])]
+
+    def record_roster(self, club_id, club_name, players, now=None):
+        """Stores a freshly fetched roster. Returns True if its content differs from the previous copy."""
+        now = now or datetime.now()
+        content_hash = roster_content_hash(players)
+        with self._lock:
+            previous = self._clubs.get(str(club_id))
+            changed = previous is None or previous.get('content_hash') != content_hash
+            self._clubs[str(club_id)] = {
+                'club_name': club_name,
+                'fetched_at': now.isoformat(timespec='seconds'),
+                'content_hash': content_hash,
+                'players': [dict(player) for player in players],
+            }
+            self.refetched += 1
+            if changed:
+                self.changed += 1
+            return changed
+
+    def stats(self):
+        with self._lock:
+            return {
+                'reused': self.reused,
+                'refetched': self.refetched,
+                'changed': self.changed,
+                'unchanged': self.refetched - self.changed,
+            }
+
+    def save(self):
+        """Writes the manifest atomically so an interrupted run never leaves a truncated file."""
+        with self._lock:
+            payload = {'version': 1, 'clubs': self._clubs}
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
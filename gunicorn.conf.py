@@ -0,0 +1,49 @@
+# gunicorn.conf.py
+# Production serving settings for wsgi.py:  gunicorn -c gunicorn.conf.py wsgi:app
+# Every setting can be overridden from the environment (API_*) without editing this file.
+
+import multiprocessing
+import os
+
+# --- Binding ---
+bind = os.environ.get("API_BIND", "0.0.0.0:5001") # Same port as the dev server, so the frontend config doesn't change
+
+# --- Workers ---
+# SQLite reads run in C with the GIL released only part of the time, so CPU parallelism comes from
+# processes: one worker per core. Threads inside each worker overlap request parsing/JSON encoding
+# with the SQLite work of other requests and keep slow clients from blocking a whole worker.
+workers = int(os.environ.get("API_WORKERS", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.environ.get("API_THREADS", 8))
+
+# Load api.py once in the master; workers fork from it. The connection pool and response cache
+# are created lazily per worker process (api.get_pool() checks the pid), so nothing is shared.
+preload_app = True
+
+# --- Connections ---
+keepalive = int(os.environ.get("API_KEEPALIVE", 5)) # Seconds to hold idle keep-alive connections (frontends reuse them)
+timeout = int(os.environ.get("API_TIMEOUT", 30)) # Restart a worker stuck on one request for this long
+graceful_timeout = 30
+
+# Recycle workers now and then (with jitter, so they don't all restart together) to cap memory growth
+max_requests = int(os.environ.get("API_MAX_REQUESTS", 20000))
+max_requests_jitter = 2000
+
+# Heartbeat files on tmpfs when available, so a slow disk can't make healthy workers look hung
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+
+# --- Logging ---
+accesslog = os.environ.get("API_ACCESS_LOG") # e.g. "-" for stdout; off by default (it costs throughput)
+errorlog = "-"
+loglevel = os.environ.get("API_LOG_LEVEL", "info")
+
+# The api loggers (sampled api.requests JSON lines, api.slow_queries warnings) only reach a
+# handler if they are configured here; without this their INFO lines are dropped. gunicorn merges
+# this over its default config (keeping its "error_console" stderr handler), and listing only "api"
+# leaves the gunicorn.error/gunicorn.access setup above untouched.
+logconfig_dict = {
+    "loggers": {
+        "api": {"level": loglevel.upper(), "handlers": ["error_console"], "propagate": False},
+    },
+}
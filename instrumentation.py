@@ -0,0 +1,246 @@
+"""
+Request and SQL instrumentation for api.py, exposed in Prometheus text format.
+
+Records, per Flask endpoint:
+  - request count by status and a request duration histogram
+  - SQL execution time per query (histogram) and rows returned
+  - JSON serialization time (histogram)
+  - slow queries: counted, and logged with their EXPLAIN QUERY PLAN (rate-limited per statement)
+A sampled fraction of requests is also logged as one JSON line with the per-request breakdown.
+
+Everything lives in process memory: under gunicorn each worker exposes its own numbers on
+/metrics, so scrape every worker (or sum them in the scraper). With API_INSTRUMENTATION=0 the
+hooks return after a single flag check and nothing is recorded.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+# --- Configuration ---
+ENABLED = os.environ.get("API_INSTRUMENTATION", "1") != "0"
+REQUEST_LOG_SAMPLE_RATE = float(os.environ.get("API_REQUEST_LOG_SAMPLE_RATE", 0.01)) # Fraction of requests logged as JSON lines
+SLOW_QUERY_MS = float(os.environ.get("API_SLOW_QUERY_MS", 100)) # Queries at least this slow get logged with their plan
+SLOW_QUERY_LOG_INTERVAL = 60 # Seconds before the same slow statement is logged (and EXPLAINed) again
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0) # Seconds
+
+request_log = logging.getLogger("api.requests")
+slow_query_log = logging.getLogger("api.slow_queries")
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms keyed by (metric name, label values)."""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {} # name -> {labels: value}
+        self._histograms = {} # name -> {labels: [bucket counts..., overflow, sum, count]}
+        self._help = {}
+
+    def describe(self, name, kind, help_text):
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name, labels, value=1):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + value
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            state = series.get(labels)
+            if state is None:
+                state = series[labels] = [0] * (len(self.buckets) + 3) # Buckets, +Inf overflow, sum, count
+            state[bisect_left(self.buckets, value)] += 1 # Per bucket (index len(buckets) = +Inf only); cumulated when rendered
+            state[-2] += value
+            state[-1] += 1
+
+    def value(self, name, labels):
+        """Current counter value, or a histogram's observation count (for tests and reports)."""
+        with self._lock:
+            if name in self._counters:
+                return self._counters[name].get(labels, 0)
+            state = self._histograms.get(name, {}).get(labels)
+            return state[-1] if state else 0
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self, label_names, gauges=()):
+        """
+        Prometheus text exposition (format 0.0.4). label_names maps metric name -> tuple of label
+        names; gauges is an iterable of (name, help, value) for point-in-time values.
+        """
+        lines = []
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: {labels: list(state) for labels, state in series.items()}
+                          for name, series in self._histograms.items()}
+        for name in sorted(counters):
+            self._header(lines, name, 'counter')
+            for labels, value in sorted(counters[name].items()):
+                lines.append(f"{name}{_labels(label_names.get(name, ()), labels)} {_number(value)}")
+        for name in sorted(histograms):
+            self._header(lines, name, 'histogram')
+            names = label_names.get(name, ())
+            for labels, state in sorted(histograms[name].items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, state):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(names + ('le',), labels + (_number(bound),))} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(names + ('le',), labels + ('+Inf',))} {state[-1]}")
+                lines.append(f"{name}_sum{_labels(names, labels)} {_number(state[-2])}")
+                lines.append(f"{name}_count{_labels(names, labels)} {state[-1]}")
+        for name, help_text, value in gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines, name, default_kind):
+        kind, help_text = self._help.get(name, (default_kind, name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = MetricsRegistry()
+LABEL_NAMES = {
+    'api_requests_total': ('endpoint', 'method', 'status'),
+    'api_request_duration_seconds': ('endpoint',),
+    'api_sql_query_duration_seconds': ('endpoint',),
+    'api_sql_rows_total': ('endpoint',),
+    'api_sql_slow_queries_total': ('endpoint',),
+    'api_serialization_duration_seconds': ('endpoint',),
+}
+registry.describe('api_requests_total', 'counter', "Requests handled, by endpoint, method and status.")
+registry.describe('api_request_duration_seconds', 'histogram', "Time from request start until the response is returned (streamed bodies: until the first byte).")
+registry.describe('api_sql_query_duration_seconds', 'histogram', "SQLite execution and fetch time per query.")
+registry.describe('api_sql_rows_total', 'counter', "Rows returned by SQL queries.")
+registry.describe('api_sql_slow_queries_total', 'counter', "Queries slower than API_SLOW_QUERY_MS.")
+registry.describe('api_serialization_duration_seconds', 'histogram', "Time spent encoding JSON response bodies, per request.")
+
+_slow_logged_at = {} # statement text -> monotonic time it was last logged
+_slow_lock = threading.Lock()
+
+
+class RequestStats:
+    """Per-request accumulator, stored on flask.g once so the hot path does a single lookup."""
+    __slots__ = ('endpoint', 'started', 'sql_seconds', 'sql_queries', 'sql_rows', 'serialize_seconds', 'serializations')
+
+    def __init__(self, endpoint, started):
+        self.endpoint = endpoint
+        self.started = started
+        self.sql_seconds = 0.0
+        self.sql_queries = 0
+        self.sql_rows = 0
+        self.serialize_seconds = 0.0
+        self.serializations = 0
+
+
+def _current_stats():
+    return g.get('_request_stats') if has_request_context() else None
+
+
+def record_query(conn, query, args, seconds, rows, endpoint=None):
+    """
+    Records one executed query. Call with the connection that ran it still borrowed: slow queries
+    are EXPLAINed on the same connection (same schema, same parameters). `endpoint` labels queries
+    run outside the request (streamed responses); otherwise the current request's endpoint is used.
+    """
+    stats = _current_stats() if endpoint is None else None
+    if stats is not None:
+        endpoint = stats.endpoint
+        stats.sql_seconds += seconds
+        stats.sql_queries += 1
+        stats.sql_rows += rows
+    labels = (endpoint or 'none',)
+    registry.observe('api_sql_query_duration_seconds', labels, seconds)
+    registry.inc('api_sql_rows_total', labels, rows)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        registry.inc('api_sql_slow_queries_total', labels)
+        _log_slow_query(conn, query, args, seconds, rows, labels[0])
+
+
+def _log_slow_query(conn, query, args, seconds, rows, endpoint):
+    statement = " ".join(query.split())
+    now = time.monotonic()
+    with _slow_lock:
+        last = _slow_logged_at.get(statement)
+        if last is not None and now - last < SLOW_QUERY_LOG_INTERVAL:
+            return
+        _slow_logged_at[statement] = now
+    try:
+        plan = [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", args).fetchall()]
+    except Exception as e: # The plan is a diagnostic; never fail the request over it
+        plan = [f"<EXPLAIN failed: {e}>"]
+    slow_query_log.warning(json.dumps({
+        'event': 'slow_query', 'endpoint': endpoint, 'duration_ms': round(seconds * 1000, 3), 'rows': rows,
+        'sql': statement, 'params': args if isinstance(args, dict) else list(args), 'plan': plan,
+    }, default=str))
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, timing every dumps() made while serving an instrumented request."""
+
+    def dumps(self, obj, **kwargs):
+        stats = _current_stats() if ENABLED else None
+        if stats is None:
+            return super().dumps(obj, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            stats.serialize_seconds += time.perf_counter() - started
+            stats.serializations += 1
+
+
+def install(app):
+    """Hooks request timing and JSON serialization timing into a Flask app."""
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def _start_timer():
+        if ENABLED:
+            g._request_stats = RequestStats(request.endpoint or 'unmatched', time.perf_counter())
+
+    @app.after_request
+    def _record_request(response):
+        stats = g.get('_request_stats') if ENABLED else None
+        if stats is None:
+            return response
+        seconds = time.perf_counter() - stats.started
+        labels = (stats.endpoint,)
+        registry.inc('api_requests_total', (stats.endpoint, request.method, str(response.status_code)))
+        registry.observe('api_request_duration_seconds', labels, seconds)
+        if stats.serializations:
+            registry.observe('api_serialization_duration_seconds', labels, stats.serialize_seconds)
+        if REQUEST_LOG_SAMPLE_RATE and random.random() < REQUEST_LOG_SAMPLE_RATE:
+            request_log.info(json.dumps({
+                'event': 'request', 'endpoint': stats.endpoint, 'method': request.method,
+                'path': request.full_path.rstrip('?'), 'status': response.status_code,
+                'duration_ms': round(seconds * 1000, 3), 'sql_ms': round(stats.sql_seconds * 1000, 3),
+                'sql_queries': stats.sql_queries, 'rows': stats.sql_rows,
+                'serialize_ms': round(stats.serialize_seconds * 1000, 3), 'cache': response.headers.get('X-Cache'),
+            }))
+        return response
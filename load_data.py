@@ -1,6 +1,17 @@
+import argparse
+import io
+import json
+import re
 import sqlite3
 import pandas as pd
 import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from analytics import PYARROW_AVAILABLE, SNAPSHOT_DIR, season_of, write_valuations_snapshot
+from player_search import SEARCH_TABLE, rebuild_player_search_index, update_player_search_index
 # Remove glob as we are back to specific CSV names
 # import glob 
 
@@ -18,6 +29,22 @@ CSV_FILES = {
     "player_valuations": "player_valuations.csv"
     # Add others like 'appearances.csv' if needed
 }
+CSV_CHUNK_ROWS = 100_000 # Rows parsed and inserted per batch; bounds the loader's memory
+LOAD_WORKERS = os.cpu_count() or 1 # CSV parsing processes (--workers); 1 parses on the writer's thread
+CSV_BLOCK_BYTES = 4 * 1024 * 1024 # Bytes of CSV per parse task in the process pool (~80k valuation rows)
+CSV_BLOCKS_IN_FLIGHT = 8 # Blocks parsed or being parsed ahead of the writer, at most
+# Explicit dtypes for the Kaggle CSVs (columns a CSV lacks are ignored). Integer columns are parsed
+# as float64, which tolerates blanks and some exports' 1000000.0 style, and cast to Int64 after:
+# parsing straight into nullable Int64 is ~3x slower. Dates stay text, even in a chunk where they
+# are all blank (pandas would make that float64), so --incremental can compare them to its watermark.
+CSV_DTYPES = {
+    "leagues": {"competition_id": "str", "country_id": "float64"},
+    "clubs": {"club_id": "float64", "domestic_competition_id": "str", "squad_size": "float64", "stadium_seats": "float64"},
+    "players": {"player_id": "float64", "current_club_id": "float64", "height_in_cm": "float64",
+                "market_value_in_eur": "float64", "highest_market_value_in_eur": "float64"},
+    "player_valuations": {"player_id": "float64", "date": "str", "market_value_in_eur": "float64",
+                          "current_club_id": "float64", "player_club_domestic_competition_id": "str"},
+}
 
 # --- Database Functions (remain mostly the same) ---
 def create_connection(db_file):
@@ -40,152 +67,790 @@ def create_table(conn, create_table_sql):
     except sqlite3.Error as e:
         print(f"Error creating table: {e}")
 
+# Table definitions, shared by define_schema (live tables) and the loader (staging copies).
+# Column names follow the Kaggle CSVs, which is what api.py queries; CSV columns without a
+# column here are not loaded. {table} is filled in with the live or staging table name.
+TABLE_SCHEMAS = {
+    "leagues": """ CREATE TABLE IF NOT EXISTS {table} (
+                       competition_id TEXT PRIMARY KEY,
+                       competition_code TEXT,
+                       name TEXT,
+                       type TEXT,
+                       country_id INTEGER,
+                       country_name TEXT,
+                       domestic_league_code TEXT,
+                       confederation TEXT
+                   ); """,
+    "clubs": """ CREATE TABLE IF NOT EXISTS {table} (
+                     club_id INTEGER PRIMARY KEY,
+                     club_code TEXT,
+                     name TEXT,
+                     domestic_competition_id TEXT,
+                     squad_size INTEGER,
+                     stadium_name TEXT,
+                     stadium_seats INTEGER,
+                     coach_name TEXT,
+                     last_season INTEGER,
+                     FOREIGN KEY (domestic_competition_id) REFERENCES leagues (competition_id)
+                 ); """,
+    "players": """ CREATE TABLE IF NOT EXISTS {table} (
+                       player_id INTEGER PRIMARY KEY,
+                       first_name TEXT,
+                       last_name TEXT,
+                       name TEXT,
+                       last_season INTEGER,
+                       current_club_id INTEGER,
+                       date_of_birth DATE,
+                       position TEXT,
+                       sub_position TEXT,
+                       foot TEXT,
+                       height_in_cm INTEGER,
+                       country_of_citizenship TEXT,
+                       contract_expiration_date DATE,
+                       agent_name TEXT,
+                       image_url TEXT,
+                       market_value_in_eur INTEGER,
+                       highest_market_value_in_eur INTEGER,
+                       fotmob_player_id TEXT, -- Filled in by update_player_form.py, kept across reloads
+                       FOREIGN KEY (current_club_id) REFERENCES clubs (club_id)
+                   ); """,
+    "player_valuations": """ CREATE TABLE IF NOT EXISTS {table} (
+                                 valuation_id INTEGER PRIMARY KEY, -- rowid alias, in load order
+                                 player_id INTEGER NOT NULL,
+                                 date DATE,
+                                 market_value_in_eur INTEGER,
+                                 current_club_id INTEGER,
+                                 player_club_domestic_competition_id TEXT,
+                                 FOREIGN KEY (player_id) REFERENCES players (player_id),
+                                 FOREIGN KEY (current_club_id) REFERENCES clubs (club_id),
+                                 FOREIGN KEY (player_club_domestic_competition_id) REFERENCES leagues (competition_id)
+                             ); """,
+}
+# Every column declared INTEGER above. A chunk with a blank in one of them parses it as float, so
+# clean_chunk casts these back to integers: otherwise 2024.0 and 2024 would hash differently in an
+# incremental load and an unchanged row would count as updated.
+CSV_INTEGER_COLUMNS = tuple(sorted({column for schema in TABLE_SCHEMAS.values()
+                                    for column in re.findall(r"^\s*(\w+) INTEGER\b", schema, re.MULTILINE)}))
+TABLE_INDEXES = {
+    "player_valuations": {
+        "idx_player_valuations_player_date": "player_id, date",
+        "idx_player_valuations_date": "date",
+    },
+    "players": {
+        "idx_players_club": "current_club_id",
+        "idx_players_name": "name", # Keyset pages of /api/players/search
+    },
+    "clubs": {
+        "idx_clubs_league": "domestic_competition_id",
+    },
+}
+# Columns not in the CSVs, copied from the live table on reload: table -> (key column, columns)
+PRESERVED_COLUMNS = {"players": ("player_id", ("fotmob_player_id",))}
+STAGING_SUFFIX = "__staging"
+# --incremental: rows are matched on these keys; tables with a watermark column only compare rows
+# on or after the newest value already loaded (older CSV rows are assumed unchanged)
+INCREMENTAL_KEYS = {
+    "leagues": ("competition_id",),
+    "clubs": ("club_id",),
+    "players": ("player_id",),
+    "player_valuations": ("player_id", "date"),
+}
+WATERMARK_COLUMNS = {"player_valuations": "date"}
+
 def define_schema(conn):
     """ Define and create all necessary tables AND indexes """
     print("Defining database schema (if tables don't exist)...")
 
-    # Keep the same table definitions as before
-    sql_create_leagues_table = """ CREATE TABLE IF NOT EXISTS leagues (
-                                        league_id TEXT PRIMARY KEY,
-                                        name TEXT,
-                                        country TEXT
-                                    ); """
-    sql_create_clubs_table = """ CREATE TABLE IF NOT EXISTS clubs (
-                                    club_id INTEGER PRIMARY KEY,
-                                    name TEXT,
-                                    domestic_competition_id TEXT,
-                                    FOREIGN KEY (domestic_competition_id) REFERENCES leagues (league_id)
-                                ); """
-    sql_create_players_table = """ CREATE TABLE IF NOT EXISTS players (
-                                    player_id INTEGER PRIMARY KEY,
-                                    name TEXT,
-                                    current_club_id INTEGER,
-                                    date_of_birth DATE,
-                                    position TEXT,
-                                    sub_position TEXT,
-                                    foot TEXT,
-                                    height_cm INTEGER,
-                                    nationality TEXT,
-                                    image_url TEXT,
-                                    agent_name TEXT,
-                                    FOREIGN KEY (current_club_id) REFERENCES clubs (club_id)
-                                ); """
-    sql_create_player_valuations_table = """ CREATE TABLE IF NOT EXISTS player_valuations (
-                                                valuation_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                                player_id INTEGER NOT NULL,
-                                                date DATE,
-                                                market_value_in_eur INTEGER,
-                                                current_club_id INTEGER,
-                                                player_club_domestic_competition_id TEXT,
-                                                FOREIGN KEY (player_id) REFERENCES players (player_id),
-                                                FOREIGN KEY (current_club_id) REFERENCES clubs (club_id),
-                                                FOREIGN KEY (player_club_domestic_competition_id) REFERENCES leagues (league_id)
-                                            ); """
-
     # Create tables
-    create_table(conn, sql_create_leagues_table)
-    create_table(conn, sql_create_clubs_table)
-    create_table(conn, sql_create_players_table)
-    create_table(conn, sql_create_player_valuations_table)
+    for table, create_table_sql in TABLE_SCHEMAS.items():
+        create_table(conn, create_table_sql.format(table=table))
 
     print("Creating indexes (if they don't exist)...")
-    indexes = [
-        "CREATE INDEX IF NOT EXISTS idx_player_valuations_player_date ON player_valuations (player_id, date);",
-        "CREATE INDEX IF NOT EXISTS idx_player_valuations_date ON player_valuations (date);",
-        "CREATE INDEX IF NOT EXISTS idx_players_club ON players (current_club_id);",
-        "CREATE INDEX IF NOT EXISTS idx_clubs_league ON clubs (domestic_competition_id);"
-    ]
-    for index_sql in indexes:
-        try:
-             c = conn.cursor()
-             c.execute(index_sql)
-             conn.commit()
-        except sqlite3.Error as e:
-             print(f"Error creating index '{index_sql[:50]}...': {e}")
+    for table, indexes in TABLE_INDEXES.items():
+        for index_name, columns in indexes.items():
+            try:
+                 c = conn.cursor()
+                 c.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({columns});")
+                 conn.commit()
+            except sqlite3.Error as e:
+                 print(f"Error creating index '{index_name}': {e}")
 
     print("Schema definition complete.")
 
+# --- Derived Tables ---
+# Filters /api/players/top can serve straight from an index walked in market-value order
+LEADERBOARD_INDEXES = {
+    "idx_player_leaderboard_value": "market_value_in_eur DESC",
+    "idx_player_leaderboard_league": "league_id, market_value_in_eur DESC",
+    "idx_player_leaderboard_league_position": "league_id, position, market_value_in_eur DESC",
+    "idx_player_leaderboard_position": "position, market_value_in_eur DESC",
+    "idx_player_leaderboard_sub_position": "sub_position, market_value_in_eur DESC",
+    "idx_player_leaderboard_club": "club_id, market_value_in_eur DESC",
+}
+LEADERBOARD_TRIGGERS = { # Carry player_current_value changes over to player_leaderboard
+    "trg_player_current_value_leaderboard_insert": "INSERT",
+    "trg_player_current_value_leaderboard_update": "UPDATE OF market_value_in_eur",
+}
+
+def rebuild_player_current_value(conn, commit=True):
+    """
+    (Re)builds player_current_value: one row per player holding their most recent valuation.
+    The API reads current market values from here with a primary-key / index lookup instead of
+    a correlated ORDER BY date DESC LIMIT 1 (or a GROUP BY over all valuations) per request.
+    An AFTER INSERT trigger keeps the table current when new valuation rows are added later;
+    it is (re)created here because reloading player_valuations drops it.
+    Follow with rebuild_player_leaderboard, which is derived from this table. With commit=False
+    the rebuild joins the caller's transaction, which commits (or rolls back) it.
+    """
+    print("Rebuilding player_current_value...")
+    try:
+        c = conn.cursor()
+        if not conn.in_transaction:
+            c.execute("BEGIN;")
+        c.execute(""" CREATE TABLE IF NOT EXISTS player_current_value (
+                          player_id INTEGER PRIMARY KEY,
+                          date DATE,
+                          market_value_in_eur INTEGER
+                      ); """)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_player_current_value_value ON player_current_value (market_value_in_eur DESC);")
+        # player_leaderboard is rebuilt wholesale next; don't upsert into it once per row meanwhile
+        for trigger_name in LEADERBOARD_TRIGGERS:
+            c.execute(f"DROP TRIGGER IF EXISTS {trigger_name};")
+        c.execute("DELETE FROM player_current_value;")
+        c.execute("""
+            INSERT INTO player_current_value (player_id, date, market_value_in_eur)
+            SELECT player_id, date, market_value_in_eur
+            FROM (
+                SELECT player_id, date, market_value_in_eur,
+                       ROW_NUMBER() OVER (PARTITION BY player_id ORDER BY date DESC, rowid DESC) AS recency
+                FROM player_valuations
+            )
+            WHERE recency = 1;
+        """)
+        c.execute("DROP TRIGGER IF EXISTS trg_player_valuations_current_value;")
+        c.execute("""
+            CREATE TRIGGER trg_player_valuations_current_value
+            AFTER INSERT ON player_valuations
+            BEGIN
+                INSERT INTO player_current_value (player_id, date, market_value_in_eur)
+                VALUES (NEW.player_id, NEW.date, NEW.market_value_in_eur)
+                ON CONFLICT (player_id) DO UPDATE SET
+                    date = excluded.date,
+                    market_value_in_eur = excluded.market_value_in_eur
+                WHERE excluded.date >= player_current_value.date OR player_current_value.date IS NULL;
+            END;
+        """)
+        if commit:
+            conn.commit()
+        count = c.execute("SELECT COUNT(*) FROM player_current_value;").fetchone()[0]
+        print(f"player_current_value holds {count} players.")
+        return True
+    except sqlite3.Error as e:
+        print(f"Error rebuilding player_current_value: {e}")
+        if commit:
+            conn.rollback()
+        return False
+
+def refresh_player_current_value(conn, player_ids):
+    """
+    Recomputes player_current_value for the given players only, for valuation rows that were
+    updated in place (the insert trigger covers new rows). Value changes reach player_leaderboard
+    through its update trigger. The caller commits.
+    """
+    if not player_ids:
+        return
+    conn.execute("""
+        INSERT INTO player_current_value (player_id, date, market_value_in_eur)
+        SELECT player_id, date, market_value_in_eur
+        FROM (
+            SELECT player_id, date, market_value_in_eur,
+                   ROW_NUMBER() OVER (PARTITION BY player_id ORDER BY date DESC, rowid DESC) AS recency
+            FROM player_valuations
+            WHERE player_id IN (SELECT value FROM json_each(?))
+        )
+        WHERE recency = 1
+        ON CONFLICT (player_id) DO UPDATE SET
+            date = excluded.date,
+            market_value_in_eur = excluded.market_value_in_eur;
+    """, (json.dumps(sorted(player_ids)),))
+
+def rebuild_player_leaderboard(conn, commit=True):
+    """
+    (Re)builds player_leaderboard: every valued player with the columns /api/players/top filters
+    and returns (club, league, position, birth date), denormalized into one table.
+    Each filter has an index ending in market_value_in_eur DESC (player_id, the rowid, breaks ties),
+    so a filtered top-N reads N index entries in order instead of joining and sorting every match.
+    Triggers on player_current_value carry new valuations over; club and position changes
+    arrive with a reload, which rebuilds the table. Run after rebuild_player_current_value;
+    commit=False works as there.
+    """
+    print("Rebuilding player_leaderboard...")
+    try:
+        c = conn.cursor()
+        if not conn.in_transaction:
+            c.execute("BEGIN;") # Readers see the old table until the new one is complete, never neither
+        for trigger_name in LEADERBOARD_TRIGGERS:
+            c.execute(f"DROP TRIGGER IF EXISTS {trigger_name};")
+        c.execute("DROP TABLE IF EXISTS player_leaderboard;")
+        c.execute(""" CREATE TABLE player_leaderboard (
+                          player_id INTEGER PRIMARY KEY,
+                          name TEXT,
+                          position TEXT,
+                          sub_position TEXT,
+                          date_of_birth DATE,
+                          club_id INTEGER,
+                          club_name TEXT,
+                          league_id TEXT,
+                          market_value_in_eur INTEGER
+                      ); """)
+        leaderboard_select = """
+            SELECT p.player_id, p.name, p.position, p.sub_position, p.date_of_birth,
+                   c.club_id, c.name, c.domestic_competition_id, cv.market_value_in_eur
+            FROM player_current_value cv
+            JOIN players p ON p.player_id = cv.player_id
+            JOIN clubs c ON c.club_id = p.current_club_id
+        """
+        c.execute(f"INSERT INTO player_leaderboard {leaderboard_select} WHERE cv.market_value_in_eur IS NOT NULL;")
+        for index_name, columns in LEADERBOARD_INDEXES.items(): # Built after the bulk insert, once
+            c.execute(f"CREATE INDEX {index_name} ON player_leaderboard ({columns});")
+        for trigger_name, event in LEADERBOARD_TRIGGERS.items():
+            c.execute(f"""
+                CREATE TRIGGER {trigger_name}
+                AFTER {event} ON player_current_value
+                BEGIN
+                    INSERT INTO player_leaderboard {leaderboard_select}
+                    WHERE cv.player_id = NEW.player_id AND NEW.market_value_in_eur IS NOT NULL
+                    ON CONFLICT (player_id) DO UPDATE SET market_value_in_eur = excluded.market_value_in_eur;
+                END;
+            """)
+        c.execute("ANALYZE player_leaderboard;") # Lets the planner pick the most selective filter index
+        if commit:
+            conn.commit()
+        count = c.execute("SELECT COUNT(*) FROM player_leaderboard;").fetchone()[0]
+        print(f"player_leaderboard holds {count} players.")
+        return True
+    except sqlite3.Error as e:
+        print(f"Error rebuilding player_leaderboard: {e}")
+        if commit:
+            conn.rollback()
+        return False
+
+# --- Data Version Stamp ---
+def bump_data_version(conn):
+    """
+    Increments the single-row data_version stamp after a load has changed the data.
+    api.py compares this stamp with the one its cached responses were built from and drops
+    the cache when it moves, so readers see new data right after a loader finishes.
+    """
+    try:
+        c = conn.cursor()
+        c.execute(""" CREATE TABLE IF NOT EXISTS data_version (
+                          id INTEGER PRIMARY KEY CHECK (id = 1),
+                          version INTEGER NOT NULL,
+                          updated_at TEXT
+                      ); """)
+        c.execute("""
+            INSERT INTO data_version (id, version, updated_at) VALUES (1, 1, ?)
+            ON CONFLICT (id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+        """, (datetime.now().isoformat(timespec='seconds'),))
+        conn.commit()
+        version = c.execute("SELECT version FROM data_version WHERE id = 1;").fetchone()[0]
+        print(f"Data version is now {version}.")
+        return version
+    except sqlite3.Error as e:
+        print(f"Error bumping data version: {e}")
+        conn.rollback()
+        return None
+
 # --- Data Loading Function (Reverted to CSV) ---
-def load_csv_to_table(conn, table_name, csv_file_path):
-    """ Load data from a CSV file into the specified table using pandas """
+@contextmanager
+def bulk_load_pragmas(conn):
+    """
+    Relaxes durability while staging tables are bulk loaded, then restores the previous settings.
+    fsyncs are always turned off. The rollback journal is kept in memory unless the database is
+    in WAL mode (the API switches it on): leaving WAL would need every reader gone, and readers
+    keep serving the live tables during a load. An in-memory journal still lets a failed load
+    roll back (with journal_mode=OFF, ROLLBACK is undefined), but a crash mid-load can leave the
+    file corrupt, which is acceptable for a database that is rebuilt from the CSVs.
+    """
+    journal_mode = conn.execute("PRAGMA journal_mode;").fetchone()[0]
+    synchronous = conn.execute("PRAGMA synchronous;").fetchone()[0]
+    try:
+        if journal_mode != 'wal':
+            conn.execute("PRAGMA journal_mode = MEMORY;")
+        conn.execute("PRAGMA synchronous = OFF;")
+    except sqlite3.Error as e:
+        print(f"Warning: could not relax pragmas for loading ({e}); loading with the current settings.")
+    try:
+        yield conn
+    finally:
+        conn.execute(f"PRAGMA journal_mode = {journal_mode};")
+        conn.execute(f"PRAGMA synchronous = {synchronous};")
+
+def staging_table(table_name):
+    return table_name + STAGING_SUFFIX
+
+def table_exists(conn, table_name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?;", (table_name,)).fetchone() is not None
+
+def clean_chunk(df):
+    """ Normalizes dates and market values in one CSV chunk """
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'], errors='coerce').dt.strftime('%Y-%m-%d')
+    if 'date_of_birth' in df.columns:
+        df['date_of_birth'] = pd.to_datetime(df['date_of_birth'], errors='coerce').dt.strftime('%Y-%m-%d')
+    # Coerce numeric types (example for market_value_in_eur)
+    if 'market_value_in_eur' in df.columns:
+        df['market_value_in_eur'] = pd.to_numeric(df['market_value_in_eur'], errors='coerce').fillna(0).astype(int)
+    for column in CSV_INTEGER_COLUMNS:
+        if column in df.columns and df[column].dtype.kind == 'f':
+            df[column] = df[column].round().astype('Int64') # Stored as INTEGER, blanks as NULL
+    return df
+
+def chunk_rows(df):
+    """ Rows of a chunk as tuples of Python values (NULLs as None), ready for executemany """
+    columns = []
+    for name in df.columns:
+        series = df[name]
+        values = series.tolist()
+        if series.hasnans:
+            values = [None if missing else value for value, missing in zip(values, series.isna().tolist())]
+        columns.append(values)
+    return zip(*columns)
+
+def csv_blocks(csv_file_path, block_bytes):
+    """
+    Yields (start, end) byte offsets that split the rows after the header line into blocks of
+    about block_bytes, each ending at a line break. Assumes no quoted field spans lines, which
+    holds for the Kaggle exports.
+    """
+    with open(csv_file_path, 'rb') as f:
+        f.readline() # Header
+        start = f.tell()
+        while True:
+            f.seek(start + block_bytes)
+            f.readline() # Finish the line the block boundary fell in
+            end = min(f.tell(), os.path.getsize(csv_file_path))
+            if end <= start:
+                return
+            yield start, end
+            start = end
+
+def parse_csv_block(csv_file_path, start, end, header, columns, dtype):
+    """
+    Process pool task: parses and cleans one block from csv_blocks (only `columns` are parsed at
+    all). Returns the DataFrame, which pickles as a few arrays; a list of row tuples would cost
+    the writer more to unpickle than chunk_rows takes to build it.
+    """
+    with open(csv_file_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    chunk = pd.read_csv(io.BytesIO(data), header=None, names=header, usecols=columns, dtype=dtype)
+    return clean_chunk(chunk[columns])
+
+def csv_row_batches(table_name, csv_file_path, header, columns, pool=None):
+    """
+    Yields the CSV's rows in batches of (row count, row tuples), cleaned and restricted to
+    `columns`. Without a pool they are parsed here, CSV_CHUNK_ROWS at a time, and streamed to the
+    caller without building a list; with a ProcessPoolExecutor, CSV_BLOCK_BYTES
+    blocks are parsed in its workers and handed back in file order, at most CSV_BLOCKS_IN_FLIGHT
+    ahead of the caller, which bounds memory the same way the chunk size does.
+    """
+    dtype = CSV_DTYPES.get(table_name)
+    if pool is None:
+        for chunk in pd.read_csv(csv_file_path, chunksize=CSV_CHUNK_ROWS, usecols=columns, dtype=dtype):
+            if not chunk.empty:
+                yield len(chunk), chunk_rows(clean_chunk(chunk[columns]))
+        return
+
+    pending = deque()
+    for start, end in csv_blocks(csv_file_path, CSV_BLOCK_BYTES):
+        pending.append(pool.submit(parse_csv_block, csv_file_path, start, end, header, columns, dtype))
+        if len(pending) >= CSV_BLOCKS_IN_FLIGHT:
+            chunk = pending.popleft().result()
+            yield len(chunk), chunk_rows(chunk)
+    while pending:
+        chunk = pending.popleft().result()
+        yield len(chunk), chunk_rows(chunk)
+
+@contextmanager
+def parse_pool(workers):
+    """ProcessPoolExecutor for csv_row_batches, or None (parse on the writer's thread) for one worker."""
+    if workers <= 1:
+        yield None
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield pool
+
+def load_csv_to_table(conn, table_name, csv_file_path, pool=None):
+    """
+    Load data from a CSV file into the staging copy of the specified table (see
+    swap_in_staging_tables). The staging table is created from TABLE_SCHEMAS without indexes;
+    the columns the schema defines are parsed with the table's CSV_DTYPES, cleaned, and inserted
+    with executemany, one batch at a time (see csv_row_batches; with a parse_pool the parsing runs
+    in worker processes while this connection stays the only writer). The whole table is one
+    transaction. Rows with a duplicate key or no id are skipped. The live table is not touched.
+    """
     if not os.path.exists(csv_file_path):
         print(f"Error: CSV file not found at {csv_file_path}. Skipping table '{table_name}'.")
         return False # Indicate failure
 
     print(f"Loading data from {csv_file_path} into table '{table_name}'...")
+    staging = staging_table(table_name)
+    started = time.perf_counter()
+    row_count = 0
     try:
-        df = pd.read_csv(csv_file_path)
-        
-        # Basic check for empty dataframe
-        if df.empty:
-             print(f"Warning: CSV file {csv_file_path} is empty or contains only headers. Skipping table '{table_name}'.")
-             return True # Not an error, just no data
-
-        # *** Add Data Cleaning/Type Conversion if needed before loading ***
-        # Example: Convert date columns
-        if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'], errors='coerce').dt.strftime('%Y-%m-%d')
-        if 'date_of_birth' in df.columns:
-             df['date_of_birth'] = pd.to_datetime(df['date_of_birth'], errors='coerce').dt.strftime('%Y-%m-%d')
-        # Coerce numeric types (example for market_value_in_eur)
-        if 'market_value_in_eur' in df.columns:
-            df['market_value_in_eur'] = pd.to_numeric(df['market_value_in_eur'], errors='coerce').fillna(0).astype(int)
-
-        # Get table info to check columns more accurately (optional enhancement)
-        # cursor = conn.cursor()
-        # cursor.execute(f"PRAGMA table_info({table_name})")
-        # table_columns = [info[1] for info in cursor.fetchall()]
-        # print(f"Table {table_name} columns: {table_columns}")
-        # print(f"CSV {os.path.basename(csv_file_path)} columns: {df.columns.tolist()}")
-        
-        # Ensure CSV columns match table columns (simple subset check)
-        # More robust checking would involve renaming columns in the DataFrame
-        # df_columns_lower = [col.lower() for col in df.columns]
-        # table_columns_lower = [col.lower() for col in table_columns]
-        # valid_columns = [col for col in df.columns if col.lower() in table_columns_lower]
-        # if len(valid_columns) != len(df.columns):
-        #      print(f"Warning: Some CSV columns might not map to table {table_name}")
-        # df_to_load = df[valid_columns] # Select only columns that exist in the table
-        df_to_load = df # Assuming columns match for now
-
-        # Use pandas.to_sql to load data
-        # 'replace' drops the table first - useful for full reloads
-        df_to_load.to_sql(table_name, conn, if_exists='replace', index=False)
-        print(f"Successfully loaded {len(df_to_load)} rows into '{table_name}'.")
+        conn.execute(f'DROP TABLE IF EXISTS "{staging}";')
+        conn.execute(TABLE_SCHEMAS[table_name].format(table=f'"{staging}"'))
+        table_columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{staging}");')]
+        header = list(pd.read_csv(csv_file_path, nrows=0).columns)
+        columns = [column for column in header if column in table_columns]
+        ignored = [column for column in header if column not in table_columns]
+        if not columns:
+            raise ValueError(f"none of the CSV columns {header} are in the '{table_name}' schema")
+        if ignored:
+            print(f"Not loading CSV columns missing from the '{table_name}' schema: {', '.join(ignored)}")
+        column_list = ", ".join(f'"{column}"' for column in columns)
+        insert_sql = f'INSERT OR IGNORE INTO "{staging}" ({column_list}) VALUES ({", ".join("?" * len(columns))});'
+
+        changes_before = conn.total_changes
+        for batch_rows, rows in csv_row_batches(table_name, csv_file_path, header, columns, pool):
+            conn.executemany(insert_sql, rows)
+            row_count += batch_rows
+
+        # Basic check for empty CSV (header only)
+        if row_count == 0:
+            print(f"Warning: CSV file {csv_file_path} is empty or contains only headers. Skipping table '{table_name}'.")
+            conn.rollback()
+            conn.execute(f'DROP TABLE IF EXISTS "{staging}";')
+            return True # Not an error, just no data
+
+        conn.commit()
+        elapsed = time.perf_counter() - started
+        skipped = row_count - (conn.total_changes - changes_before)
+        print(f"Successfully loaded {row_count - skipped} rows into '{table_name}' in {elapsed:.1f} s "
+              f"({row_count / max(elapsed, 1e-9):,.0f} rows/s)"
+              + (f"; skipped {skipped} rows with a duplicate or missing key." if skipped else "."))
         return True # Indicate success
 
     except pd.errors.EmptyDataError:
         print(f"Warning: CSV file {csv_file_path} is empty. Skipping table '{table_name}'.")
+        conn.execute(f'DROP TABLE IF EXISTS "{staging}";')
         return True # Not an error
     except Exception as e:
+        conn.rollback()
+        conn.execute(f'DROP TABLE IF EXISTS "{staging}";')
         print(f"Error loading data into table '{table_name}' from {csv_file_path}: {e}")
         return False # Indicate failure
 
+def drop_staging_tables(conn, table_names):
+    for table_name in table_names:
+        conn.execute(f'DROP TABLE IF EXISTS "{staging_table(table_name)}";')
+    conn.commit()
+
+def swap_in_staging_tables(conn, table_names, rebuild_derived=False):
+    """
+    Publishes the loaded staging tables in one transaction: for each table with a staging copy,
+    columns listed in PRESERVED_COLUMNS are carried over from the live table, the live table is
+    dropped, the staging table renamed into its place and its TABLE_INDEXES built (once, over the
+    complete data). API readers (WAL mode) keep reading the previous tables until the commit and
+    then see all new tables at once; they are never blocked. Dropping a live table also drops its
+    triggers, so the derived tables (player_current_value, player_leaderboard, the player_search
+    index) must be rebuilt: with rebuild_derived=True that happens in the same transaction, so
+    readers never see new tables next to old derived ones. Returns the tables swapped, or None on
+    error (nothing is swapped then).
+    """
+    swapped = [table_name for table_name in table_names if table_exists(conn, staging_table(table_name))]
+    if not swapped:
+        return []
+    print(f"Swapping in reloaded tables: {', '.join(swapped)}...")
+    c = conn.cursor()
+    try:
+        if conn.in_transaction:
+            conn.commit()
+        c.execute("BEGIN IMMEDIATE;")
+        # Triggers on other tables (e.g. the player_leaderboard ones) name the live tables; the
+        # legacy rename doesn't re-check them while a live table is briefly gone
+        c.execute("PRAGMA legacy_alter_table = ON;")
+        for table_name in swapped:
+            staging = staging_table(table_name)
+            key, preserved = PRESERVED_COLUMNS.get(table_name, (None, ()))
+            live_columns = {row[1] for row in c.execute(f'PRAGMA table_info("{table_name}");')}
+            for column in preserved:
+                if key in live_columns and column in live_columns:
+                    c.execute(f"""
+                        UPDATE "{staging}" SET "{column}" = live."{column}"
+                        FROM "{table_name}" live
+                        WHERE live."{key}" = "{staging}"."{key}" AND live."{column}" IS NOT NULL;
+                    """)
+            c.execute(f'DROP TABLE IF EXISTS "{table_name}";')
+            c.execute(f'ALTER TABLE "{staging}" RENAME TO "{table_name}";')
+            for index_name, columns in TABLE_INDEXES.get(table_name, {}).items():
+                c.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({columns});")
+        c.execute("PRAGMA legacy_alter_table = OFF;")
+        if rebuild_derived and not (rebuild_player_current_value(conn, commit=False)
+                                    and rebuild_player_leaderboard(conn, commit=False)
+                                    and rebuild_player_search_index(conn, commit=False)):
+            raise sqlite3.Error("could not rebuild the derived tables")
+        conn.commit()
+        return swapped
+    except sqlite3.Error as e:
+        print(f"Error swapping in reloaded tables: {e}")
+        conn.rollback()
+        c.execute("PRAGMA legacy_alter_table = OFF;")
+        return None
+
+# --- Incremental Loading ---
+def _row_hash(values):
+    """Hash of a row's values as text, so '5' loaded into a TEXT column matches a CSV's 5. Only compared within one run."""
+    return hash(tuple(None if value is None else str(value) for value in values))
+
+def load_csv_incremental(conn, table_name, csv_file_path):
+    """
+    Applies only the difference between a CSV and the live table, in one transaction.
+    Rows are matched on INCREMENTAL_KEYS and compared by a hash of the columns the CSV provides:
+    new keys are inserted, rows whose hash differs are updated in place, the rest are left alone.
+    For tables with a WATERMARK_COLUMNS entry only CSV rows on or after the live table's newest
+    value are looked at (and only those live rows are hashed), so a snapshot that appends recent
+    rows costs a CSV scan plus work proportional to the new rows. Keys are expected to be unique in
+    the CSV (the first row wins). Rows that disappeared from the CSV are kept; run a full load to
+    drop them.
+    Returns the counts ('inserted', 'updated', 'unchanged', 'skipped') and the keys of inserted
+    and updated rows ('inserted_keys', 'updated_keys'), or None on failure.
+    """
+    if not os.path.exists(csv_file_path):
+        print(f"Error: CSV file not found at {csv_file_path}. Skipping table '{table_name}'.")
+        return None
+
+    print(f"Applying changes from {csv_file_path} to table '{table_name}'...")
+    started = time.perf_counter()
+    key_columns = INCREMENTAL_KEYS[table_name]
+    watermark_column = WATERMARK_COLUMNS.get(table_name)
+    summary = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0, 'inserted_keys': [], 'updated_keys': []}
+    try:
+        table_columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}");')]
+        watermark = None
+        if watermark_column:
+            watermark = conn.execute(f'SELECT MAX("{watermark_column}") FROM "{table_name}";').fetchone()[0]
+            print(f"Comparing rows with {watermark_column} >= {watermark or '(no rows yet)'}.")
+
+        live = None # key -> (rowid, row hash), or None once a CSV row matched it; read once the CSV's columns are known
+        insert_sql = update_sql = None
+        chunks = pd.read_csv(csv_file_path, chunksize=CSV_CHUNK_ROWS, dtype=CSV_DTYPES.get(table_name))
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            if live is None:
+                columns = [column for column in chunk.columns if column in table_columns]
+                missing_keys = [column for column in key_columns if column not in columns]
+                if missing_keys:
+                    raise ValueError(f"CSV has no key column(s) {missing_keys}")
+                key_positions = [columns.index(column) for column in key_columns]
+                column_list = ", ".join(f'"{column}"' for column in columns)
+                live_sql = f'SELECT rowid, {column_list} FROM "{table_name}"'
+                live_args = ()
+                if watermark is not None:
+                    live_sql += f' WHERE "{watermark_column}" >= ?'
+                    live_args = (watermark,)
+                live = {}
+                for rowid, *values in conn.execute(live_sql, live_args):
+                    # First row per key, as in the CSV: rowids follow the order rows were loaded in
+                    live.setdefault(tuple(values[i] for i in key_positions), (rowid, _row_hash(values)))
+                insert_sql = f'INSERT INTO "{table_name}" ({column_list}) VALUES ({", ".join("?" * len(columns))});'
+                assignments = ", ".join(f'"{column}" = ?' for column in columns)
+                update_sql = f'UPDATE "{table_name}" SET {assignments} WHERE rowid = ?;'
+
+            chunk = chunk[columns]
+            if watermark is not None:
+                # Compare the raw ISO text before parsing dates, so old rows never reach clean_chunk
+                # ('2024-06-01 00:00:00' >= '2024-06-01' as text, and blanks compare False)
+                recent = (chunk[watermark_column] >= watermark).fillna(False)
+                summary['skipped'] += int((~recent).sum())
+                chunk = chunk[recent]
+                if chunk.empty:
+                    continue
+            inserts, updates = [], []
+            for values in chunk_rows(clean_chunk(chunk)):
+                key = tuple(values[i] for i in key_positions)
+                if any(part is None for part in key):
+                    summary['skipped'] += 1
+                    continue
+                row_hash = _row_hash(values)
+                existing = live.get(key, ())
+                live[key] = None # Later rows with this key are repeats; the first row wins
+                if existing is None:
+                    summary['skipped'] += 1
+                elif not existing:
+                    inserts.append(values)
+                    summary['inserted_keys'].append(key)
+                elif existing[1] == row_hash:
+                    summary['unchanged'] += 1
+                else:
+                    updates.append((*values, existing[0]))
+                    summary['updated_keys'].append(key)
+            conn.executemany(insert_sql, inserts)
+            conn.executemany(update_sql, updates)
+            summary['inserted'] += len(inserts)
+            summary['updated'] += len(updates)
+
+        conn.commit()
+        elapsed = time.perf_counter() - started
+        older = f", {summary['skipped']} skipped (older than the watermark, no key or repeated)" if summary['skipped'] else ""
+        print(f"'{table_name}': {summary['inserted']} inserted, {summary['updated']} updated, "
+              f"{summary['unchanged']} unchanged{older} ({elapsed:.1f} s).")
+        return summary
+
+    except pd.errors.EmptyDataError:
+        print(f"Warning: CSV file {csv_file_path} is empty. Skipping table '{table_name}'.")
+        return summary
+    except Exception as e:
+        conn.rollback()
+        print(f"Error applying changes to table '{table_name}' from {csv_file_path}: {e}")
+        return None
+
+def apply_incremental_load(conn, table_names, csv_paths):
+    """
+    Runs load_csv_incremental for each table, then refreshes only the derived data the changes
+    touch: current values of players whose valuations were corrected in place, the leaderboard
+    when players or clubs changed, the search index entries of changed or new players, and the
+    Parquet snapshot partitions of seasons with new or corrected valuations. Derived tables that
+    don't exist yet (a fresh database, or one from an older loader) are built in full instead.
+    Returns (all_successful, changed).
+    """
+    all_successful = True
+    summaries = {}
+    changed = set()
+    rebuild_derived = not derived_tables_exist(conn)
+    for table_name in table_names:
+        if table_name == "player_valuations" and (rebuild_derived or changed & {"players", "clubs"}):
+            # The leaderboard is rebuilt below anyway; skip keeping it current row by row
+            for trigger_name in LEADERBOARD_TRIGGERS:
+                conn.execute(f"DROP TRIGGER IF EXISTS {trigger_name};")
+        summary = load_csv_incremental(conn, table_name, csv_paths[table_name])
+        if summary is None:
+            all_successful = False
+            continue
+        summaries[table_name] = summary
+        if summary['inserted'] or summary['updated']:
+            changed.add(table_name)
+
+    corrected = {key[0] for key in summaries.get('player_valuations', {}).get('updated_keys', [])}
+    if rebuild_derived:
+        print("player_current_value or player_leaderboard is missing; building them from the loaded tables.")
+        if rebuild_player_current_value(conn, commit=False) and rebuild_player_leaderboard(conn, commit=False):
+            conn.commit() # Both appear together
+        else:
+            conn.rollback()
+            all_successful = False
+    else:
+        if corrected:
+            try:
+                refresh_player_current_value(conn, corrected)
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Error refreshing player_current_value: {e}")
+                conn.rollback()
+                all_successful = False
+        if changed & {"players", "clubs"} and not rebuild_player_leaderboard(conn):
+            all_successful = False
+    players = summaries.get('players', {})
+    changed_players = {key[0] for key in players.get('inserted_keys', []) + players.get('updated_keys', [])}
+    if not table_exists(conn, SEARCH_TABLE):
+        rebuild_derived = True
+        if not rebuild_player_search_index(conn):
+            all_successful = False
+    elif changed_players and not update_player_search_index(conn, changed_players):
+        all_successful = False
+
+    valuations = summaries.get('player_valuations', {})
+    valuation_dates = {key[1] for key in valuations.get('inserted_keys', []) + valuations.get('updated_keys', [])}
+    if valuation_dates and not refresh_analytics_snapshot(conn, {season_of(day) for day in valuation_dates}):
+        all_successful = False
+
+    total = {field: sum(summary[field] for summary in summaries.values()) for field in ('inserted', 'updated', 'unchanged')}
+    print(f"Incremental load: {total['inserted']} inserted, {total['updated']} updated, {total['unchanged']} unchanged rows.")
+    return all_successful, bool(changed) or rebuild_derived
+
+def derived_tables_exist(conn):
+    """True when player_current_value, its valuations trigger and player_leaderboard all exist."""
+    names = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE name IN "
+        "('player_current_value', 'trg_player_valuations_current_value', 'player_leaderboard');")}
+    return len(names) == 3
+
+# --- Analytics Snapshot ---
+def refresh_analytics_snapshot(conn, seasons=None):
+    """
+    Rewrites the Parquet snapshot analytics.py reads (only `seasons` when given). Optional: without
+    pyarrow it is skipped with a note, and an existing snapshot becomes stale until the next run
+    with pyarrow (analytics.py falls back to SQLite when there is none).
+    """
+    if not PYARROW_AVAILABLE:
+        print(f"pyarrow is not installed; not writing the Parquet snapshot in {SNAPSHOT_DIR}/ (pip install pyarrow).")
+        return True # Not an error, the snapshot is optional
+    return write_valuations_snapshot(conn, SNAPSHOT_DIR, seasons)
+
 # --- Main Execution ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the Kaggle Transfermarkt CSVs into SQLite.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Apply only new and changed rows to the existing tables instead of reloading them.")
+    parser.add_argument("--workers", type=int, default=LOAD_WORKERS,
+                        help=f"Processes parsing CSV data during a full load (default {LOAD_WORKERS}; 1 parses in the loader itself).")
+    args = parser.parse_args()
+
     print("Starting data loading process from CSV files...")
     conn = create_connection(DB_FILE)
 
+    all_successful = True
+    # Load in order respecting foreign keys
+    load_order = ["leagues", "clubs", "players", "player_valuations"]
+
     if conn is not None:
         # Define schema (Create tables and indexes first)
         define_schema(conn)
 
-        # Load data from CSVs
+    if conn is not None and args.incremental:
+        print("\nApplying new and changed rows from CSV files...")
+        csv_paths = {table_key: os.path.join(DATA_DIR, CSV_FILES[table_key]) for table_key in load_order}
+        all_successful, changed = apply_incremental_load(conn, load_order, csv_paths)
+        if changed:
+            # Tell running API processes that their cached responses are stale
+            bump_data_version(conn)
+        conn.close()
+        print("Incremental load finished." if all_successful else "Incremental load finished with errors.")
+
+    elif conn is not None:
+        # Load data from CSVs into staging tables; readers keep using the live tables meanwhile
         print("\nLoading data from CSV files...")
-        all_successful = True
-        # Load in order respecting foreign keys
-        load_order = ["leagues", "clubs", "players", "player_valuations"]
+        # Worker processes parse and clean the CSVs; this connection is the only writer
+        with bulk_load_pragmas(conn), parse_pool(args.workers) as pool:
+            for table_key in load_order:
+                if table_key in CSV_FILES:
+                    csv_file = CSV_FILES[table_key]
+                    file_path = os.path.join(DATA_DIR, csv_file)
+                    success = load_csv_to_table(conn, table_key, file_path, pool)
+                    if not success:
+                        all_successful = False # Mark failure if any load fails
+                else:
+                     print(f"Warning: CSV file key '{table_key}' not found in CSV_FILES dictionary.")
+
+        # Publish the new tables, and the tables derived from them, together or not at all
+        swapped = None
+        if all_successful:
+            swapped = swap_in_staging_tables(conn, load_order, rebuild_derived=True)
+        if not swapped:
+            drop_staging_tables(conn, load_order)
+            if swapped is None:
+                all_successful = False
+                print("Keeping the existing tables.")
 
-        for table_key in load_order:
-            if table_key in CSV_FILES:
-                csv_file = CSV_FILES[table_key]
-                file_path = os.path.join(DATA_DIR, csv_file)
-                success = load_csv_to_table(conn, table_key, file_path)
-                if not success:
-                    all_successful = False # Mark failure if any load fails
-            else:
-                 print(f"Warning: CSV file key '{table_key}' not found in CSV_FILES dictionary.")
+        if swapped:
+            if not refresh_analytics_snapshot(conn):
+                all_successful = False
 
+            # Tell running API processes that their cached responses are stale
+            bump_data_version(conn)
 
         # Close the connection
         print("\nClosing database connection.")
@@ -196,4 +861,4 @@ if __name__ == "__main__":
             print("CSV loading process finished with errors.")
 
     else:
-        print("Error! Cannot create the database connection.") 
\ No newline at end of file
+        print("Error! Cannot create the database connection.")
@@ -0,0 +1,255 @@
+"""
+Local stand-in for the Transfermarkt API, for end-to-end tests and benchmarks of the scraper.
+
+Serves deterministic fixture data for the three endpoints the scraper uses:
+    /competitions/{code}/clubs
+    /competitions/{code}
+    /clubs/{id}/players
+with configurable latency, a random 5xx error rate and periodic bursts of 429 responses
+(with Retry-After). Responses carry an ETag and honour If-None-Match, so the response cache's
+revalidation path can be exercised too, and with gzip_responses they are gzip-encoded for clients
+that send Accept-Encoding: gzip.
+
+Run standalone:  python mock_transfermarkt_server.py --port 8765 --latency-ms 50
+Then point the scraper at it: TRANSFERMARKT_API_BASE_URL=http://127.0.0.1:8765 python transfermarkt_scraper.py
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Configuration ---
+DEFAULT_LEAGUE_CODES = ["GB1", "ES1", "FR1", "IT1", "L1"]
+DEFAULT_CLUBS_PER_LEAGUE = 20
+DEFAULT_PLAYERS_PER_CLUB = 28
+POSITIONS = ["Goalkeeper", "Centre-Back", "Left-Back", "Right-Back", "Defensive Midfield", "Central Midfield",
+             "Attacking Midfield", "Left Winger", "Right Winger", "Centre-Forward"]
+
+_ROUTES = [
+    (re.compile(r"^/competitions/([^/]+)/clubs/?$"), 'competition_clubs'),
+    (re.compile(r"^/competitions/([^/]+)/?$"), 'competition'),
+    (re.compile(r"^/clubs/([^/]+)/players/?$"), 'club_players'),
+]
+
+
+def build_fixtures(league_codes=None, clubs_per_league=DEFAULT_CLUBS_PER_LEAGUE,
+                   players_per_club=DEFAULT_PLAYERS_PER_CLUB, seed=2024):
+    """
+    Generates deterministic fixture payloads.
+    Returns (competitions, rosters): competitions maps code -> {'id', 'name', 'clubs': [...]},
+    rosters maps club id (str) -> list of player dicts shaped like the real API.
+    """
+    rng = random.Random(seed)
+    league_codes = league_codes or DEFAULT_LEAGUE_CODES
+    competitions = {}
+    rosters = {}
+    next_player_id = 100000
+    for league_index, code in enumerate(league_codes):
+        clubs = []
+        for club_index in range(clubs_per_league):
+            club_id = str((league_index + 1) * 1000 + club_index)
+            clubs.append({'id': club_id, 'name': f"{code} Club {club_index + 1}"})
+            players = []
+            for _ in range(players_per_club):
+                next_player_id += 1
+                # A few players without a market value, and coarse values so that ties occur
+                market_value = None if rng.random() < 0.04 else rng.randint(1, 1800) * 100_000
+                birth = date(rng.randint(1986, 2007), rng.randint(1, 12), rng.randint(1, 28))
+                players.append({
+                    'id': str(next_player_id),
+                    'name': f"Player {next_player_id}",
+                    'position': rng.choice(POSITIONS),
+                    'dateOfBirth': birth.isoformat(),
+                    'nationality': ["Country"],
+                    'height': rng.randint(165, 200),
+                    'foot': rng.choice(["left", "right", "both"]),
+                    'marketValue': market_value,
+                })
+            rosters[club_id] = players
+        competitions[code] = {'id': code, 'name': f"Competition {code}", 'clubs': clubs}
+    return competitions, rosters
+
+
+class MockTransfermarktServer:
+    """
+    Threaded HTTP server serving fixture responses. Use as a context manager or call start()/stop().
+    latency_ms / latency_jitter_ms: delay added to every response.
+    error_rate: probability of answering with a 500.
+    burst_every / burst_length: after every `burst_every` requests, the next `burst_length` get a 429
+    with `Retry-After: retry_after` seconds (0 disables bursts).
+    gzip_responses: gzip-encode 200 bodies when the request's Accept-Encoding allows it.
+    """
+    def __init__(self, host='127.0.0.1', port=0, latency_ms=0.0, latency_jitter_ms=0.0, error_rate=0.0,
+                 burst_every=0, burst_length=0, retry_after=1, fixtures=None, seed=1, gzip_responses=False):
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.error_rate = error_rate
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.retry_after = retry_after
+        self.gzip_responses = gzip_responses
+        self.competitions, self.rosters = fixtures if fixtures is not None else build_fixtures()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._request_count = 0
+        self.status_counts = {}
+        self.latencies = [] # Server-side handling time per request, in seconds
+        self.last_request_headers = {}
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def request_count(self):
+        with self._lock:
+            return self._request_count
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-transfermarkt", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Serves in the calling thread until stop() is called from another thread or Ctrl+C."""
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def reset_stats(self):
+        with self._lock:
+            self._request_count = 0
+            self.status_counts = {}
+            self.latencies = []
+            self.last_request_headers = {}
+
+    def _next_fault(self):
+        """Decides, under the lock, whether this request gets a 429, a 500 or a normal answer."""
+        with self._lock:
+            self._request_count += 1
+            count = self._request_count
+            if self.burst_every and self.burst_length:
+                position = (count - 1) % (self.burst_every + self.burst_length)
+                if position >= self.burst_every:
+                    return 429
+            if self.error_rate and self._rng.random() < self.error_rate:
+                return 500
+            return None
+
+    def _record(self, status, started):
+        with self._lock:
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            self.latencies.append(time.perf_counter() - started)
+
+    def _payload_for(self, path):
+        for pattern, route in _ROUTES:
+            match = pattern.match(path)
+            if not match:
+                continue
+            key = match.group(1)
+            if route in ('competition_clubs', 'competition'):
+                return self.competitions.get(key)
+            roster = self.rosters.get(key)
+            return None if roster is None else {'id': key, 'players': roster}
+        return None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # Keep-alive, like the real API
+            # Headers and body go out as two writes; with Nagle on, a reused connection waits for
+            # the client's delayed ACK (~40 ms) before the body, which would swamp the latencies measured
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                started = time.perf_counter()
+                with server._lock:
+                    server.last_request_headers = dict(self.headers)
+                delay = server.latency_ms + (server._rng.uniform(-1, 1) * server.latency_jitter_ms if server.latency_jitter_ms else 0)
+                if delay > 0:
+                    time.sleep(delay / 1000)
+
+                fault = server._next_fault()
+                if fault == 429:
+                    self._send(429, {'detail': 'Too Many Requests'}, {'Retry-After': str(server.retry_after)})
+                elif fault == 500:
+                    self._send(500, {'detail': 'Internal Server Error'})
+                else:
+                    payload = server._payload_for(self.path.split('?', 1)[0])
+                    if payload is None:
+                        self._send(404, {'detail': 'Not Found'})
+                    else:
+                        body = json.dumps(payload).encode('utf-8')
+                        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                        if self.headers.get('If-None-Match') == etag:
+                            self._send_raw(304, b'', {'ETag': etag})
+                        elif server.gzip_responses and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                            self._send_raw(200, gzip.compress(body), {'ETag': etag, 'Content-Type': 'application/json',
+                                                                      'Content-Encoding': 'gzip'})
+                        else:
+                            self._send_raw(200, body, {'ETag': etag, 'Content-Type': 'application/json'})
+                server._record(self._status, started)
+
+            def _send(self, status, payload, extra_headers=None):
+                headers = {'Content-Type': 'application/json', **(extra_headers or {})}
+                self._send_raw(status, json.dumps(payload).encode('utf-8'), headers)
+
+            def _send_raw(self, status, body, headers):
+                self._status = status
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass # Keep benchmark output readable
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve fixture Transfermarkt API responses locally.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--burst-every", type=int, default=0, help="Serve a 429 burst after this many requests (0 = never).")
+    parser.add_argument("--burst-length", type=int, default=0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+
+    mock_server = MockTransfermarktServer(args.host, args.port, args.latency_ms, args.latency_jitter_ms, args.error_rate,
+                                          args.burst_every, args.burst_length, args.retry_after)
+    print(f"Mock Transfermarkt API listening on {mock_server.base_url} (Ctrl+C to stop)")
+    try:
+        mock_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
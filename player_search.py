@@ -0,0 +1,158 @@
+"""
+Player name search index shared by load_data.py (which builds it) and api.py (which queries it).
+
+Names are folded in Python (accents stripped, case-folded, punctuation collapsed to spaces) and
+stored in player_search_names, indexed by folded name for exact and prefix matches. Two more
+indexes sit on top of it:
+  player_search        FTS5 trigram index (external content), so any substring of 3+ characters
+                       is an index lookup instead of a LIKE '%x%' scan over players
+  player_search_words  one row per folded word, so word-prefix matches (the only kind for 1-2
+                       character queries, too short for trigrams) are a B-tree range scan
+SQLite only gained the trigram tokenizer's remove_diacritics option in 3.45, so the accent folding
+is done here rather than in the tokenizer.
+"""
+import json
+import sqlite3
+import unicodedata
+
+# --- Configuration ---
+NAMES_TABLE = "player_search_names"
+SEARCH_TABLE = "player_search"
+WORDS_TABLE = "player_search_words"
+NAMES_INDEX = "idx_player_search_names_folded"
+MIN_TRIGRAM_QUERY_LENGTH = 3 # Shorter (folded) queries only match the start of a name or of one of its words
+SEARCH_INDEX_ROWS = 200 # Ids read from a tier's index before its matches count as common (see api.py)
+SEARCH_PROBE_ROWS = 2000 # Names read in order for a tier with common matches before falling back to its index
+
+# Letters that NFKD does not decompose into base letter + combining mark
+_EXTRA_FOLDS = str.maketrans({'ø': 'o', 'đ': 'd', 'ł': 'l', 'ı': 'i', 'æ': 'ae', 'œ': 'oe', 'þ': 'th', 'ð': 'd'})
+
+# Relevance tiers, lower is better: exact name, name prefix, word prefix, anywhere in the name
+MATCH_EXACT, MATCH_PREFIX, MATCH_WORD_PREFIX, MATCH_ANYWHERE = range(4)
+
+def fold_name(text):
+    """Folds a name for matching: 'Joško Gvardiol' -> 'josko gvardiol', 'Trent Alexander-Arnold' -> 'trent alexander arnold'."""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize('NFKD', str(text).casefold())
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch)).translate(_EXTRA_FOLDS)
+    return " ".join("".join(ch if ch.isalnum() else " " for ch in stripped).split())
+
+
+def fts_phrase(folded):
+    """Quotes a folded query as an FTS5 phrase; with the trigram tokenizer that is a substring match."""
+    return '"' + folded.replace('"', '""') + '"'
+
+
+def _prefix_end(text):
+    """Smallest string after every string starting with `text`: 'pe' -> 'pf'."""
+    return text[:-1] + chr(ord(text[-1]) + 1)
+
+
+def name_match_tiers(folded):
+    """
+    Returns (tiers, params) for matching `folded` against player_search_names s, best tier first.
+    Each tier is (rank, match_sql, ids_sql): its MATCH_* rank, a condition selecting exactly that
+    tier's names, and a query for a superset of their player ids from the words or trigram index
+    (empty for the exact and prefix tiers, which are ranges on the name index). Every tier is one
+    rank, so it can be ordered by name and cut to a LIMIT on its own: a search stops once the
+    better tiers fill a page instead of ranking every trigram match.
+    params are named and must be merged into the caller's parameter dict.
+    """
+    params = {'folded': folded, 'folded_end': _prefix_end(folded), 'spaced': ' ' + folded}
+    tiers = [
+        (MATCH_EXACT, " AND s.name_folded = :folded", ""),
+        (MATCH_PREFIX, " AND s.name_folded > :folded AND s.name_folded < :folded_end", ""),
+    ]
+    # Word prefix (position 1 would be a name prefix): a range on the words index, unless the query
+    # spans words; it is then 3+ characters long and its trigrams are far more selective
+    trigram_ids_sql = f"SELECT rowid AS player_id FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match"
+    word_ids_sql = (trigram_ids_sql if ' ' in folded else
+                    f"SELECT player_id FROM {WORDS_TABLE} WHERE word >= :folded AND word < :folded_end")
+    tiers.append((MATCH_WORD_PREFIX, " AND instr(' ' || s.name_folded, :spaced) > 1", word_ids_sql))
+    if len(folded) < MIN_TRIGRAM_QUERY_LENGTH:
+        return tiers, params # Too short for trigrams: only the start of a name or of one of its words matches
+    tiers.append((MATCH_ANYWHERE, " AND instr(' ' || s.name_folded, :spaced) = 0 AND instr(s.name_folded, :folded) > 0",
+                  trigram_ids_sql))
+    params['match'] = fts_phrase(folded)
+    return tiers, params
+
+
+def rebuild_player_search_index(conn, commit=True):
+    """
+    (Re)builds the folded-name table and both search indexes from the players table.
+    With commit=False the rebuild joins the caller's transaction, which commits (or rolls back) it.
+    """
+    print(f"Rebuilding {SEARCH_TABLE} index...")
+    try:
+        c = conn.cursor()
+        if not conn.in_transaction:
+            c.execute("BEGIN;") # Readers see the old index until the new one is complete, never neither
+        c.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE};")
+        c.execute(f"DROP TABLE IF EXISTS {WORDS_TABLE};")
+        c.execute(f"DROP TABLE IF EXISTS {NAMES_TABLE};")
+        c.execute(f"CREATE TABLE {NAMES_TABLE} (player_id INTEGER PRIMARY KEY, name_folded TEXT NOT NULL);")
+        c.execute(f"CREATE INDEX {NAMES_INDEX} ON {NAMES_TABLE} (name_folded);") # Exact and prefix tiers
+        c.execute(f""" CREATE TABLE {WORDS_TABLE} (
+                           word TEXT NOT NULL,
+                           player_id INTEGER NOT NULL,
+                           PRIMARY KEY (word, player_id)
+                       ) WITHOUT ROWID; """)
+        c.execute(f""" CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(
+                           name_folded, tokenize = 'trigram', content = '{NAMES_TABLE}', content_rowid = 'player_id'
+                       ); """)
+
+        rows = [(player_id, fold_name(name)) for player_id, name in
+                c.execute("SELECT player_id, name FROM players WHERE name IS NOT NULL;")]
+        c.executemany(f"INSERT INTO {NAMES_TABLE} (player_id, name_folded) VALUES (?, ?);", rows)
+        c.executemany(f"INSERT OR IGNORE INTO {WORDS_TABLE} (word, player_id) VALUES (?, ?);",
+                      ((word, player_id) for player_id, folded in rows for word in folded.split()))
+        c.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('rebuild');") # Index the external content
+        c.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize');") # Merge b-trees for faster reads
+        if commit:
+            conn.commit()
+        print(f"{SEARCH_TABLE} indexes {len(rows)} player names.")
+        return True
+    except sqlite3.Error as e:
+        print(f"Error rebuilding {SEARCH_TABLE}: {e}")
+        if commit:
+            conn.rollback()
+        return False
+
+
+def update_player_search_index(conn, player_ids):
+    """
+    Re-indexes only the given players (changed or new rows from an incremental load) instead of
+    folding every name again. Falls back to rebuild_player_search_index when there is no index yet.
+    """
+    if not player_ids:
+        return True
+    try:
+        c = conn.cursor()
+        if not c.execute("SELECT 1 FROM sqlite_master WHERE name = ?;", (SEARCH_TABLE,)).fetchone():
+            return rebuild_player_search_index(conn)
+        if not conn.in_transaction:
+            c.execute("BEGIN;")
+        c.execute(f"CREATE INDEX IF NOT EXISTS {NAMES_INDEX} ON {NAMES_TABLE} (name_folded);") # Indexes built before it existed
+        ids = json.dumps(sorted(player_ids))
+        # External-content FTS5 rows are removed by replaying their old values through 'delete'
+        c.execute(f"""INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rowid, name_folded)
+                      SELECT 'delete', player_id, name_folded FROM {NAMES_TABLE}
+                      WHERE player_id IN (SELECT value FROM json_each(?));""", (ids,))
+        c.execute(f"DELETE FROM {WORDS_TABLE} WHERE player_id IN (SELECT value FROM json_each(?));", (ids,))
+        c.execute(f"DELETE FROM {NAMES_TABLE} WHERE player_id IN (SELECT value FROM json_each(?));", (ids,))
+
+        rows = [(player_id, fold_name(name)) for player_id, name in
+                c.execute("SELECT player_id, name FROM players WHERE name IS NOT NULL "
+                          "AND player_id IN (SELECT value FROM json_each(?));", (ids,))]
+        c.executemany(f"INSERT INTO {NAMES_TABLE} (player_id, name_folded) VALUES (?, ?);", rows)
+        c.executemany(f"INSERT OR IGNORE INTO {WORDS_TABLE} (word, player_id) VALUES (?, ?);",
+                      ((word, player_id) for player_id, folded in rows for word in folded.split()))
+        c.executemany(f"INSERT INTO {SEARCH_TABLE} (rowid, name_folded) VALUES (?, ?);", rows)
+        conn.commit()
+        print(f"{SEARCH_TABLE} re-indexed {len(rows)} player names.")
+        return True
+    except sqlite3.Error as e:
+        print(f"Error updating {SEARCH_TABLE}: {e}")
+        conn.rollback()
+        return False
@@ -0,0 +1,194 @@
+"""
+On-disk HTTP response cache for the Transfermarkt API scraper.
+
+Responses are stored in a small SQLite database keyed by URL. Each endpoint class gets its own
+TTL; within the TTL a cached response is served without touching the network. Once it is stale,
+the scraper revalidates it with If-None-Match / If-Modified-Since and a 304 simply refreshes the
+entry. The cache is size-bounded and evicts least-recently-used entries first. In offline mode
+every lookup is served from the cache regardless of age and misses fail fast.
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# --- Configuration ---
+DEFAULT_CACHE_FILE = "transfermarkt_http_cache.db"
+DEFAULT_MAX_CACHE_BYTES = 200 * 1024 * 1024  # Evict LRU entries once stored bodies exceed this
+DEFAULT_TTL_SECONDS = 6 * 3600  # Used for URLs that match none of the endpoint classes below
+
+# TTL per endpoint class, matched against the URL path (first match wins).
+# Squad lists change at most a few times a day; competition membership even less often.
+ENDPOINT_TTLS = [
+    (re.compile(r"^/competitions/[^/]+/clubs/?$"), 24 * 3600),
+    (re.compile(r"^/competitions/[^/]+/?$"), 24 * 3600),
+    (re.compile(r"^/clubs/[^/]+/players/?$"), 6 * 3600),
+]
+
+# Headers that describe the wire encoding rather than the (already decoded) stored body
+_DROPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection'}
+
+
+class CachedResponse:
+    """A stored response plus the metadata needed to decide freshness and revalidate it."""
+    def __init__(self, url, status_code, content, headers, fetched_at, ttl):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.fetched_at = fetched_at
+        self.ttl = ttl
+
+    def is_fresh(self, now=None):
+        now = time.time() if now is None else now
+        return (now - self.fetched_at) < self.ttl
+
+    def conditional_headers(self):
+        """Returns If-None-Match / If-Modified-Since headers for revalidating this entry."""
+        conditional = {}
+        if self.headers.get('ETag'):
+            conditional['If-None-Match'] = self.headers['ETag']
+        if self.headers.get('Last-Modified'):
+            conditional['If-Modified-Since'] = self.headers['Last-Modified']
+        return conditional
+
+    def to_response(self):
+        """Builds a requests.Response so callers can use .json()/.text exactly as for a live response."""
+        response = requests.Response()
+        response.status_code = self.status_code
+        response._content = self.content
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.url = self.url
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.from_cache = True
+        return response
+
+
+class ResponseCache:
+    """SQLite-backed, size-bounded LRU cache of successful GET responses. Safe to share between threads."""
+    def __init__(self, path=DEFAULT_CACHE_FILE, max_bytes=DEFAULT_MAX_CACHE_BYTES, offline=False,
+                 endpoint_ttls=None, default_ttl=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.endpoint_ttls = ENDPOINT_TTLS if endpoint_ttls is None else endpoint_ttls
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.stored = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL;")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                status_code INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                content BLOB NOT NULL,
+                fetched_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                size INTEGER NOT NULL
+            );
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access);")
+        self._conn.commit()
+
+    def ttl_for(self, url):
+        """Returns the TTL in seconds for the endpoint class the URL belongs to."""
+        path = urlsplit(url).path
+        for pattern, ttl in self.endpoint_ttls:
+            if pattern.match(path):
+                return ttl
+        return self.default_ttl
+
+    def lookup(self, url):
+        """Returns the CachedResponse for url (fresh or stale), or None. Counts a hit only when it is usable as-is."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status_code, headers, content, fetched_at FROM responses WHERE url = ?;", (url,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE url = ?;", (now, url))
+            self._conn.commit()
+            entry = CachedResponse(url, row[0], row[2], json.loads(row[1]), row[3], self.ttl_for(url))
+            if self.offline or entry.is_fresh(now):
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry
+
+    def store(self, url, response):
+        """Stores a successful (200) response body and headers, then enforces the size bound."""
+        if response.status_code != 200:
+            return
+        content = response.content
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in _DROPPED_HEADERS}
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (url, status_code, headers, content, fetched_at, last_access, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?);",
+                (url, response.status_code, json.dumps(headers), content, now, now, len(content)),
+            )
+            self.stored += 1
+            self._evict_locked()
+            self._conn.commit()
+
+    def mark_revalidated(self, url, not_modified_response=None):
+        """Restarts the TTL of an entry after a 304, picking up any new validators the server sent."""
+        now = time.time()
+        with self._lock:
+            if not_modified_response is not None:
+                row = self._conn.execute("SELECT headers FROM responses WHERE url = ?;", (url,)).fetchone()
+                if row is not None:
+                    headers = json.loads(row[0])
+                    for validator in ('ETag', 'Last-Modified'):
+                        if not_modified_response.headers.get(validator):
+                            headers[validator] = not_modified_response.headers[validator]
+                    self._conn.execute("UPDATE responses SET headers = ? WHERE url = ?;", (json.dumps(headers), url))
+            self._conn.execute("UPDATE responses SET fetched_at = ?, last_access = ? WHERE url = ?;", (now, now, url))
+            self.revalidated += 1
+            self._conn.commit()
+
+    def _evict_locked(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses;").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Walk entries from least to most recently used until we are back under the bound
+        victims = []
+        for url, size in self._conn.execute("SELECT url, size FROM responses ORDER BY last_access ASC;"):
+            if total <= self.max_bytes:
+                break
+            victims.append((url,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE url = ?;", victims)
+        self.evicted += len(victims)
+
+    def stats(self):
+        with self._lock:
+            entries, total_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses;"
+            ).fetchone()
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidated': self.revalidated,
+                'stored': self.stored,
+                'evicted': self.evicted,
+                'entries': entries,
+                'bytes': total_bytes,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,1099 @@
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+import unittest.mock
+from contextlib import redirect_stdout
+from datetime import date
+from io import StringIO
+
+import analytics
+import api
+import instrumentation
+import load_data
+import player_search
+
+# Small fixture database with the tables/columns api.py queries
+FIXTURE_SQL = """
+    CREATE TABLE leagues (competition_id TEXT PRIMARY KEY, name TEXT, country_name TEXT);
+    CREATE TABLE clubs (club_id INTEGER PRIMARY KEY, name TEXT, domestic_competition_id TEXT);
+    CREATE TABLE players (player_id INTEGER PRIMARY KEY, name TEXT, current_club_id INTEGER, date_of_birth DATE,
+                          position TEXT, sub_position TEXT);
+    CREATE TABLE player_valuations (player_id INTEGER NOT NULL, date DATE, market_value_in_eur INTEGER,
+                                    current_club_id INTEGER, player_club_domestic_competition_id TEXT);
+    CREATE INDEX idx_player_valuations_player_date ON player_valuations (player_id, date);
+
+    INSERT INTO leagues VALUES ('GB1', 'Premier League', 'England'), ('ES1', 'LaLiga', 'Spain');
+    INSERT INTO clubs VALUES (1, 'Manchester City', 'GB1'), (2, 'Arsenal FC', 'GB1'), (3, 'Real Madrid', 'ES1');
+    INSERT INTO players VALUES
+        (10, 'Erling Haaland', 1, '2000-07-21', 'Attack', 'Centre-Forward'),
+        (11, 'Bukayo Saka', 2, '2001-09-05', 'Attack', 'Right Winger'),
+        (12, 'Kylian Mbappé', 3, '1998-12-20', 'Attack', 'Centre-Forward'),
+        (13, 'Declan Rice', 2, '1999-01-14', 'Midfield', 'Defensive Midfield'),
+        (14, 'Martin Ødegaard', 2, '1998-12-17', 'Midfield', 'Attacking Midfield'),
+        (15, 'Ricardo Pepi', 1, '2003-01-09', 'Attack', 'Centre-Forward');
+    INSERT INTO player_valuations VALUES
+        (10, '2023-06-01', 170000000, 1, 'GB1'), (10, '2024-06-01', 180000000, 1, 'GB1'),
+        (11, '2023-06-01', 110000000, 2, 'GB1'), (11, '2024-06-01', 140000000, 2, 'GB1'),
+        (12, '2022-06-01', 200000000, 3, 'ES1'), (12, '2024-06-01', 175000000, 3, 'ES1'),
+        (13, '2024-06-01', 120000000, 2, 'GB1');
+"""
+
+
+class ApiTestCase(unittest.TestCase):
+    """Points api.py at a fresh fixture database and silences the handlers' request logging."""
+
+    def setUp(self):
+        self.stdout = StringIO()
+        self._stdout = redirect_stdout(self.stdout)
+        self._stdout.__enter__()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, 'test.db')
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript(FIXTURE_SQL)
+        load_data.rebuild_player_current_value(conn)
+        load_data.rebuild_player_leaderboard(conn)
+        player_search.rebuild_player_search_index(conn)
+        conn.close()
+        self._original_database = api.DATABASE
+        api.DATABASE = self.db_path
+        self._original_cache = api.response_cache
+        api.response_cache = api.ResponseCache(version_check_interval=0) # See data_version bumps immediately
+        self.client = api.app.test_client()
+
+    def tearDown(self):
+        self._stdout.__exit__(None, None, None)
+        api.get_pool().close_all()
+        api.response_cache = self._original_cache
+        api.DATABASE = self._original_database
+        self.tmp_dir.cleanup()
+
+
+class TestConnectionPool(ApiTestCase):
+
+    def test_connections_are_reused_across_requests(self):
+        self.client.get('/api/leagues')
+        pool = api.get_pool()
+        with api.read_connection() as first:
+            pass
+        with api.read_connection() as second:
+            pass
+        self.assertIs(first, second)
+        self.assertIs(api.get_pool(), pool)
+        self.assertEqual(pool.idle_count(), 1)
+
+    def test_pooled_connections_are_read_only_and_use_wal(self):
+        self.assertIsNone(api.query_db("INSERT INTO leagues VALUES ('XX', 'Nope', 'Nowhere')"))
+        self.assertEqual(len(api.query_db("SELECT * FROM leagues")), 2)
+        journal_mode = sqlite3.connect(self.db_path).execute("PRAGMA journal_mode;").fetchone()[0]
+        self.assertEqual(journal_mode, 'wal')
+
+
+class TestServingConfig(unittest.TestCase):
+
+    def test_wsgi_entry_point_serves_the_api(self):
+        import wsgi
+        self.assertIs(wsgi.app, api.app)
+        self.assertIs(wsgi.application, api.app)
+
+    def test_gunicorn_config_reads_environment(self):
+        settings = {}
+        with unittest.mock.patch.dict(os.environ, {'API_WORKERS': '3', 'API_THREADS': '5', 'API_BIND': '127.0.0.1:9000'}):
+            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py')) as f:
+                exec(f.read(), settings)
+        self.assertEqual((settings['workers'], settings['threads'], settings['bind']), (3, 5, '127.0.0.1:9000'))
+        self.assertEqual(settings['worker_class'], 'gthread')
+
+
+class TestEndpoints(ApiTestCase):
+
+    def test_leagues(self):
+        response = self.client.get('/api/leagues')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([l['league_id'] for l in response.get_json()], ['ES1', 'GB1'])
+
+    def test_search_by_league_returns_latest_value(self):
+        players = self.client.get('/api/players/search?league=GB1').get_json()
+        self.assertEqual([p['name'] for p in players],
+                         ['Bukayo Saka', 'Declan Rice', 'Erling Haaland', 'Martin Ødegaard', 'Ricardo Pepi'])
+        self.assertEqual(players[2]['current_market_value_eur'], 180000000)
+        self.assertIsNone(players[4]['current_market_value_eur']) # No valuations yet
+
+    def test_player_details_and_not_found(self):
+        details = self.client.get('/api/players/12').get_json()
+        self.assertEqual(details['club_name'], 'Real Madrid')
+        self.assertEqual(details['current_market_value_eur'], 175000000)
+        self.assertEqual(self.client.get('/api/players/999').status_code, 404)
+
+    def test_valuations_in_date_order(self):
+        valuations = self.client.get('/api/players/10/valuations').get_json()
+        self.assertEqual([v['date'] for v in valuations], ['2023-06-01', '2024-06-01'])
+
+    def test_top_players_by_latest_value(self):
+        top = self.client.get('/api/players/top?limit=3').get_json()
+        self.assertEqual([p['name'] for p in top], ['Erling Haaland', 'Kylian Mbappé', 'Bukayo Saka'])
+
+
+class TestPlayerCurrentValue(ApiTestCase):
+
+    def _write(self, sql, args=()):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(sql, args)
+        conn.commit()
+        conn.close()
+
+    def test_latest_valuation_per_player(self):
+        rows = api.query_db("SELECT player_id, date, market_value_in_eur FROM player_current_value ORDER BY player_id")
+        self.assertEqual([(r['player_id'], r['date']) for r in rows],
+                         [(10, '2024-06-01'), (11, '2024-06-01'), (12, '2024-06-01'), (13, '2024-06-01')])
+
+    def test_new_valuations_update_incrementally(self):
+        self._write("INSERT INTO player_valuations VALUES (13, '2025-01-15', 190000000, 2, 'GB1')")
+        self._write("INSERT INTO player_valuations VALUES (10, '2020-01-01', 1000000, 1, 'GB1')") # Older: ignored
+
+        top = self.client.get('/api/players/top?limit=2').get_json()
+        self.assertEqual([(p['name'], p['current_market_value_eur']) for p in top],
+                         [('Declan Rice', 190000000), ('Erling Haaland', 180000000)])
+
+    def test_top_players_uses_value_index_without_grouping(self):
+        plan = " ".join(row['detail'] for row in api.query_db(
+            "EXPLAIN QUERY PLAN SELECT cv.player_id FROM player_current_value cv "
+            "WHERE cv.market_value_in_eur IS NOT NULL ORDER BY cv.market_value_in_eur DESC LIMIT 10"))
+        self.assertIn('idx_player_current_value_value', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class TestCsvLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, 'load.db')
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode = WAL;")
+        with redirect_stdout(StringIO()):
+            load_data.define_schema(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp_dir.cleanup()
+
+    def _csv(self, table, text):
+        path = os.path.join(self.tmp_dir.name, f'{table}.csv')
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def _load(self, table, text, swap=True):
+        with redirect_stdout(StringIO()) as out, unittest.mock.patch.object(load_data, 'CSV_CHUNK_ROWS', 3):
+            with load_data.bulk_load_pragmas(self.conn):
+                ok = load_data.load_csv_to_table(self.conn, table, self._csv(table, text))
+            if ok and swap:
+                load_data.swap_in_staging_tables(self.conn, [table])
+        return ok, out.getvalue()
+
+    def _indexes(self, table):
+        return {row[1] for row in self.conn.execute(f"PRAGMA index_list({table})") if row[3] == 'c'}
+
+    def test_chunked_load_cleans_and_types_every_row(self):
+        rows = ["player_id,date,market_value_in_eur,current_club_id,player_club_domestic_competition_id"]
+        rows += [f"{i},2024-01-{i:02d} 00:00:00,{i}000000.0,{i % 3 or ''},GB1" for i in range(1, 8)]
+        rows.append("8,not-a-date,,1,ES1")
+        ok, out = self._load('player_valuations', "\n".join(rows) + "\n")
+        self.assertTrue(ok)
+        self.assertRegex(out, r"loaded 8 rows into 'player_valuations' in [\d.]+ s \([\d,]+ rows/s\)")
+        loaded = self.conn.execute("SELECT player_id, date, market_value_in_eur, current_club_id FROM player_valuations "
+                                   "ORDER BY player_id").fetchall()
+        self.assertEqual(loaded[0], (1, '2024-01-01', 1000000, 1))
+        self.assertEqual(loaded[2], (3, '2024-01-03', 3000000, None))
+        self.assertEqual(loaded[7], (8, None, 0, 1))
+        self.assertEqual(self.conn.execute("SELECT typeof(player_id), typeof(market_value_in_eur) FROM player_valuations "
+                                           "GROUP BY 1, 2").fetchall(), [('integer', 'integer')])
+        self.assertEqual(self.conn.execute("PRAGMA journal_mode;").fetchone()[0], 'wal') # Never left WAL
+
+    def test_reload_keeps_schema_indexes_and_preserved_columns(self):
+        header = "player_id,name,current_club_id,date_of_birth,position,shirt_colour\n"
+        self._load('players', header + "1,Erling Haaland,5,2000-07-21,Attack,blue\n2,Bukayo Saka,6,2001-09-05,Attack,red\n")
+        self.conn.execute("UPDATE players SET fotmob_player_id = '737066' WHERE player_id = 1")
+        self.conn.commit()
+
+        ok, out = self._load('players', header + "1,Erling Haaland,7,2000-07-21,Attack,blue\n1,Duplicate,7,,,\n3,Declan Rice,6,,,\n")
+        self.assertTrue(ok)
+        self.assertIn("shirt_colour", out) # Reported, not loaded
+        self.assertIn("skipped 1 rows", out)
+        self.assertEqual(self.conn.execute("SELECT player_id, current_club_id, fotmob_player_id FROM players").fetchall(),
+                         [(1, 7, '737066'), (3, 6, None)])
+        schema = self.conn.execute("SELECT sql FROM sqlite_master WHERE name = 'players'").fetchone()[0]
+        self.assertIn('player_id INTEGER PRIMARY KEY', schema)
+        self.assertEqual(self._indexes('players'), set(load_data.TABLE_INDEXES['players']))
+        self.assertFalse(load_data.table_exists(self.conn, 'players__staging'))
+
+    def test_readers_keep_their_snapshot_until_the_swap(self):
+        self._load('clubs', "club_id,name,domestic_competition_id\n1,Old FC,GB1\n")
+        reader = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, timeout=0)
+        reader.execute("BEGIN")
+        self.assertEqual(reader.execute("SELECT name FROM clubs").fetchall(), [('Old FC',)])
+
+        self._load('clubs', "club_id,name,domestic_competition_id\n1,New FC,GB1\n", swap=False)
+        self.assertEqual(reader.execute("SELECT name FROM clubs").fetchall(), [('Old FC',)]) # Staged, not published
+        with redirect_stdout(StringIO()):
+            self.assertEqual(load_data.swap_in_staging_tables(self.conn, ['leagues', 'clubs']), ['clubs']) # Not blocked
+        self.assertEqual(reader.execute("SELECT name FROM clubs").fetchall(), [('Old FC',)]) # Open snapshot
+        reader.execute("COMMIT")
+        self.assertEqual(reader.execute("SELECT name FROM clubs").fetchall(), [('New FC',)])
+        self.assertEqual(self._indexes('clubs'), {'idx_clubs_league'})
+        reader.close()
+
+    def test_failed_load_leaves_live_table(self):
+        self._load('clubs', "club_id,name\n1,Live FC\n")
+        ok, out = self._load('clubs', "club_id,name\n2,Fine FC\nnot-an-id,Broken FC\n")
+        self.assertFalse(ok)
+        self.assertFalse(load_data.table_exists(self.conn, 'clubs__staging'))
+        self.assertEqual(self.conn.execute("SELECT name FROM clubs").fetchall(), [('Live FC',)])
+
+    def test_failed_load_rolls_back_outside_wal(self):
+        self.conn.execute("PRAGMA journal_mode = DELETE;")
+        self._load('clubs', "club_id,name\n1,Live FC\n")
+        with load_data.bulk_load_pragmas(self.conn):
+            self.assertEqual(self.conn.execute("PRAGMA journal_mode;").fetchone()[0], 'memory')
+        ok, out = self._load('clubs', "club_id,name\n2,Fine FC\nnot-an-id,Broken FC\n")
+        self.assertFalse(ok)
+        self.assertEqual(self.conn.execute("SELECT name FROM clubs").fetchall(), [('Live FC',)])
+        self.assertEqual(self.conn.execute("PRAGMA integrity_check;").fetchone()[0], 'ok')
+        self.assertEqual(self.conn.execute("PRAGMA journal_mode;").fetchone()[0], 'delete')
+
+    def test_swap_rebuilds_derived_tables_in_its_transaction(self):
+        header = "player_id,date,market_value_in_eur,current_club_id,player_club_domestic_competition_id\n"
+        current_values = "SELECT player_id, market_value_in_eur FROM player_current_value"
+        self._load('player_valuations', header + "1,2024-01-01,100,1,GB1\n", swap=False)
+        with redirect_stdout(StringIO()):
+            swapped = load_data.swap_in_staging_tables(self.conn, ['player_valuations'], rebuild_derived=True)
+        self.assertEqual(swapped, ['player_valuations'])
+        self.assertEqual(self.conn.execute(current_values).fetchall(), [(1, 100)])
+
+        # A derived table that can't be built keeps every previous table live
+        self._load('player_valuations', header + "1,2024-02-01,200,1,GB1\n", swap=False)
+        with redirect_stdout(StringIO()), \
+             unittest.mock.patch.object(load_data, 'rebuild_player_leaderboard', return_value=False):
+            self.assertIsNone(load_data.swap_in_staging_tables(self.conn, ['player_valuations'], rebuild_derived=True))
+        self.assertEqual(self.conn.execute("SELECT MAX(date) FROM player_valuations").fetchone()[0], '2024-01-01')
+        self.assertEqual(self.conn.execute(current_values).fetchall(), [(1, 100)])
+
+    def test_header_only_csv_keeps_existing_table(self):
+        self.conn.execute("INSERT INTO player_valuations (player_id) VALUES (1)")
+        self.conn.commit()
+        ok, out = self._load('player_valuations', "player_id,date,market_value_in_eur\n")
+        self.assertTrue(ok)
+        self.assertIn("Skipping table", out)
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM player_valuations").fetchone()[0], 1)
+
+    def test_csv_blocks_end_at_line_breaks(self):
+        text = "player_id,name\n" + "".join(f"{i},Player number {i}\n" for i in range(1, 60))
+        path = self._csv('players', text)
+        blocks = list(load_data.csv_blocks(path, 50))
+        self.assertGreater(len(blocks), 5)
+        data = text.encode()
+        self.assertEqual(blocks[0][0], len("player_id,name\n"))
+        self.assertEqual(blocks[-1][1], len(data))
+        for (_, end), (next_start, _) in zip(blocks, blocks[1:]):
+            self.assertEqual(end, next_start)
+            self.assertEqual(data[end - 1:end], b"\n")
+
+    def test_parse_pool_loads_the_same_rows(self):
+        rows = ["player_id,date,market_value_in_eur,current_club_id,player_club_domestic_competition_id,url"]
+        rows += [f"{i},2024-01-{i % 28 + 1:02d} 00:00:00,{i}000000.0,{i % 3 or ''},GB1,https://x/{i}" for i in range(1, 200)]
+        rows.append("200,not-a-date,,1,ES1,https://x/200")
+        text = "\n".join(rows) + "\n"
+        query = "SELECT * FROM player_valuations ORDER BY valuation_id"
+        self._load('player_valuations', text)
+        serial = self.conn.execute(query).fetchall()
+
+        with redirect_stdout(StringIO()) as out, unittest.mock.patch.object(load_data, 'CSV_BLOCK_BYTES', 256), \
+             load_data.parse_pool(2) as pool:
+            self.assertIsNotNone(pool)
+            self.assertTrue(load_data.load_csv_to_table(self.conn, 'player_valuations', self._csv('player_valuations', text), pool))
+            load_data.swap_in_staging_tables(self.conn, ['player_valuations'])
+        self.assertIn("Successfully loaded 200 rows", out.getvalue())
+        self.assertEqual(self.conn.execute(query).fetchall(), serial)
+
+    def test_incremental_load_matches_keys_once(self):
+        header = "player_id,date,market_value_in_eur,current_club_id,player_club_domestic_competition_id\n"
+        self._load('player_valuations', header + "1,2024-01-01,100,1,GB1\n1,2024-02-01,200,1,GB1\n2,2024-02-01,300,1,GB1\n")
+        # 2024-02-01 is the watermark: player 1's row there appears twice (the first row wins,
+        # and it is unchanged), player 2's is corrected, player 3's is new; January is not compared
+        path = self._csv('player_valuations', header + "1,2024-01-01,999,1,GB1\n1,2024-02-01,200,1,GB1\n"
+                         "1,2024-02-01,250,1,GB1\n2,2024-02-01,350,1,GB1\n3,2024-02-01,400,1,GB1\n")
+        with redirect_stdout(StringIO()), unittest.mock.patch.object(load_data, 'CSV_CHUNK_ROWS', 2):
+            summary = load_data.load_csv_incremental(self.conn, 'player_valuations', path)
+        self.assertEqual({field: summary[field] for field in ('inserted', 'updated', 'unchanged', 'skipped')},
+                         {'inserted': 1, 'updated': 1, 'unchanged': 1, 'skipped': 2})
+        self.assertEqual(summary['inserted_keys'], [(3, '2024-02-01')])
+        self.assertEqual(summary['updated_keys'], [(2, '2024-02-01')])
+        loaded = self.conn.execute("SELECT player_id, date, market_value_in_eur FROM player_valuations ORDER BY rowid").fetchall()
+        self.assertEqual(loaded, [(1, '2024-01-01', 100), (1, '2024-02-01', 200), (2, '2024-02-01', 350), (3, '2024-02-01', 400)])
+
+    def test_incremental_load_survives_a_chunk_of_blank_dates(self):
+        header = "player_id,date,market_value_in_eur,current_club_id,player_club_domestic_competition_id\n"
+        self._load('player_valuations', header + "1,2024-01-01,100,1,GB1\n")
+        # The first two-row chunk has no dates at all
+        path = self._csv('player_valuations', header + "2,,200,1,GB1\n3,,300,1,GB1\n4,2024-02-01,400,1,GB1\n")
+        with redirect_stdout(StringIO()), unittest.mock.patch.object(load_data, 'CSV_CHUNK_ROWS', 2):
+            summary = load_data.load_csv_incremental(self.conn, 'player_valuations', path)
+        self.assertEqual((summary['inserted'], summary['skipped']), (1, 2))
+        self.assertEqual(summary['inserted_keys'], [(4, '2024-02-01')])
+
+
+class TestFullReload(unittest.TestCase):
+    """Runs load_data.py end to end on Kaggle-style CSVs (twice: first load, then reload) and queries the result."""
+
+    CSVS = {
+        'leagues.csv': "competition_id,competition_code,name,sub_type,type,country_id,country_name,url\n"
+                       "GB1,premier-league,premier-league,first_tier,domestic_league,189,England,https://x\n",
+        'clubs.csv': "club_id,club_code,name,domestic_competition_id,squad_size,stadium_seats\n"
+                     "1,man-city,Manchester City,GB1,25,53400\n2,arsenal,Arsenal FC,GB1,26,60704\n",
+        'players.csv': "player_id,first_name,last_name,name,current_club_id,date_of_birth,position,sub_position,"
+                       "height_in_cm,market_value_in_eur\n"
+                       "10,Erling,Haaland,Erling Haaland,1,2000-07-21 00:00:00,Attack,Centre-Forward,195.0,180000000.0\n"
+                       "11,Bukayo,Saka,Bukayo Saka,2,2001-09-05 00:00:00,Attack,Right Winger,178.0,140000000.0\n",
+        'player_valuations.csv': "player_id,date,market_value_in_eur,current_club_id,player_club_domestic_competition_id\n"
+                                 "10,2024-06-01,180000000,1,GB1\n11,2023-06-01,110000000,2,GB1\n11,2024-06-01,140000000,2,GB1\n",
+    }
+
+    def _run_loader(self, cwd, *args, finished="CSV loading process finished."):
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'load_data.py')
+        result = subprocess.run([sys.executable, script, *args], cwd=cwd, capture_output=True, text=True, timeout=120)
+        self.assertIn(finished, result.stdout, result.stdout + result.stderr)
+        return result.stdout
+
+    def _write_csvs(self, tmp_dir, csvs):
+        os.makedirs(os.path.join(tmp_dir, 'data'), exist_ok=True)
+        for name, text in csvs.items():
+            with open(os.path.join(tmp_dir, 'data', name), 'w') as f:
+                f.write(text)
+
+    def test_reload_serves_indexed_queries(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self._write_csvs(tmp_dir, self.CSVS)
+            self._run_loader(tmp_dir)
+            output = self._run_loader(tmp_dir, '--workers', '2') # Reload over the existing tables, parsing in a pool
+            self.assertIn("Swapping in reloaded tables: leagues, clubs, players, player_valuations", output)
+
+            db_path = os.path.join(tmp_dir, load_data.DB_FILE)
+            conn = sqlite3.connect(db_path)
+            indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+            for table_indexes in load_data.TABLE_INDEXES.values():
+                self.assertLessEqual(set(table_indexes), indexes)
+            self.assertEqual(conn.execute("SELECT version FROM data_version").fetchone()[0], 2)
+            leftovers = conn.execute("SELECT name FROM sqlite_master WHERE name LIKE '%staging%'").fetchall()
+            self.assertEqual(leftovers, [])
+            conn.close()
+
+            original_database, original_cache = api.DATABASE, api.response_cache
+            api.DATABASE, api.response_cache = db_path, api.ResponseCache(version_check_interval=0)
+            try:
+                client = api.app.test_client()
+                self.assertEqual(client.get('/api/leagues').get_json(),
+                                 [{'league_id': 'GB1', 'name': 'premier-league', 'country': 'England'}])
+                self.assertEqual([p['name'] for p in client.get('/api/players/top?league=GB1').get_json()],
+                                 ['Erling Haaland', 'Bukayo Saka'])
+                self.assertEqual(client.get('/api/players/11').get_json()['current_market_value_eur'], 140000000)
+                self.assertEqual([p['player_id'] for p in client.get('/api/players/search?name=saka').get_json()], [11])
+                plan = " ".join(row['detail'] for row in api.query_db(
+                    "EXPLAIN QUERY PLAN SELECT date FROM player_valuations WHERE player_id = ? ORDER BY date", (10,)))
+                self.assertIn('idx_player_valuations_player_date', plan)
+            finally:
+                api.get_pool().close_all()
+                api.DATABASE, api.response_cache = original_database, original_cache
+
+    def test_incremental_load_applies_only_the_delta(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self._write_csvs(tmp_dir, self.CSVS)
+            self._run_loader(tmp_dir)
+
+            # Next snapshot: Saka renamed and revalued, his latest valuation corrected, a new
+            # valuation for Haaland, a new player, and an old row that the watermark skips
+            snapshot = dict(self.CSVS)
+            snapshot['players.csv'] = self.CSVS['players.csv'].replace(
+                "11,Bukayo,Saka,Bukayo Saka", "11,Bukayo,Saka,Bukayo Saka Jr").replace("140000000.0", "150000000.0") + \
+                "12,Cole,Palmer,Cole Palmer,2,2002-05-06 00:00:00,Midfield,Attacking Midfield,185.0,120000000.0\n"
+            snapshot['player_valuations.csv'] = self.CSVS['player_valuations.csv'].replace(
+                "11,2024-06-01,140000000", "11,2024-06-01,150000000") + \
+                "10,2024-12-01,200000000,1,GB1\n12,2024-12-01,120000000,2,GB1\n12,2020-01-01,1000000,2,GB1\n"
+            self._write_csvs(tmp_dir, snapshot)
+            output = self._run_loader(tmp_dir, '--incremental', finished="Incremental load finished.")
+            self.assertIn("'leagues': 0 inserted, 0 updated, 1 unchanged", output)
+            self.assertIn("'players': 1 inserted, 1 updated, 1 unchanged", output)
+            self.assertIn("'player_valuations': 2 inserted, 1 updated, 1 unchanged, 2 skipped (older than the watermark", output)
+
+            db_path = os.path.join(tmp_dir, load_data.DB_FILE)
+            conn = sqlite3.connect(db_path)
+            self.assertEqual(conn.execute("SELECT version FROM data_version").fetchone()[0], 2)
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM player_valuations").fetchone()[0], 5)
+            conn.close()
+
+            original_database, original_cache = api.DATABASE, api.response_cache
+            api.DATABASE, api.response_cache = db_path, api.ResponseCache(version_check_interval=0)
+            try:
+                client = api.app.test_client()
+                top = client.get('/api/players/top?league=GB1').get_json()
+                self.assertEqual([(p['name'], p['current_market_value_eur']) for p in top],
+                                 [('Erling Haaland', 200000000), ('Bukayo Saka Jr', 150000000),
+                                  ('Cole Palmer', 120000000)])
+                self.assertEqual([p['player_id'] for p in client.get('/api/players/search?name=palmer').get_json()], [12])
+                self.assertEqual([p['name'] for p in client.get('/api/players/search?name=saka').get_json()], ['Bukayo Saka Jr'])
+            finally:
+                api.get_pool().close_all()
+                api.DATABASE, api.response_cache = original_database, original_cache
+
+            # Running it again on the same snapshot changes nothing
+            output = self._run_loader(tmp_dir, '--incremental', finished="Incremental load finished.")
+            self.assertIn("Incremental load: 0 inserted, 0 updated, 8 unchanged rows.", output)
+            conn = sqlite3.connect(db_path)
+            self.assertEqual(conn.execute("SELECT version FROM data_version").fetchone()[0], 2)
+            conn.close()
+
+    def test_incremental_load_of_unchanged_snapshot_with_blank_integer_cells(self):
+        # A blank last_season makes pandas parse the column as float (2024.0)
+        csvs = dict(self.CSVS, **{
+            'players.csv': "player_id,name,last_season,current_club_id,date_of_birth,market_value_in_eur\n"
+                           "10,Erling Haaland,2024,1,2000-07-21 00:00:00,180000000.0\n"
+                           "11,Bukayo Saka,,2,2001-09-05 00:00:00,140000000.0\n"})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self._write_csvs(tmp_dir, csvs)
+            self._run_loader(tmp_dir)
+            output = self._run_loader(tmp_dir, '--incremental', finished="Incremental load finished.")
+            self.assertIn("'players': 0 inserted, 0 updated, 2 unchanged", output)
+            self.assertIn("Incremental load: 0 inserted, 0 updated,", output)
+            conn = sqlite3.connect(os.path.join(tmp_dir, load_data.DB_FILE))
+            self.assertEqual(conn.execute("SELECT version FROM data_version").fetchone()[0], 1)
+            self.assertEqual(conn.execute("SELECT last_season, typeof(last_season) FROM players "
+                                          "ORDER BY player_id").fetchall(), [(2024, 'integer'), (None, 'null')])
+            conn.close()
+
+    def test_incremental_load_into_empty_database_builds_derived_tables(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self._write_csvs(tmp_dir, self.CSVS)
+            output = self._run_loader(tmp_dir, '--incremental', finished="Incremental load finished.")
+            self.assertIn("building them from the loaded tables", output)
+
+            db_path = os.path.join(tmp_dir, load_data.DB_FILE)
+            original_database, original_cache = api.DATABASE, api.response_cache
+            api.DATABASE, api.response_cache = db_path, api.ResponseCache(version_check_interval=0)
+            try:
+                client = api.app.test_client()
+                self.assertEqual([p['name'] for p in client.get('/api/players/top?league=GB1').get_json()],
+                                 ['Erling Haaland', 'Bukayo Saka'])
+                self.assertEqual([p['player_id'] for p in client.get('/api/players/search?name=saka').get_json()], [11])
+            finally:
+                api.get_pool().close_all()
+                api.DATABASE, api.response_cache = original_database, original_cache
+
+            # The trigger is in place too: the next incremental load keeps current values up to date
+            self._write_csvs(tmp_dir, {'player_valuations.csv': self.CSVS['player_valuations.csv'] +
+                                       "11,2024-12-01,160000000,2,GB1\n"})
+            output = self._run_loader(tmp_dir, '--incremental', finished="Incremental load finished.")
+            self.assertNotIn("building them from the loaded tables", output)
+            conn = sqlite3.connect(db_path)
+            self.assertEqual(conn.execute("SELECT market_value_in_eur FROM player_current_value "
+                                          "WHERE player_id = 11").fetchone()[0], 160000000)
+            conn.close()
+
+
+class TestLeaderboard(ApiTestCase):
+
+    def _top(self, query):
+        return [p['player_id'] for p in self.client.get(f'/api/players/top?limit=100&{query}').get_json()]
+
+    def _plan(self, query):
+        """EXPLAIN QUERY PLAN of the SQL /api/players/top runs for `query`."""
+        captured = {}
+        def capturing_query_db(sql, args=(), one=False):
+            captured.update(sql=sql, args=args)
+            return []
+        with unittest.mock.patch.object(api, 'query_db', capturing_query_db):
+            self.client.get(f'/api/players/top?limit=100&{query}')
+        return " ".join(row['detail'] for row in api.query_db("EXPLAIN QUERY PLAN " + captured['sql'], captured['args']))
+
+    def test_filters(self):
+        self.assertEqual(self._top('league=GB1'), [10, 11, 13])
+        self.assertEqual(self._top('club=2'), [11, 13])
+        self.assertEqual(self._top('position=Attack'), [10, 12, 11])
+        self.assertEqual(self._top('sub_position=Centre-Forward'), [10, 12])
+        self.assertEqual(self._top('league=GB1&position=Midfield'), [13])
+        self.assertEqual(self._top('league=XX1'), [])
+
+    def test_age_range_is_inclusive_whole_years(self):
+        class FrozenDate(date):
+            @classmethod
+            def today(cls):
+                return cls(2024, 12, 20) # Mbappé turns 26 today
+        with unittest.mock.patch.object(api, 'date', FrozenDate):
+            self.assertEqual(self._top('min_age=26'), [12])
+            self.assertEqual(self._top('max_age=25'), [10, 11, 13])
+            self.assertEqual(self._top('min_age=23&max_age=24'), [10, 11])
+
+    def test_non_integer_filters_are_rejected(self):
+        for query in ('club=abc', 'min_age=twenty', 'max_age=2.5', 'club='):
+            self.assertEqual(self.client.get(f'/api/players/top?{query}').status_code, 400, query)
+
+    def test_new_valuations_reach_leaderboard(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO player_valuations VALUES (15, '2024-06-01', 30000000, 1, 'GB1')") # First valuation
+        conn.execute("INSERT INTO player_valuations VALUES (13, '2025-01-15', 190000000, 2, 'GB1')")
+        conn.commit()
+        conn.close()
+        self.assertEqual(self._top('club=1'), [10, 15])
+        self.assertEqual(self._top('club=2'), [13, 11])
+
+    def test_filtered_queries_walk_a_value_ordered_index(self):
+        for query, index in (('league=GB1', 'idx_player_leaderboard_league'),
+                             ('club=2', 'idx_player_leaderboard_club'),
+                             ('position=Attack', 'idx_player_leaderboard_position'),
+                             ('sub_position=Centre-Forward', 'idx_player_leaderboard_sub_position'),
+                             ('league=GB1&position=Attack', 'idx_player_leaderboard_league_position'),
+                             ('min_age=20&max_age=23', 'idx_player_leaderboard_value')):
+            plan = self._plan(query)
+            self.assertIn(index, plan, query)
+            self.assertNotIn('TEMP B-TREE', plan, query)
+
+
+class TestNameSearch(ApiTestCase):
+
+    def _names(self, query, **extra):
+        args = '&'.join(f"{k}={v}" for k, v in {'name': query, **extra}.items())
+        return [p['name'] for p in self.client.get(f'/api/players/search?{args}').get_json()]
+
+    def test_fold_name(self):
+        self.assertEqual(player_search.fold_name('Joško Gvardiol'), 'josko gvardiol')
+        self.assertEqual(player_search.fold_name("Martin  Ødegaard"), 'martin odegaard')
+        self.assertEqual(player_search.fold_name('Trent Alexander-Arnold'), 'trent alexander arnold')
+
+    def test_accent_and_case_insensitive_substring(self):
+        self.assertEqual(self._names('mbappe'), ['Kylian Mbappé'])
+        self.assertEqual(self._names('MBAPPÉ'), ['Kylian Mbappé'])
+        self.assertEqual(self._names('odegaard'), ['Martin Ødegaard'])
+        self.assertEqual(self._names('aala'), ['Erling Haaland'])
+        self.assertEqual(self._names('zzz'), [])
+
+    def test_results_ranked_by_match_quality(self):
+        # 'ric': prefix of 'Ricardo Pepi', word prefix in 'Declan Rice', substring elsewhere
+        self.assertEqual(self._names('ric'), ['Ricardo Pepi', 'Declan Rice'])
+        self.assertEqual(self._names('rice'), ['Declan Rice'])
+        self.assertEqual(self._names('ric', league='GB1'), ['Ricardo Pepi', 'Declan Rice'])
+        self.assertEqual(self._names('ric', limit=1), ['Ricardo Pepi'])
+
+    def test_short_queries_match_word_prefixes(self):
+        # Too short for trigrams: matched by a prefix range on player_search_words, so only the
+        # start of a name or of one of its words matches
+        self.assertEqual(self._names('ø'), ['Martin Ødegaard'])
+        self.assertEqual(self._names('pe'), ['Ricardo Pepi'])
+        self.assertEqual(self._names('r'), ['Ricardo Pepi', 'Declan Rice'])
+
+    def test_name_queries_use_search_indexes(self):
+        names_index = player_search.NAMES_INDEX
+        for text, expected in (('mbap', [names_index, names_index, 'player_search_words', 'VIRTUAL TABLE INDEX']),
+                               ('kylian mb', [names_index, names_index, 'VIRTUAL TABLE INDEX', 'VIRTUAL TABLE INDEX']),
+                               ('mb', [names_index, names_index, 'player_search_words'])):
+            tiers, params = player_search.name_match_tiers(text)
+            self.assertEqual(len(tiers), len(expected))
+            for (rank, match_sql, ids_sql), index in zip(tiers, expected):
+                restrict = f" AND s.player_id IN ({ids_sql})" if ids_sql else ""
+                plan = [row['detail'] for row in api.query_db(
+                    f"EXPLAIN QUERY PLAN SELECT s.player_id FROM {player_search.NAMES_TABLE} s JOIN players p "
+                    f"ON p.player_id = s.player_id WHERE 1=1{match_sql}{restrict}", params)]
+                self.assertIn(index, " ".join(plan), (text, rank))
+                self.assertNotIn('SCAN p', plan) # Never a full scan of players
+                self.assertNotIn('SCAN s', plan)
+
+    def test_rank_tiers_page_in_order(self):
+        # 'ric' matches Ricardo Pepi by name prefix and Declan Rice by word prefix: one tier each
+        self.assertEqual(self._names('ric'), ['Ricardo Pepi', 'Declan Rice'])
+        first = self.client.get('/api/players/search?name=ric&limit=1')
+        self.assertEqual([p['name'] for p in first.get_json()], ['Ricardo Pepi'])
+        second = self.client.get(f"/api/players/search?name=ric&limit=1&cursor={first.headers['X-Next-Cursor']}")
+        self.assertEqual([p['name'] for p in second.get_json()], ['Declan Rice'])
+        self.assertNotIn('X-Next-Cursor', second.headers)
+        bad_rank = api.encode_cursor('rank', ['1', 'ricardo pepi', 15])
+        self.assertEqual(self.client.get(f'/api/players/search?name=ric&cursor={bad_rank}').status_code, 400)
+
+    def test_index_fallback_matches_probe(self):
+        # With a one-id index read every word-prefix/anywhere tier counts as common and is probed
+        # in name order; with a one-row probe as well, it falls back to the full index lookup
+        queries = [('r', {}), ('ri', {}), ('ric', {}), ('aa', {}), ('aal', {}), ('ard', {}), ('mbappe', {}),
+                   ('kylian mb', {}), ('an', {}), ('ni', {'league': 'GB1'})]
+        bounded = [self._names(query, limit=3, **extra) for query, extra in queries]
+        with unittest.mock.patch.object(api, 'SEARCH_INDEX_ROWS', 1):
+            self.assertEqual([self._names(query, limit=3, **extra) for query, extra in queries], bounded)
+            with unittest.mock.patch.object(api, 'SEARCH_PROBE_ROWS', 1):
+                self.assertEqual([self._names(query, limit=3, **extra) for query, extra in queries], bounded)
+        self.assertEqual(bounded[5], ['Martin Ødegaard', 'Ricardo Pepi']) # 'ard': anywhere, in name order
+
+
+class TestPagination(ApiTestCase):
+
+    def _walk(self, url, page_size):
+        """Follows X-Next-Cursor until the last page; returns the pages' player ids."""
+        pages = []
+        cursor = None
+        while True:
+            page_url = f"{url}{'&' if '?' in url else '?'}limit={page_size}" + (f"&cursor={cursor}" if cursor else "")
+            response = self.client.get(page_url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([p['player_id'] for p in response.get_json()])
+            cursor = response.headers.get('X-Next-Cursor')
+            if cursor is None:
+                return pages
+            self.assertLess(len(pages), 10)
+
+    def _all_ids(self, url):
+        return [p['player_id'] for p in self.client.get(f"{url}&limit=100").get_json()]
+
+    def test_search_pages_cover_results_once(self):
+        for url in ('/api/players/search?league=GB1', '/api/players/search?name=ri', '/api/players/search?name=an'):
+            pages = self._walk(url, 2)
+            self.assertEqual([i for page in pages for i in page], self._all_ids(url), url)
+            self.assertTrue(all(len(page) <= 2 for page in pages))
+
+    def test_top_pages_break_value_ties_by_player_id(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO player_valuations VALUES (14, '2024-06-01', 140000000, 2, 'GB1')") # Ties Saka
+        conn.commit()
+        conn.close()
+        pages = self._walk('/api/players/top', 1)
+        self.assertEqual(pages, [[10], [12], [11], [14], [13]])
+
+    def test_non_positive_limit_is_rejected(self):
+        for url in ('/api/players/top?limit=0', '/api/players/top?limit=-1', '/api/players/search?limit=-1',
+                    '/api/players/search?name=ric&limit=0', '/api/players/search?limit=-1&format=ndjson'):
+            self.assertEqual(self.client.get(url).status_code, 400, url)
+
+    def test_last_full_page_has_no_cursor(self):
+        response = self.client.get('/api/players/top?limit=4')
+        self.assertNotIn('X-Next-Cursor', response.headers)
+        self.assertEqual(len(response.get_json()), 4)
+
+    def test_invalid_or_foreign_cursor_is_rejected(self):
+        self.assertEqual(self.client.get('/api/players/search?cursor=not-a-cursor').status_code, 400)
+        top_cursor = self.client.get('/api/players/top?limit=1').headers['X-Next-Cursor']
+        self.assertEqual(self.client.get(f'/api/players/search?cursor={top_cursor}').status_code, 400)
+        self.assertEqual(self.client.get(f'/api/players/search?name=ric&cursor={top_cursor}').status_code, 400)
+
+    def test_cursor_with_non_scalar_values_is_rejected(self):
+        top_cursor = api.encode_cursor('value', [{'a': 1}, 2])
+        self.assertEqual(self.client.get(f'/api/players/top?cursor={top_cursor}').status_code, 400)
+        search_cursor = api.encode_cursor('name', [[1], 2])
+        self.assertEqual(self.client.get(f'/api/players/search?cursor={search_cursor}').status_code, 400)
+
+    def test_cached_page_keeps_cursor(self):
+        first = self.client.get('/api/players/top?limit=2')
+        second = self.client.get('/api/players/top?limit=2')
+        self.assertEqual(second.headers['X-Cache'], 'HIT')
+        self.assertEqual(second.headers['X-Next-Cursor'], first.headers['X-Next-Cursor'])
+
+    def test_top_keyset_query_walks_value_index(self):
+        plan = " ".join(row['detail'] for row in api.query_db(
+            "EXPLAIN QUERY PLAN SELECT lb.player_id FROM player_leaderboard lb "
+            "WHERE lb.market_value_in_eur IS NOT NULL AND lb.market_value_in_eur <= ? "
+            "AND (lb.market_value_in_eur < ? OR lb.player_id > ?) "
+            "ORDER BY lb.market_value_in_eur DESC, lb.player_id LIMIT 10", (1, 1, 1)))
+        self.assertIn('idx_player_leaderboard_value', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class TestNdjsonStreaming(ApiTestCase):
+
+    def test_streams_same_rows_as_json(self):
+        for url in ('/api/players/search?league=GB1', '/api/players/search?name=a', '/api/players/top?limit=3'):
+            response = self.client.get(url + '&format=ndjson')
+            self.assertEqual(response.mimetype, 'application/x-ndjson')
+            self.assertTrue(response.is_streamed)
+            rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+            self.assertEqual(rows, self.client.get(url).get_json(), url)
+
+    def test_streamed_responses_are_not_cached(self):
+        self.client.get('/api/players/top?format=ndjson').get_data()
+        response = self.client.get('/api/players/top?format=ndjson')
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        self.assertEqual(len(response.get_data(as_text=True).splitlines()), 4)
+
+
+class TestBatchLookup(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript("""
+            CREATE TABLE player_form_stats (player_id INTEGER PRIMARY KEY, average_rating_last_10 REAL,
+                                            goals_last_10 INTEGER, assists_last_10 INTEGER, calculation_timestamp TEXT);
+            INSERT INTO player_form_stats VALUES (10, 7.9, 9, 2, '2025-01-01 10:00:00');
+        """)
+        conn.close()
+
+    def _count_queries(self, url, **kwargs):
+        calls = []
+        original = api.query_db
+        def counting_query_db(*args, **kw):
+            calls.append(args[0])
+            return original(*args, **kw)
+        api.query_db = counting_query_db
+        try:
+            response = self.client.open(url, **kwargs)
+        finally:
+            api.query_db = original
+        return response, len(calls)
+
+    def test_matches_single_player_endpoints(self):
+        response = self.client.get('/api/players/batch?ids=12,10,999,10&fields=details,latest_value,valuations,form')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual([p['player_id'] for p in data['players']], [12, 10]) # Request order, duplicates dropped
+        self.assertEqual(data['not_found'], [999])
+        for entry in data['players']:
+            player_id = entry['player_id']
+            self.assertEqual(entry['details'], self.client.get(f'/api/players/{player_id}').get_json())
+            self.assertEqual(entry['valuations'], self.client.get(f'/api/players/{player_id}/valuations').get_json())
+            self.assertEqual(entry['latest_value'], {'date': '2024-06-01',
+                                                     'market_value_in_eur': entry['details']['current_market_value_eur']})
+        self.assertEqual(data['players'][1]['form'], self.client.get('/api/players/10/form').get_json())
+        self.assertIsNone(data['players'][0]['form'])
+
+    def test_field_selection_and_post_body(self):
+        response = self.client.post('/api/players/batch', json={'ids': [11, '13'], 'fields': ['valuations']})
+        players = response.get_json()['players']
+        self.assertEqual([sorted(p) for p in players], [['player_id', 'valuations']] * 2)
+        self.assertEqual([len(p['valuations']) for p in players], [2, 1])
+        self.assertEqual(sorted(self.client.get('/api/players/batch?ids=11').get_json()['players'][0]),
+                         ['details', 'latest_value', 'player_id']) # Default fields
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        fields = 'details,valuations,form'
+        _, small = self._count_queries(f'/api/players/batch?ids=10&fields={fields}')
+        many = ','.join(str(i) for i in range(1, api.MAX_BATCH_IDS + 1))
+        _, large = self._count_queries('/api/players/batch', method='POST',
+                                       json={'ids': many.split(','), 'fields': fields.split(',')})
+        self.assertEqual((small, large), (3, 3))
+
+    def test_bad_requests(self):
+        too_many = ','.join(str(i) for i in range(api.MAX_BATCH_IDS + 1))
+        for url in ('/api/players/batch', '/api/players/batch?ids=abc', f'/api/players/batch?ids={too_many}',
+                    '/api/players/batch?ids=10&fields=details,salary'):
+            self.assertEqual(self.client.get(url).status_code, 400, url)
+        self.assertEqual(self.client.post('/api/players/batch', json=[10]).status_code, 400)
+        self.assertEqual(self.client.get(f'/api/players/batch?ids={2 ** 63}').status_code, 400)
+        for ids in ([True], [10, 1.7], [{'id': 10}], [float('inf')], [2.0], [1e300], [2 ** 63], ['-9223372036854775809']):
+            self.assertEqual(self.client.post('/api/players/batch', json={'ids': ids}).status_code, 400, ids)
+
+
+class TestInstrumentation(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        instrumentation.registry.reset()
+        instrumentation._slow_logged_at.clear()
+        self._settings = (instrumentation.ENABLED, instrumentation.SLOW_QUERY_MS, instrumentation.REQUEST_LOG_SAMPLE_RATE)
+        instrumentation.REQUEST_LOG_SAMPLE_RATE = 0
+
+    def tearDown(self):
+        instrumentation.ENABLED, instrumentation.SLOW_QUERY_MS, instrumentation.REQUEST_LOG_SAMPLE_RATE = self._settings
+        super().tearDown()
+
+    def test_metrics_endpoint_exposes_request_sql_and_serialization_timings(self):
+        self.client.get('/api/players/top?limit=2')
+        self.client.get('/api/players/999')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.headers['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        body = response.get_data(as_text=True)
+        self.assertIn('api_requests_total{endpoint="get_top_players",method="GET",status="200"} 1', body)
+        self.assertIn('api_requests_total{endpoint="get_player_details",method="GET",status="404"} 1', body)
+        self.assertIn('api_request_duration_seconds_bucket{endpoint="get_top_players",le="+Inf"} 1', body)
+        self.assertIn('api_sql_query_duration_seconds_count{endpoint="get_top_players"} 1', body)
+        self.assertIn('api_sql_rows_total{endpoint="get_top_players"} 3', body) # limit + 1 look-ahead row
+        self.assertIn('api_serialization_duration_seconds_count{endpoint="get_top_players"} 1', body)
+        self.assertIn('# TYPE api_response_cache_misses gauge', body)
+        self.assertIn('api_db_pool_idle_connections 1', body)
+
+    def test_streamed_queries_are_timed(self):
+        self.client.get('/api/players/search?league=GB1&format=ndjson').get_data()
+        self.assertEqual(instrumentation.registry.value('api_sql_rows_total', ('search_players',)), 5)
+
+    def test_slow_queries_logged_once_with_plan(self):
+        instrumentation.SLOW_QUERY_MS = 0
+        with self.assertLogs('api.slow_queries', 'WARNING') as logs:
+            self.client.get('/api/players/top?limit=2')
+            self.client.get('/api/players/top?limit=3') # Same statement: not logged (or EXPLAINed) again
+        self.assertEqual(len(logs.records), 1)
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual((entry['endpoint'], entry['rows']), ('get_top_players', 3))
+        self.assertTrue(any('idx_player_leaderboard_value' in step for step in entry['plan']))
+        self.assertEqual(instrumentation.registry.value('api_sql_slow_queries_total', ('get_top_players',)), 2)
+
+    def test_sampled_request_log_line(self):
+        instrumentation.REQUEST_LOG_SAMPLE_RATE = 1.0
+        with self.assertLogs('api.requests', 'INFO') as logs:
+            self.client.get('/api/players/batch?ids=10,11&fields=details,valuations')
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual((entry['endpoint'], entry['status'], entry['sql_queries'], entry['rows']),
+                         ('get_players_batch', 200, 2, 6))
+        self.assertGreater(entry['serialize_ms'], 0)
+
+    def test_disabled_records_nothing(self):
+        instrumentation.ENABLED = False
+        self.client.get('/api/players/top?limit=2')
+        self.assertNotIn('api_requests_total', self.client.get('/metrics').get_data(as_text=True))
+
+    def test_handlers_no_longer_print_sql(self):
+        self.client.get('/api/players/search?name=ric')
+        self.client.get('/api/players/top')
+        self.assertNotIn('SELECT', self.stdout.getvalue())
+
+
+class TestResponseCache(ApiTestCase):
+
+    def _bump(self):
+        conn = sqlite3.connect(self.db_path)
+        load_data.bump_data_version(conn)
+        conn.close()
+
+    def test_repeat_requests_are_served_from_cache(self):
+        first = self.client.get('/api/players/top?limit=2')
+        second = self.client.get('/api/players/top?limit=2')
+        self.assertEqual(first.headers['X-Cache'], 'MISS')
+        self.assertEqual(second.headers['X-Cache'], 'HIT')
+        self.assertEqual(first.get_data(), second.get_data())
+        self.assertEqual(self.client.get('/api/players/top?limit=3').headers['X-Cache'], 'MISS')
+
+        stats = self.client.get('/api/cache/stats').get_json()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 2, 2))
+
+    def test_escaped_query_does_not_share_a_key(self):
+        poisoned = self.client.get('/api/players/top?league=GB1%26limit%3D2')
+        self.assertEqual(poisoned.get_json(), [])
+        response = self.client.get('/api/players/top?league=GB1&limit=2')
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        self.assertEqual(len(response.get_json()), 2)
+
+    def test_age_filtered_pages_expire_at_midnight(self):
+        class FrozenDate(date):
+            day_shown = (2024, 12, 19)
+            @classmethod
+            def today(cls):
+                return cls(*cls.day_shown)
+        with unittest.mock.patch.object(api, 'date', FrozenDate):
+            self.assertEqual(self.client.get('/api/players/top?min_age=26').get_json(), [])
+            self.client.get('/api/players/top')
+            FrozenDate.day_shown = (2024, 12, 20) # Mbappé turns 26
+            response = self.client.get('/api/players/top?min_age=26')
+            self.assertEqual(response.headers['X-Cache'], 'MISS')
+            self.assertEqual([p['player_id'] for p in response.get_json()], [12])
+            self.assertEqual(self.client.get('/api/players/top').headers['X-Cache'], 'HIT')
+
+    def test_not_found_is_not_cached(self):
+        self.client.get('/api/players/999')
+        self.assertEqual(self.client.get('/api/players/999').headers['X-Cache'], 'MISS')
+
+    def test_data_version_bump_invalidates(self):
+        self._bump()
+        self.assertEqual(self.client.get('/api/players/13').get_json()['current_market_value_eur'], 120000000)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO player_valuations VALUES (13, '2025-01-15', 190000000, 2, 'GB1')")
+        conn.commit()
+        conn.close()
+        self.assertEqual(self.client.get('/api/players/13').headers['X-Cache'], 'HIT') # Not bumped yet
+
+        self._bump()
+        response = self.client.get('/api/players/13')
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        self.assertEqual(response.get_json()['current_market_value_eur'], 190000000)
+        self.assertEqual(api.response_cache.stats()['invalidations'], 1)
+
+    def test_ttl_and_lru_bounds(self):
+        api.response_cache.max_entries = 2
+        for player_id in (10, 11, 12):
+            self.client.get(f'/api/players/{player_id}')
+        self.assertEqual(api.response_cache.stats()['evictions'], 1)
+        self.assertEqual(self.client.get('/api/players/10').headers['X-Cache'], 'MISS') # Least recently used
+
+        api.response_cache.ttl = 0
+        self.client.get('/api/leagues')
+        self.assertEqual(self.client.get('/api/leagues').headers['X-Cache'], 'MISS')
+
+
+class TestValuationHistory(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Player 15: two valuations a month for ten years, flat apart from one spike
+        rows = [(15, f"{year}-{month:02d}-{day:02d}", 20000000 + (60000000 if (year, month) == (2019, 7) else 0), 1, 'GB1')
+                for year in range(2015, 2025) for month in range(1, 13) for day in (1, 15)]
+        conn = sqlite3.connect(self.db_path)
+        conn.executemany("INSERT INTO player_valuations VALUES (?, ?, ?, ?, ?)", rows)
+        conn.commit()
+        conn.close()
+        self.full = self.client.get('/api/players/15/valuations').get_json()
+
+    def test_lttb_keeps_endpoints_and_spikes(self):
+        sampled = self.client.get('/api/players/15/valuations?points=20').get_json()
+        self.assertEqual(len(sampled), 20)
+        self.assertEqual((sampled[0], sampled[-1]), (self.full[0], self.full[-1]))
+        self.assertIn(80000000, [v['market_value_in_eur'] for v in sampled])
+        self.assertEqual([v['date'] for v in sampled], sorted(v['date'] for v in sampled))
+        self.assertTrue(all(v in self.full for v in sampled)) # Real points only, never interpolated
+
+        self.assertEqual(self.client.get('/api/players/10/valuations?points=20').get_json(),
+                         self.client.get('/api/players/10/valuations').get_json()) # Short series untouched
+
+    def test_bucket_keeps_last_valuation_per_period(self):
+        monthly = self.client.get('/api/players/15/valuations?bucket=month').get_json()
+        self.assertEqual(len(monthly), 120)
+        self.assertTrue(all(v['date'].endswith('-15') for v in monthly))
+        yearly = self.client.get('/api/players/15/valuations?bucket=year&points=5').get_json()
+        self.assertEqual([v['date'] for v in yearly][0], '2015-12-15')
+        self.assertEqual(len(yearly), 5)
+
+    def test_columnar_shape(self):
+        columns = self.client.get('/api/players/15/valuations?shape=columns').get_json()
+        self.assertEqual(columns['date'], [v['date'] for v in self.full])
+        self.assertEqual(columns['market_value_in_eur'], [v['market_value_in_eur'] for v in self.full])
+
+    def test_bad_parameters(self):
+        for query in ('points=1', 'points=abc', 'bucket=week', 'shape=csv'):
+            self.assertEqual(self.client.get(f'/api/players/15/valuations?{query}').status_code, 400, query)
+
+    def test_etag_revalidation(self):
+        first = self.client.get('/api/players/15/valuations?points=50')
+        etag = first.headers['ETag']
+        self.assertEqual(first.headers['Cache-Control'], 'no-cache')
+        revalidated = self.client.get('/api/players/15/valuations?points=50', headers={'If-None-Match': etag})
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.get_data(), b'')
+        self.assertEqual(revalidated.headers['X-Cache'], 'HIT') # The cached ETag is reused, not recomputed
+
+        changed = self.client.get('/api/players/15/valuations?points=60', headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(self.client.get('/api/players/999', headers={'If-None-Match': etag}).status_code, 404)
+
+
+class TestAnalytics(unittest.TestCase):
+    """analytics.py on a few valuations either side of season and competition boundaries."""
+
+    VALUATIONS = [
+        (1, '2023-06-30', 1_000_000, 'GB1'), # Season 2022
+        (1, '2023-07-01', 2_000_000, 'GB1'), # Season 2023 from here on
+        (1, '2024-06-30', 30_000_000, 'GB1'),
+        (2, '2023-09-01', 400_000, 'GB1'),
+        (2, '2024-01-01', None, 'GB1'),
+        (3, '2024-02-01', 150_000_000, 'ES1'),
+        (3, '2024-08-01', 180_000_000, 'ES1'), # Season 2024
+        (4, None, 5_000_000, 'ES1'), # No date: in no season
+    ]
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, 'analytics.db')
+        self.snapshot_dir = os.path.join(self.tmp_dir.name, 'snapshot')
+        conn = sqlite3.connect(self.db_path)
+        with redirect_stdout(StringIO()):
+            load_data.define_schema(conn)
+        conn.executemany("INSERT INTO player_valuations (player_id, date, market_value_in_eur, "
+                         "player_club_domestic_competition_id) VALUES (?, ?, ?, ?);", self.VALUATIONS)
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _query(self, function, backend, **filters):
+        return function(backend=backend, database=self.db_path, snapshot_dir=self.snapshot_dir, **filters)
+
+    def test_sqlite_trends_and_distribution(self):
+        trends = self._query(analytics.league_value_trends, 'sqlite')
+        self.assertEqual([(t['season'], t['league_id'], t['players'], t['valuations'], t['mean_value_eur'], t['max_value_eur'])
+                          for t in trends],
+                         [(2022, 'GB1', 1, 1, 1_000_000, 1_000_000),
+                          (2023, 'ES1', 1, 1, 150_000_000, 150_000_000),
+                          (2023, 'GB1', 2, 3, 10_800_000, 30_000_000),
+                          (2024, 'ES1', 1, 1, 180_000_000, 180_000_000)])
+        filtered = self._query(analytics.league_value_trends, 'sqlite', seasons=[2023], leagues=['GB1'])
+        self.assertEqual([(t['season'], t['league_id']) for t in filtered], [(2023, 'GB1')])
+
+        buckets = self._query(analytics.value_distribution, 'sqlite', edges=(0, 1_000_000, 100_000_000))
+        self.assertEqual(buckets, [{'min_eur': 0, 'max_eur': 1_000_000, 'valuations': 1},
+                                   {'min_eur': 1_000_000, 'max_eur': 100_000_000, 'valuations': 3},
+                                   {'min_eur': 100_000_000, 'max_eur': None, 'valuations': 2}])
+        es1 = self._query(analytics.value_distribution, 'sqlite', leagues=['ES1'], edges=(0, 100_000_000))
+        self.assertEqual([bucket['valuations'] for bucket in es1], [0, 2])
+
+    def test_backend_selection(self):
+        if not analytics.PYARROW_AVAILABLE:
+            with redirect_stdout(StringIO()) as out:
+                self.assertTrue(load_data.refresh_analytics_snapshot(None))
+            self.assertIn("pyarrow is not installed", out.getvalue())
+        self.assertEqual(self._query(analytics.league_value_trends, None),
+                         self._query(analytics.league_value_trends, 'sqlite')) # No snapshot yet
+        with self.assertRaises(RuntimeError):
+            self._query(analytics.league_value_trends, 'parquet')
+        with self.assertRaises(ValueError):
+            self._query(analytics.value_distribution, 'duckdb')
+
+    def test_database_path_with_uri_characters(self):
+        odd_path = os.path.join(self.tmp_dir.name, 'odd dir #1?', 'analytics.db')
+        os.makedirs(os.path.dirname(odd_path))
+        shutil.copy(self.db_path, odd_path)
+        self.assertEqual(analytics.league_value_trends(backend='sqlite', database=odd_path),
+                         self._query(analytics.league_value_trends, 'sqlite'))
+
+    def test_season_of_matches_sql(self):
+        conn = sqlite3.connect(self.db_path)
+        for day in ('2023-06-30', '2023-07-01', '2024-01-15', '2024-12-31'):
+            self.assertEqual(analytics.season_of(day),
+                             conn.execute(f"SELECT {analytics.SEASON_SQL} FROM (SELECT ? AS date)", (day,)).fetchone()[0])
+        conn.close()
+
+    @unittest.skipUnless(analytics.PYARROW_AVAILABLE, "pyarrow is not installed")
+    def test_parquet_snapshot_matches_sqlite(self):
+        conn = sqlite3.connect(self.db_path)
+        with redirect_stdout(StringIO()):
+            self.assertTrue(analytics.write_valuations_snapshot(conn, self.snapshot_dir))
+        self.assertEqual(sorted(os.listdir(analytics.snapshot_path(self.snapshot_dir))),
+                         ['season=2022', 'season=2023', 'season=2024'])
+        cases = [{}, {'seasons': [2023]}, {'leagues': ['ES1']}, {'seasons': [2023, 2024], 'leagues': ['GB1']}]
+        for filters in cases:
+            for function in (analytics.league_value_trends, analytics.value_distribution):
+                self.assertEqual(self._query(function, 'parquet', **filters), self._query(function, 'sqlite', **filters))
+
+        # Rewriting one season picks up its new rows and leaves the others alone
+        conn.execute("INSERT INTO player_valuations (player_id, date, market_value_in_eur, "
+                     "player_club_domestic_competition_id) VALUES (5, '2024-09-01', 7000000, 'GB1');")
+        conn.commit()
+        season_2022 = os.listdir(os.path.join(analytics.snapshot_path(self.snapshot_dir), 'season=2022'))
+        with redirect_stdout(StringIO()), unittest.mock.patch.object(analytics.shutil, 'rmtree',
+                                                                     wraps=shutil.rmtree) as rmtree:
+            self.assertTrue(analytics.write_valuations_snapshot(conn, self.snapshot_dir, seasons={2024}))
+        conn.close()
+        # The replaced partition is deleted only after it has been moved out of the live snapshot
+        live = analytics.snapshot_path(self.snapshot_dir) + os.sep
+        self.assertFalse([call for call in rmtree.call_args_list if call.args[0].startswith(live)])
+        self.assertEqual(os.listdir(os.path.join(analytics.snapshot_path(self.snapshot_dir), 'season=2022')), season_2022)
+        self.assertEqual(self._query(analytics.league_value_trends, None),
+                         self._query(analytics.league_value_trends, 'sqlite'))
+
+    @unittest.skipUnless(analytics.PYARROW_AVAILABLE, "pyarrow is not installed")
+    def test_full_rewrite_survives_leftover_old_snapshot(self):
+        conn = sqlite3.connect(self.db_path)
+        with redirect_stdout(StringIO()):
+            self.assertTrue(analytics.write_valuations_snapshot(conn, self.snapshot_dir))
+            # As if a previous full rewrite crashed between its two renames
+            leftover = analytics.snapshot_path(self.snapshot_dir) + ".old"
+            os.makedirs(os.path.join(leftover, 'season=1999'))
+            self.assertTrue(analytics.write_valuations_snapshot(conn, self.snapshot_dir))
+        conn.close()
+        self.assertFalse(os.path.exists(leftover))
+        self.assertEqual(sorted(os.listdir(analytics.snapshot_path(self.snapshot_dir))),
+                         ['season=2022', 'season=2023', 'season=2024'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,19 @@
 import unittest
 from unittest.mock import patch, MagicMock
+import os
+import tempfile
+import threading
+import time
 import requests # Import requests for requests.exceptions.RequestException
 # Assuming transfermarkt_scraper.py is in the same directory or accessible in PYTHONPATH
-from transfermarkt_scraper import get_top_league_players_by_value, LEAGUES
+import transfermarkt_scraper
+from transfermarkt_scraper import (
+    get_top_league_players_by_value, get_market_value_int, make_request_with_retry, scrape_leagues,
+    select_top_players, CsvPlayerSink, LEAGUES, RateLimiter,
+)
+from club_manifest import ClubManifest
+from mock_transfermarkt_server import MockTransfermarktServer, build_fixtures
+from response_cache import ResponseCache
 
 # Minimal player data needed for the function to run without error
 MINIMAL_PLAYER_DATA = {
@@ -15,6 +26,9 @@ MINIMAL_PLAYER_DATA = {
 
 class TestPlayerFetching(unittest.TestCase):
 
+    def setUp(self):
+        transfermarkt_scraper.reset_circuit_breakers() # Breaker state is process-wide; start each test closed
+
     def _setup_mock_get(self, mock_get, club_response_data, player_response_data):
         """Helper to configure mock for requests.get for simple success cases."""
         mock_club_response = MagicMock()
@@ -212,6 +226,438 @@ class TestPlayerFetching(unittest.TestCase):
         mock_get.assert_any_call(self.default_clubs_url, headers=unittest.mock.ANY, timeout=unittest.mock.ANY)
         mock_get.assert_any_call(self.default_players_url, headers=unittest.mock.ANY, timeout=unittest.mock.ANY)
 
+    @patch('transfermarkt_scraper.requests.get')
+    def test_concurrent_club_fetching_preserves_club_order(self, mock_get):
+        clubs = {'clubs': [{'id': str(i), 'name': f'Club {i}'} for i in range(1, 5)]}
+        mock_club_response = MagicMock()
+        mock_club_response.json.return_value = clubs
+        mock_club_response.status_code = 200
+
+        def custom_side_effect(url, headers, timeout):
+            if url == self.default_clubs_url:
+                return mock_club_response
+            club_id = int(url.split('/clubs/')[1].split('/')[0])
+            time.sleep(0.05 * (5 - club_id)) # Earlier clubs answer last
+            mock_player_response = MagicMock()
+            mock_player_response.json.return_value = {'players': [
+                {**MINIMAL_PLAYER_DATA, 'id': str(club_id), 'name': f'Player {club_id}'}
+            ]}
+            mock_player_response.status_code = 200
+            return mock_player_response
+
+        mock_get.side_effect = custom_side_effect
+
+        result = get_top_league_players_by_value('Test League', 'TL1', num_players=10, max_workers=4)
+
+        # Equal market values keep their club order, exactly as in a sequential run
+        self.assertEqual([p['Name'] for p in result], ['Player 1', 'Player 2', 'Player 3', 'Player 4'])
+        self.assertEqual([p['Team'] for p in result], ['Club 1', 'Club 2', 'Club 3', 'Club 4'])
+        self.assertEqual(mock_get.call_count, 1 + 4)
+
+    def test_rate_limiter_spaces_requests(self):
+        limiter = RateLimiter(requests_per_second=20) # 50ms between request starts
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+        # First acquire is immediate, the remaining four wait one interval each
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+
+class TestRetryPolicy(unittest.TestCase):
+    url = "https://transfermarkt-api.fly.dev/clubs/123/players"
+
+    def setUp(self):
+        transfermarkt_scraper.reset_circuit_breakers()
+
+    def tearDown(self):
+        transfermarkt_scraper.reset_circuit_breakers()
+        transfermarkt_scraper.configure_request_budget() # Undo any 429 slow-down
+
+    def _error_response(self, status_code, headers=None):
+        response = requests.Response()
+        response.status_code = status_code
+        response.url = self.url
+        response.headers.update(headers or {})
+        return response
+
+    @patch('transfermarkt_scraper.time.sleep')
+    @patch('transfermarkt_scraper.requests.get')
+    def test_non_retryable_status_is_not_retried(self, mock_get, mock_sleep):
+        mock_get.return_value = self._error_response(404)
+
+        with self.assertRaises(requests.exceptions.HTTPError):
+            make_request_with_retry(self.url, headers={}, timeout=1)
+
+        self.assertEqual(mock_get.call_count, 1)
+        mock_sleep.assert_not_called()
+
+    @patch('transfermarkt_scraper.time.sleep')
+    @patch('transfermarkt_scraper.requests.get')
+    def test_429_honours_retry_after_and_slows_rate_limiter(self, mock_get, mock_sleep):
+        ok_response = self._error_response(200)
+        ok_response._content = b'{"players": []}'
+        mock_get.side_effect = [self._error_response(429, {'Retry-After': '7'}), ok_response]
+        limiter = transfermarkt_scraper.RateLimiter(requests_per_second=1000)
+        # acquire() is stubbed so the test does not wait out the pause it is checking for
+        with patch('transfermarkt_scraper._rate_limiter', limiter), patch.object(limiter, 'acquire'):
+            response = make_request_with_retry(self.url, headers={}, timeout=1)
+
+        self.assertEqual(response.json(), {'players': []})
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertGreaterEqual(mock_sleep.call_args_list[0].args[0], 7) # Backoff is at least Retry-After
+        self.assertLess(limiter.rate, 1000)
+        self.assertGreater(limiter._paused_until, time.monotonic() + 5) # The whole bucket is paused
+
+    def test_retry_after_parsing(self):
+        self.assertEqual(transfermarkt_scraper._parse_retry_after('12'), 12.0)
+        self.assertIsNone(transfermarkt_scraper._parse_retry_after(None))
+        self.assertIsNone(transfermarkt_scraper._parse_retry_after('soon'))
+        self.assertEqual(transfermarkt_scraper._parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+        cap = transfermarkt_scraper.RETRY_DELAY_CAP
+        self.assertEqual(transfermarkt_scraper._parse_retry_after('86400'), cap)
+        self.assertEqual(transfermarkt_scraper._parse_retry_after('inf'), cap)
+        self.assertEqual(transfermarkt_scraper._parse_retry_after('Fri, 31 Dec 9999 23:59:59 GMT'), cap)
+        self.assertIsNone(transfermarkt_scraper._parse_retry_after('nan'))
+
+    @patch('transfermarkt_scraper.time.sleep')
+    @patch('transfermarkt_scraper.requests.get')
+    def test_oversized_retry_after_is_capped(self, mock_get, mock_sleep):
+        ok_response = self._error_response(200)
+        ok_response._content = b'{"players": []}'
+        mock_get.side_effect = [self._error_response(429, {'Retry-After': 'inf'}),
+                                self._error_response(503, {'Retry-After': '86400'}), ok_response]
+        limiter = transfermarkt_scraper.RateLimiter(requests_per_second=1000)
+        with patch('transfermarkt_scraper._rate_limiter', limiter), patch.object(limiter, 'acquire'):
+            make_request_with_retry(self.url, headers={}, timeout=1)
+
+        cap = transfermarkt_scraper.RETRY_DELAY_CAP
+        self.assertEqual([c.args[0] for c in mock_sleep.call_args_list], [cap, cap])
+        self.assertLessEqual(limiter._paused_until, time.monotonic() + cap)
+
+    @patch('transfermarkt_scraper.time.sleep')
+    @patch('transfermarkt_scraper.requests.get')
+    def test_circuit_breaker_opens_per_endpoint(self, mock_get, mock_sleep):
+        mock_get.side_effect = requests.exceptions.ConnectionError("down")
+        threshold = transfermarkt_scraper.CIRCUIT_FAILURE_THRESHOLD
+
+        with patch('transfermarkt_scraper._rate_limiter', transfermarkt_scraper.RateLimiter(0)):
+            for _ in range(threshold):
+                with self.assertRaises(requests.exceptions.ConnectionError):
+                    make_request_with_retry(self.url, headers={}, timeout=1, retries=1)
+            with self.assertRaises(transfermarkt_scraper.CircuitOpenError):
+                make_request_with_retry("https://transfermarkt-api.fly.dev/clubs/456/players", headers={}, timeout=1)
+
+        self.assertEqual(mock_get.call_count, threshold)
+        # Other endpoint classes are unaffected
+        self.assertTrue(transfermarkt_scraper.get_circuit_breaker("https://transfermarkt-api.fly.dev/competitions/GB1/clubs").allow_request())
+
+
+class TestAgainstMockServer(unittest.TestCase):
+    """End-to-end: real HTTP through the pooled session against the local mock API."""
+
+    def setUp(self):
+        transfermarkt_scraper.reset_circuit_breakers()
+        transfermarkt_scraper.configure_request_budget(max_concurrent_requests=4, requests_per_second=0)
+        fixtures = build_fixtures(['TL1'], clubs_per_league=3, players_per_club=5)
+        # Every third request is answered with a 429
+        self.server = MockTransfermarktServer(fixtures=fixtures, burst_every=2, burst_length=1, retry_after=0).start()
+
+    def tearDown(self):
+        self.server.stop()
+        transfermarkt_scraper.configure_request_budget()
+        transfermarkt_scraper.reset_circuit_breakers()
+
+    @patch('transfermarkt_scraper.time.sleep') # Skip backoff sleeps
+    def test_league_is_scraped_completely_despite_429_bursts(self, _mock_sleep):
+        with patch('transfermarkt_scraper.API_BASE_URL', self.server.base_url):
+            result = get_top_league_players_by_value('Test League', 'TL1', num_players=5)
+
+        all_players = [p for roster in self.server.rosters.values() for p in roster]
+        expected = sorted(all_players, key=lambda p: get_market_value_int(p) if get_market_value_int(p) is not None else float('-inf'), reverse=True)[:5]
+        self.assertEqual([p['player_id'] for p in result], [p['id'] for p in expected])
+        self.assertGreater(self.server.status_counts.get(429, 0), 0)
+        self.assertEqual(self.server.status_counts[200], 1 + 3) # Club list + three rosters
+
+    def test_serve_forever_blocks_until_stopped(self):
+        server = MockTransfermarktServer(fixtures=build_fixtures(['TL1'], clubs_per_league=1, players_per_club=1))
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            response = requests.get(f"{server.base_url}/competitions/TL1/clubs", timeout=5)
+            self.assertEqual(response.status_code, 200)
+        finally:
+            server.stop()
+            thread.join(timeout=5)
+        self.assertFalse(thread.is_alive())
+
+
+class TestPooledHttpSession(unittest.TestCase):
+    """http_get through the shared session: keep-alive reuse, compression, and the requests.get patch hook."""
+
+    def setUp(self):
+        transfermarkt_scraper.configure_http_session() # Fresh session, so the first request opens a connection
+        fixtures = build_fixtures(['TL1'], clubs_per_league=3, players_per_club=5)
+        self.server = MockTransfermarktServer(fixtures=fixtures, gzip_responses=True).start()
+        self.clubs_url = f"{self.server.base_url}/competitions/TL1/clubs"
+
+    def tearDown(self):
+        self.server.stop()
+        transfermarkt_scraper.configure_http_session()
+
+    def test_keep_alive_connections_are_reused(self):
+        before = transfermarkt_scraper.get_connection_stats()
+        for _ in range(5):
+            response = transfermarkt_scraper.http_get(self.clubs_url, headers=transfermarkt_scraper.HEADERS, timeout=5)
+            self.assertEqual(response.status_code, 200)
+        after = transfermarkt_scraper.get_connection_stats()
+        self.assertEqual(after['requests'] - before['requests'], 5)
+        self.assertEqual(after['new_connections'] - before['new_connections'], 1)
+        self.assertGreater(after['reused_connections'] - before['reused_connections'], 0)
+
+    def test_gzip_is_negotiated_and_decoded(self):
+        response = transfermarkt_scraper.http_get(self.clubs_url, headers=transfermarkt_scraper.HEADERS, timeout=5)
+        self.assertIn('gzip', self.server.last_request_headers.get('Accept-Encoding', ''))
+        self.assertEqual(response.headers.get('Content-Encoding'), 'gzip')
+        self.assertEqual(response.json(), self.server.competitions['TL1'])
+
+    def test_compression_can_be_disabled(self):
+        transfermarkt_scraper.configure_http_session(enable_compression=False)
+        response = transfermarkt_scraper.http_get(self.clubs_url, headers=transfermarkt_scraper.HEADERS, timeout=5)
+        self.assertEqual(self.server.last_request_headers.get('Accept-Encoding'), 'identity')
+        self.assertIsNone(response.headers.get('Content-Encoding'))
+        self.assertEqual(response.json(), self.server.competitions['TL1'])
+
+    @patch('transfermarkt_scraper.requests.get')
+    def test_patched_requests_get_is_still_honoured(self, mock_get):
+        mock_get.return_value = MagicMock(status_code=200)
+        response = transfermarkt_scraper.http_get(self.clubs_url, headers=transfermarkt_scraper.HEADERS, timeout=5)
+        self.assertIs(response, mock_get.return_value)
+        mock_get.assert_called_once_with(self.clubs_url, headers=transfermarkt_scraper.HEADERS, timeout=5)
+        self.assertEqual(self.server.request_count, 0)
+
+
+class TestTopPlayerSelection(unittest.TestCase):
+
+    def test_matches_full_sort_including_ties_and_missing_values(self):
+        values = [5, None, 3, 'bad', 5, 0, None, 7, 3, 5]
+        players = [{'id': str(i), 'marketValue': v} for i, v in enumerate(values)]
+        expected = sorted(players, key=lambda p: get_market_value_int(p) if get_market_value_int(p) is not None else float('-inf'), reverse=True)
+
+        for num_players in (0, 1, 3, 4, 8, len(players), len(players) + 5):
+            selected = select_top_players(iter(players), num_players)
+            self.assertEqual([p['id'] for _, p in selected], [p['id'] for p in expected[:num_players]])
+            self.assertEqual([v for v, _ in selected], [get_market_value_int(p) for p in expected[:num_players]])
+
+
+class TestLeagueOrchestration(unittest.TestCase):
+
+    @patch('transfermarkt_scraper.get_top_league_players_by_value')
+    def test_scrape_leagues_merges_in_league_order(self, mock_fetch):
+        def fake_fetch(league_name, league_code, num_players):
+            time.sleep(0.1 if league_code == 'L1' else 0.0) # First league finishes last
+            return [{'League': league_name, 'Name': f'{league_code} player'}]
+
+        mock_fetch.side_effect = fake_fetch
+        leagues = {'League One': 'L1', 'League Two': 'L2', 'League Three': 'L3'}
+
+        players, durations = scrape_leagues(leagues, num_players=1, max_parallel_leagues=3)
+
+        self.assertEqual([p['League'] for p in players], ['League One', 'League Two', 'League Three'])
+        self.assertEqual(list(durations), ['League One', 'League Two', 'League Three'])
+        self.assertGreaterEqual(durations['League One'], 0.1)
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(os.path.join(self.tmp_dir.name, 'cache.db'))
+        transfermarkt_scraper.configure_response_cache(self.cache)
+
+    def tearDown(self):
+        transfermarkt_scraper.configure_response_cache(None)
+        self.cache.close()
+        self.tmp_dir.cleanup()
+
+    def _make_response(self, status_code, body=b'', headers=None):
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = body
+        response.headers.update(headers or {})
+        return response
+
+    @patch('transfermarkt_scraper.requests.get')
+    def test_fresh_entry_is_served_without_network(self, mock_get):
+        mock_get.return_value = self._make_response(200, b'{"clubs": []}')
+        url = "https://transfermarkt-api.fly.dev/competitions/TL1/clubs"
+
+        first = make_request_with_retry(url, headers={}, timeout=1)
+        second = make_request_with_retry(url, headers={}, timeout=1)
+
+        self.assertEqual(first.json(), {'clubs': []})
+        self.assertEqual(second.json(), {'clubs': []})
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+    @patch('transfermarkt_scraper.requests.get')
+    def test_stale_entry_is_revalidated_with_etag(self, mock_get):
+        url = "https://transfermarkt-api.fly.dev/clubs/123/players"
+        mock_get.return_value = self._make_response(200, b'{"players": []}', {'ETag': '"v1"'})
+        make_request_with_retry(url, headers={}, timeout=1)
+
+        self.cache.default_ttl = 0
+        self.cache.endpoint_ttls = [] # Everything is stale now
+        mock_get.return_value = self._make_response(304)
+        response = make_request_with_retry(url, headers={}, timeout=1)
+
+        self.assertEqual(response.json(), {'players': []})
+        _, kwargs = mock_get.call_args
+        self.assertEqual(kwargs['headers']['If-None-Match'], '"v1"')
+        self.assertEqual(self.cache.stats()['revalidated'], 1)
+
+    @patch('transfermarkt_scraper.requests.get')
+    def test_offline_mode_replays_and_fails_fast_on_miss(self, mock_get):
+        url = "https://transfermarkt-api.fly.dev/clubs/123/players"
+        mock_get.return_value = self._make_response(200, b'{"players": []}')
+        make_request_with_retry(url, headers={}, timeout=1)
+
+        self.cache.offline = True
+        self.assertEqual(make_request_with_retry(url, headers={}, timeout=1).json(), {'players': []})
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            make_request_with_retry("https://transfermarkt-api.fly.dev/clubs/999/players", headers={}, timeout=1)
+        self.assertEqual(mock_get.call_count, 1)
+
+    def test_lru_eviction_keeps_cache_under_size_bound(self):
+        self.cache.max_bytes = 25
+        for i in range(3):
+            self.cache.store(f"https://example.test/clubs/{i}/players", self._make_response(200, b'x' * 10))
+            time.sleep(0.01)
+
+        stats = self.cache.stats()
+        self.assertEqual(stats['entries'], 2)
+        self.assertIsNone(self.cache.lookup("https://example.test/clubs/0/players"))
+
+
+class TestIncrementalScraping(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.manifest_path = os.path.join(self.tmp_dir.name, 'manifest.json')
+
+    def tearDown(self):
+        transfermarkt_scraper.configure_club_manifest(None)
+        self.tmp_dir.cleanup()
+
+    def _mock_responses(self, mock_get):
+        mock_club_response = MagicMock()
+        mock_club_response.json.return_value = {'clubs': [{'id': '123', 'name': 'Test Club'}]}
+
+        def custom_side_effect(url, headers, timeout):
+            if '/clubs/' not in url:
+                return mock_club_response
+            mock_player_response = MagicMock() # Fresh dicts per call, like a real API response
+            mock_player_response.json.return_value = {'players': [{**MINIMAL_PLAYER_DATA, 'name': 'Player A'}]}
+            return mock_player_response
+        mock_get.side_effect = custom_side_effect
+
+    @patch('transfermarkt_scraper.requests.get')
+    def test_fresh_clubs_are_reused_from_manifest(self, mock_get):
+        self._mock_responses(mock_get)
+        first_manifest = ClubManifest(self.manifest_path)
+        transfermarkt_scraper.configure_club_manifest(first_manifest)
+        first = get_top_league_players_by_value('Test League', 'TL1', num_players=5)
+        first_manifest.save()
+        self.assertEqual(first_manifest.stats(), {'reused': 0, 'refetched': 1, 'changed': 1, 'unchanged': 0})
+
+        mock_get.reset_mock()
+        second_manifest = ClubManifest(self.manifest_path)
+        transfermarkt_scraper.configure_club_manifest(second_manifest)
+        second = get_top_league_players_by_value('Test League', 'TL1', num_players=5)
+
+        self.assertEqual(second, first)
+        self.assertEqual(second_manifest.stats()['reused'], 1)
+        # Only the club list was requested; the roster came from the manifest
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch('transfermarkt_scraper.requests.get')
+    def test_stale_clubs_are_refetched_and_hash_compared(self, mock_get):
+        self._mock_responses(mock_get)
+        manifest = ClubManifest(self.manifest_path, refresh_interval_hours=0)
+        transfermarkt_scraper.configure_club_manifest(manifest)
+
+        get_top_league_players_by_value('Test League', 'TL1', num_players=5)
+        get_top_league_players_by_value('Test League', 'TL1', num_players=5)
+
+        self.assertEqual(manifest.stats(), {'reused': 0, 'refetched': 2, 'changed': 1, 'unchanged': 1})
+
+    def test_unreadable_manifest_starts_empty(self):
+        for content in ('{not json', '[1, 2]', '42', '{"clubs": []}'):
+            with open(self.manifest_path, 'w') as f:
+                f.write(content)
+            with patch('builtins.print'):
+                manifest = ClubManifest(self.manifest_path)
+            self.assertIsNone(manifest.get_fresh_roster('123'), content)
+            self.assertEqual(manifest.stats()['reused'], 0)
+
+
+class TestCsvPlayerSink(unittest.TestCase):
+
+    def test_streamed_batches_match_pandas_to_csv(self):
+        import pandas as pd
+        rows = [
+            {'player_id': '1', 'League': 'League One', 'Name': 'Player "A", Jr', 'Position': 'Forward',
+             'Team': 'Club 1', 'Age': 24, 'Market Value': '€200,000,000', 'Market Value Int': 200000000},
+            {'player_id': '2', 'League': 'League Two', 'Name': 'Kylian Mbappé', 'Position': 'Winger',
+             'Team': 'Club 2', 'Age': 26, 'Market Value': '€180,000,000', 'Market Value Int': 180000000},
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            expected_path = os.path.join(tmp_dir, 'expected.csv')
+            streamed_path = os.path.join(tmp_dir, 'streamed.csv')
+            pd.DataFrame(rows).to_csv(expected_path, index=False, encoding='utf-8')
+
+            sink = CsvPlayerSink(streamed_path)
+            self.assertEqual(sink.write_rows(iter(rows[:1])), 1) # One league per batch
+            self.assertEqual(sink.write_rows(iter(rows[1:])), 1)
+            sink.close()
+
+            with open(expected_path, 'rb') as expected, open(streamed_path, 'rb') as streamed:
+                self.assertEqual(streamed.read(), expected.read())
+
+    def test_missing_values_keep_integer_formatting(self):
+        # The old whole-file to_csv upcast a column to float as soon as any row lacked a value
+        # (24.0); rows are now streamed before later rows are known, so integers stay integers
+        import pandas as pd
+        rows = [
+            {'player_id': '1', 'League': 'League One', 'Name': 'Player A', 'Position': 'Forward',
+             'Team': 'Club 1', 'Age': 24, 'Market Value': '€1,000,000', 'Market Value Int': 1},
+            {'player_id': '2', 'League': 'League One', 'Name': 'Player B', 'Position': None,
+             'Team': 'Club 1', 'Age': None, 'Market Value': 'N/A', 'Market Value Int': None},
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            expected_path = os.path.join(tmp_dir, 'expected.csv')
+            streamed_path = os.path.join(tmp_dir, 'streamed.csv')
+            frame = pd.DataFrame(rows).astype({'Age': 'Int64', 'Market Value Int': 'Int64'})
+            frame.to_csv(expected_path, index=False, encoding='utf-8')
+
+            sink = CsvPlayerSink(streamed_path)
+            sink.write_rows(iter(rows))
+            sink.close()
+
+            with open(expected_path, 'rb') as expected, open(streamed_path, 'rb') as streamed:
+                streamed_bytes = streamed.read()
+                self.assertEqual(streamed_bytes, expected.read())
+            lines = streamed_bytes.decode('utf-8').splitlines()
+            self.assertEqual(lines[1:], ['1,League One,Player A,Forward,Club 1,24,"€1,000,000",1',
+                                         '2,League One,Player B,,Club 1,,N/A,'])
+
+    def test_no_file_is_created_without_rows(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'empty.csv')
+            sink = CsvPlayerSink(path)
+            sink.write_rows([])
+            sink.close()
+            self.assertFalse(os.path.exists(path))
+
 
 if __name__ == '__main__':
     unittest.main(argv=['first-arg-is-ignored'], exit=False)
@@ -0,0 +1,77 @@
+"""
+Downsampling helpers for valuation histories served by api.py.
+
+Both functions take rows shaped like the valuations query returns them ({'date': 'YYYY-MM-DD...',
+'market_value_in_eur': int}), sorted by date, and return a subset of those same rows, so every
+point a chart draws is a real valuation.
+"""
+from datetime import date
+
+BUCKET_PERIODS = ('month', 'quarter', 'year')
+
+
+def _day_number(value):
+    return date.fromisoformat(str(value)[:10]).toordinal()
+
+
+def _period_key(value, period):
+    year, month = int(str(value)[:4]), int(str(value)[5:7])
+    if period == 'month':
+        return year, month
+    if period == 'quarter':
+        return year, (month - 1) // 3
+    return year
+
+
+def bucket_last(rows, period):
+    """Keeps the last valuation in each calendar month/quarter/year (market values are step functions)."""
+    if period not in BUCKET_PERIODS:
+        raise ValueError(f"Unknown bucket period {period!r}; choose from {list(BUCKET_PERIODS)}")
+    kept = []
+    last_key = None
+    for row in rows:
+        key = _period_key(row['date'], period)
+        if kept and key == last_key:
+            kept[-1] = row
+        else:
+            kept.append(row)
+        last_key = key
+    return kept
+
+
+def lttb(rows, threshold, value_key='market_value_in_eur'):
+    """
+    Largest-Triangle-Three-Buckets: picks `threshold` rows that preserve the visual shape of the
+    series (peaks and drops survive, flat stretches are thinned). The first and last rows are always
+    kept. Rows without a value can't be placed on the chart and are dropped.
+    """
+    points = [row for row in rows if row.get(value_key) is not None and row.get('date')]
+    if threshold >= len(points):
+        return points
+    if threshold < 3:
+        return [points[0], points[-1]]
+
+    xs = [_day_number(row['date']) for row in points]
+    ys = [row[value_key] for row in points]
+    sampled = [points[0]]
+    every = (len(points) - 2) / (threshold - 2) # Interior points per bucket
+    a = 0 # Index of the previously selected point
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, len(points))
+        avg_x = sum(xs[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(ys[next_start:next_end]) / (next_end - next_start)
+
+        # Pick the point in this bucket forming the largest triangle with a and the average
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((xs[a] - avg_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (avg_y - ys[a]))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+    sampled.append(points[-1])
+    return sampled
@@ -2,21 +2,59 @@ import requests
 # Remove BeautifulSoup import
 # from bs4 import BeautifulSoup
 import pandas as pd
+import argparse
+import csv
+import heapq
+import os
+import random
+import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from email.utils import parsedate_to_datetime
+from operator import attrgetter
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from club_manifest import ClubManifest, CLUB_REFRESH_INTERVAL_HOURS, DEFAULT_MANIFEST_FILE
+from response_cache import ResponseCache, DEFAULT_CACHE_FILE
+
+# Brotli is optional: urllib3 can only decode 'br' responses when one of these packages is installed
+try:
+    import brotli  # noqa: F401
+    BROTLI_AVAILABLE = True
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        BROTLI_AVAILABLE = True
+    except ImportError:
+        BROTLI_AVAILABLE = False
 
 # --- Global Constants ---
-API_BASE_URL = "https://transfermarkt-api.fly.dev"
+API_BASE_URL = os.environ.get("TRANSFERMARKT_API_BASE_URL", "https://transfermarkt-api.fly.dev") # Override e.g. for the local mock server
 USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.127 Safari/537.36'
 HEADERS = {'User-Agent': USER_AGENT}
 
-CLUB_REQUEST_DELAY = 0.6  # Seconds to wait between requests for players of different clubs
-LEAGUE_REQUEST_DELAY = 2.0  # Seconds to wait between processing different leagues
+MAX_CONCURRENT_REQUESTS = 4  # Maximum number of HTTP requests in flight at once (shared by all threads)
+MAX_REQUESTS_PER_SECOND = 2.0  # Global rate limit for requests to API_BASE_URL (replaces the old per-club sleep)
+MAX_PARALLEL_LEAGUES = 5  # Leagues processed at once; all share the request budget above
+HTTP_POOL_SIZE = MAX_CONCURRENT_REQUESTS  # Keep-alive connections kept open per host by the shared session
+ENABLE_COMPRESSION = True  # Negotiate gzip (and brotli when available) for API responses
 REQUEST_TIMEOUT_CLUBS = 30  # Seconds before timeout for club-related requests
 REQUEST_TIMEOUT_PLAYERS = 45 # Seconds before timeout for player-list requests
 
 MAX_RETRIES = 3
-RETRY_DELAY_BASE = 1 # Base seconds for retry backoff (multiplied by attempt number)
+RETRY_DELAY_BASE = 1 # Base seconds for retry backoff (decorrelated jitter starts here)
+RETRY_DELAY_CAP = 30 # Upper bound in seconds for a single backoff sleep
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504} # Any other 4xx/5xx fails without retrying
+
+MIN_REQUESTS_PER_SECOND = 0.2 # Floor for the adaptive rate limiter after repeated 429/503 responses
+RATE_RECOVERY_STEP = 0.1 # Requests/second added back to the rate limit after each success
+
+CIRCUIT_FAILURE_THRESHOLD = 8 # Consecutive retryable failures before an endpoint's circuit opens
+CIRCUIT_RESET_TIMEOUT = 60 # Seconds an open circuit fails fast before letting a request through
 
 
 # Update LEAGUES to use API league codes
@@ -51,6 +89,72 @@ def get_market_value_int(player):
     except (ValueError, TypeError):
         return None
 
+def select_top_players(players, num_players, value_key=get_market_value_int):
+    """
+    Streaming top-N selection by market value.
+    Reads each player's market value once via value_key (raw API dicts by default, pass
+    operator.attrgetter('market_value') for PlayerRecords) and keeps at most num_players entries
+    in a min-heap, so memory is O(num_players) for any iterable of players.
+    Ordering is identical to sorting by value descending and slicing: ties keep their input order
+    and players with a missing/invalid value come last.
+    Returns a list of (market_value_int_or_None, player) tuples.
+    """
+    if num_players <= 0:
+        return []
+    heap = []
+    for index, player in enumerate(players):
+        value = value_key(player)
+        # (sort value, -index) is unique per player, so comparisons never reach the player dict.
+        # A larger -index means an earlier player, which wins ties just like a stable sort.
+        entry = (value if value is not None else float('-inf'), -index, value, player)
+        if len(heap) < num_players:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+    heap.sort(reverse=True)
+    return [(value, player) for _, _, value, player in heap]
+
+class PlayerRecord:
+    """
+    Compact, normalized player built once at extraction time from a raw API player dict.
+    __slots__ drops the per-instance __dict__, the market value is parsed up front, and the
+    club name / position strings are shared between all players that have the same value.
+    """
+    __slots__ = ('player_id', 'name', 'position', 'club_name', 'date_of_birth', 'market_value')
+
+    def __init__(self, player_id, name, position, club_name, date_of_birth, market_value):
+        self.player_id = player_id
+        self.name = name
+        self.position = position
+        self.club_name = club_name
+        self.date_of_birth = date_of_birth
+        self.market_value = market_value
+
+    @classmethod
+    def from_api(cls, player: dict, club_name: str):
+        position = player.get('position', 'N/A')
+        return cls(
+            player.get('id'), # *** CONFIRM THIS KEY ('id', 'playerID', etc.) ***
+            player.get('name', 'N/A'),
+            sys.intern(position) if isinstance(position, str) else position,
+            club_name,
+            player.get('dateOfBirth'),
+            get_market_value_int(player),
+        )
+
+    def to_output_row(self, league_name: str):
+        """Returns the output dict written to the CSV (and returned by get_top_league_players_by_value)."""
+        return {
+            'player_id': self.player_id,
+            'League': league_name,
+            'Name': self.name,
+            'Position': self.position,
+            'Team': self.club_name,
+            'Age': calculate_age(self.date_of_birth),
+            'Market Value': format_market_value(self.market_value),
+            'Market Value Int': self.market_value # Also save the integer value for easier sorting in API
+        }
+
 def format_market_value(value_int):
     """Formats integer market value (or 0) to string '€XXX,XXX'. Returns 'N/A' if value_int is None."""
     if value_int is None:
@@ -58,35 +162,355 @@ def format_market_value(value_int):
     # Assuming Euro as default currency based on Transfermarkt standard
     return f"€{value_int:,}"
 
+# --- Request Budget (Concurrency + Rate Limit) ---
+class RateLimiter:
+    """
+    Thread-safe, adaptive token bucket shared by every scraper request.
+    Tokens refill at `rate` per second up to `burst`; acquire() takes one token, waiting if needed.
+    A 429/503 halves the rate (down to min_rate) and, with a Retry-After, pauses the whole bucket
+    until that time. Every success adds `recovery_step` back, up to the configured rate.
+    A rate <= 0 disables limiting.
+    """
+    def __init__(self, requests_per_second: float, burst: float = 1.0, min_rate: float = None, recovery_step: float = None):
+        self.max_rate = requests_per_second
+        self.rate = requests_per_second
+        self.burst = max(1.0, burst)
+        self.min_rate = min_rate if min_rate is not None else MIN_REQUESTS_PER_SECOND
+        self.recovery_step = recovery_step if recovery_step is not None else RATE_RECOVERY_STEP
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until the caller is allowed to start its next request."""
+        if self.max_rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                else:
+                    wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def on_throttle(self, retry_after: float | None = None):
+        """Called on 429/503: back off multiplicatively and honour the server's Retry-After."""
+        if self.max_rate <= 0:
+            return
+        with self._lock:
+            self.rate = max(min(self.min_rate, self.max_rate), self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def on_success(self):
+        """Called after a successful request: recover the rate additively."""
+        if self.max_rate <= 0 or self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.recovery_step)
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of sending a request while an endpoint's circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker. After failure_threshold consecutive retryable failures the circuit
+    opens and requests fail fast for reset_timeout seconds; then it lets requests through again
+    (half-open) and the next outcome either closes it or re-opens it.
+    """
+    def __init__(self, endpoint: str, failure_threshold: int = None, reset_timeout: float = None):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold if failure_threshold is not None else CIRCUIT_FAILURE_THRESHOLD
+        self.reset_timeout = reset_timeout if reset_timeout is not None else CIRCUIT_RESET_TIMEOUT
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == 'open':
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = 'half_open'
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.consecutive_failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == 'half_open' or self.consecutive_failures >= self.failure_threshold:
+                if self.state != 'open':
+                    print(f"Circuit breaker opened for endpoint {self.endpoint} after {self.consecutive_failures} consecutive failures.")
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+
+
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+def _endpoint_key(url: str):
+    """Groups URLs by endpoint class, e.g. /clubs/123/players -> /clubs/{id}/players."""
+    segments = urlsplit(url).path.strip('/').split('/')
+    return '/' + '/'.join('{id}' if index % 2 == 1 else segment for index, segment in enumerate(segments))
+
+def get_circuit_breaker(url: str):
+    """Returns the shared CircuitBreaker for the endpoint class of url."""
+    key = _endpoint_key(url)
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(key)
+        if breaker is None:
+            breaker = _circuit_breakers[key] = CircuitBreaker(key)
+        return breaker
+
+def reset_circuit_breakers():
+    """Forgets all breaker state (closes every circuit)."""
+    with _circuit_breakers_lock:
+        _circuit_breakers.clear()
+
+
+_rate_limiter = RateLimiter(MAX_REQUESTS_PER_SECOND)
+_request_slots = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+
+def configure_request_budget(max_concurrent_requests: int = MAX_CONCURRENT_REQUESTS, requests_per_second: float = MAX_REQUESTS_PER_SECOND):
+    """Replaces the shared in-flight limit and rate limit. Call before starting any fetches."""
+    global _rate_limiter, _request_slots
+    _rate_limiter = RateLimiter(requests_per_second)
+    _request_slots = threading.BoundedSemaphore(max(1, max_concurrent_requests))
+
+def _throttled_get(url: str, headers: dict, timeout: int):
+    """Issues a single GET once both the rate limiter and an in-flight slot allow it."""
+    _rate_limiter.acquire()
+    with _request_slots:
+        return http_get(url, headers=headers, timeout=timeout)
+
+# --- Shared HTTP Session (Connection Pooling + Keep-Alive) ---
+class ConnectionStats:
+    """Thread-safe counters for requests sent and connections opened by the shared session."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_new_connection(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def snapshot(self):
+        """Returns the counters as a dict. Every request that did not open a connection reused one."""
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'new_connections': self.new_connections,
+                'reused_connections': max(0, self.requests - self.new_connections),
+            }
+
+
+_connection_stats = ConnectionStats()
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _connection_stats.record_new_connection()
+        return super()._new_conn()
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _connection_stats.record_new_connection()
+        return super()._new_conn()
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools report new connections to the shared ConnectionStats."""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, **kwargs):
+        _connection_stats.record_request()
+        return super().send(request, **kwargs)
+
+
+_session = None
+_session_lock = threading.Lock()
+_session_pool_size = HTTP_POOL_SIZE
+_session_compression = ENABLE_COMPRESSION
+# Captured at import so http_get can tell when requests.get has been replaced (e.g. patched in tests)
+_DEFAULT_REQUESTS_GET = requests.get
+
+def _build_session(pool_size: int, enable_compression: bool):
+    session = requests.Session()
+    adapter = PooledHTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if enable_compression:
+        session.headers['Accept-Encoding'] = 'gzip, deflate, br' if BROTLI_AVAILABLE else 'gzip, deflate'
+    else:
+        session.headers['Accept-Encoding'] = 'identity'
+    return session
+
+def get_session():
+    """Returns the process-wide requests.Session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session(_session_pool_size, _session_compression)
+    return _session
+
+def configure_http_session(pool_size: int = HTTP_POOL_SIZE, enable_compression: bool = ENABLE_COMPRESSION):
+    """Closes the current shared session; the next request builds one with the new settings."""
+    global _session, _session_pool_size, _session_compression
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _session_pool_size = max(1, pool_size)
+        _session_compression = enable_compression
+
+def get_connection_stats():
+    """Returns {'requests', 'new_connections', 'reused_connections'} for the shared session."""
+    return _connection_stats.snapshot()
+
+def http_get(url: str, headers: dict, timeout: int):
+    """
+    Single entry point for scraper GET requests. Uses the pooled keep-alive session, unless
+    requests.get has been replaced (e.g. by unittest.mock.patch), in which case the call is
+    routed through it so existing patches keep intercepting every request.
+    """
+    if requests.get is not _DEFAULT_REQUESTS_GET:
+        return requests.get(url, headers=headers, timeout=timeout)
+    return get_session().get(url, headers=headers, timeout=timeout)
+
+# --- Response Cache ---
+_response_cache = None # Disabled unless configure_response_cache() is called (the __main__ run enables it)
+
+def configure_response_cache(cache: ResponseCache | None):
+    """Installs (or with None, removes) the on-disk response cache used by make_request_with_retry."""
+    global _response_cache
+    _response_cache = cache
+
+# --- Incremental Scraping Manifest ---
+_club_manifest = None # Disabled unless configure_club_manifest() is called (the __main__ run's --incremental flag)
+
+def configure_club_manifest(manifest: ClubManifest | None):
+    """Installs (or with None, removes) the per-club roster manifest used to skip unchanged clubs."""
+    global _club_manifest
+    _club_manifest = manifest
+
 # --- Robust Request Function ---
 def make_request_with_retry(url: str, headers: dict, timeout: int, retries: int = MAX_RETRIES, delay_base: int = RETRY_DELAY_BASE):
-    """Makes a GET request with a retry mechanism and exponential backoff."""
+    """
+    Makes a GET request with retries, decorrelated-jitter backoff and a per-endpoint circuit breaker.
+    Only timeouts, connection errors and RETRYABLE_STATUS_CODES are retried; other 4xx responses
+    are raised immediately. 429/503 slow down the shared rate limiter and honour Retry-After.
+    With a response cache installed, fresh entries are returned without any network call and
+    stale ones are revalidated with a conditional request (a 304 serves the cached body).
+    """
+    cache = _response_cache
+    cached = None
+    if cache is not None:
+        cached = cache.lookup(url)
+        if cached is not None and (cache.offline or cached.is_fresh()):
+            return cached.to_response()
+        if cache.offline:
+            raise requests.exceptions.ConnectionError(f"Offline mode: no cached response for {url}")
+        if cached is not None:
+            headers = {**headers, **cached.conditional_headers()}
+
+    breaker = get_circuit_breaker(url)
     last_exception = None
+    delay = delay_base
     for attempt in range(retries):
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"Circuit open for endpoint {breaker.endpoint}; not requesting {url}")
+        retry_after = None
         try:
-            response = requests.get(url, headers=headers, timeout=timeout)
+            response = _throttled_get(url, headers=headers, timeout=timeout)
             response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
+            _rate_limiter.on_success()
+            breaker.record_success()
+            if cache is not None:
+                if response.status_code == 304 and cached is not None:
+                    cache.mark_revalidated(url, response)
+                    return cached.to_response()
+                cache.store(url, response)
             return response
+        except requests.exceptions.HTTPError as e:
+            status_code = e.response.status_code if e.response is not None else None
+            if status_code is not None and status_code not in RETRYABLE_STATUS_CODES:
+                # The endpoint is healthy, this particular request is just bad (e.g. 404 for one club)
+                breaker.record_success()
+                print(f"Request failed for {url} with non-retryable status {status_code}: {e}. Not retrying.")
+                raise
+            last_exception = e
+            breaker.record_failure()
+            if status_code in (429, 503):
+                retry_after = _parse_retry_after(e.response.headers.get('Retry-After'))
+                _rate_limiter.on_throttle(retry_after)
+            failure_message = f"Request failed on attempt {attempt + 1}/{retries} for {url}: {e}."
         except requests.exceptions.Timeout as e:
             last_exception = e
-            print(f"Timeout on attempt {attempt + 1}/{retries} for {url}. Retrying in {delay_base * (attempt + 1)}s...")
-            time.sleep(delay_base * (attempt + 1))
-        except requests.exceptions.RequestException as e: # Catches ConnectionError, HTTPError, etc.
+            breaker.record_failure()
+            failure_message = f"Timeout on attempt {attempt + 1}/{retries} for {url}."
+        except requests.exceptions.RequestException as e: # Catches ConnectionError, etc.
             last_exception = e
-            print(f"Request failed on attempt {attempt + 1}/{retries} for {url}: {e}. Retrying in {delay_base * (attempt + 1)}s...")
-            time.sleep(delay_base * (attempt + 1))
-        
+            breaker.record_failure()
+            failure_message = f"Request failed on attempt {attempt + 1}/{retries} for {url}: {e}."
+
         if attempt == retries - 1: # Last attempt failed
-            print(f"All {retries} retries failed for {url}.")
-            if last_exception:
-                raise last_exception # Re-raise the last caught exception
-            else:
-                # This case should ideally not be reached if retries > 0,
-                # as an exception should have been caught.
-                # For safety, raise a generic error.
-                raise requests.exceptions.RequestException(f"All {retries} retries failed for {url} without a specific exception.")
+            print(f"{failure_message} All {retries} retries failed for {url}.")
+            raise last_exception # Re-raise the last caught exception
+
+        # Decorrelated jitter: the next delay is random in [base, 3 * previous], capped
+        delay = min(RETRY_DELAY_CAP, random.uniform(delay_base, delay * 3))
+        if retry_after:
+            delay = max(delay, retry_after) # Already capped at RETRY_DELAY_CAP by _parse_retry_after
+        print(f"{failure_message} Retrying in {delay:.1f}s...")
+        time.sleep(delay)
     return None # Should only be reached if retries = 0
 
+def _parse_retry_after(value):
+    """
+    Parses a Retry-After header (delta-seconds or HTTP-date) into seconds, or None.
+    The result is clamped to [0, RETRY_DELAY_CAP]: a huge (or 'inf') value would otherwise stall the
+    retry sleep and the shared rate limiter's pause indefinitely; repeated 429s trip the circuit breaker instead.
+    """
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at is None:
+            return None
+        seconds = retry_at.timestamp() - time.time()
+    if seconds != seconds: # NaN
+        return None
+    return min(RETRY_DELAY_CAP, max(0.0, seconds))
+
 
 # --- Helper for Club Extraction ---
 def _extract_clubs_from_response(response_data: dict | list, league_name: str, url_attempted: str):
@@ -121,9 +545,94 @@ def _extract_clubs_from_response(response_data: dict | list, league_name: str, u
     return extracted_clubs # Returns list of clubs (can be empty) or None if structure not found
 
 
+# --- Helper for Per-Club Player Fetching ---
+def _fetch_club_players(league_name: str, club: dict, club_index: int, total_clubs: int):
+    """
+    Fetches the player list for one club and converts each player into a PlayerRecord.
+    Safe to call from worker threads: all output for a club is printed as whole lines.
+    Returns a list of PlayerRecords (empty if the club was skipped or has no players).
+    """
+    club_id = club.get('id')
+    club_name = club.get('name', 'Unknown Club')
+    if not club_id:
+        print(f"Warning: [{league_name}] Skipping club with missing ID: {club}")
+        return []
+
+    progress_prefix = f"  [{league_name}] Fetching players for \"{club_name}\" ({club_index}/{total_clubs})..."
+    manifest = _club_manifest
+    if manifest is not None:
+        cached_players = manifest.get_fresh_roster(club_id)
+        if cached_players is not None:
+            print(f"{progress_prefix} Reused {len(cached_players)} players from manifest.")
+            return [PlayerRecord.from_api(player, club_name) for player in cached_players]
+
+    players_url = f"{API_BASE_URL}/clubs/{club_id}/players"
+    players_response = None
+    try:
+        players_response = make_request_with_retry(players_url, headers=HEADERS, timeout=REQUEST_TIMEOUT_PLAYERS)
+        # If make_request_with_retry re-raises, this part won't be reached on failure.
+        player_data = players_response.json()
+    except requests.exceptions.RequestException as e: # Catches re-raised from make_request_with_retry
+        print(f"{progress_prefix}\nWarning: [{league_name}] Error fetching players for {club_name} (ID: {club_id}): {e}. Skipping club.")
+        return []
+    except requests.exceptions.JSONDecodeError as e_json_players:
+        print(f"{progress_prefix}\nWarning: [{league_name}] Error decoding player JSON for {club_name} (ID: {club_id}): {e_json_players}")
+        if players_response:
+            print(f"  Player Response text sample: {players_response.text[:200]}")
+        return []
+
+    # Structure based on screenshot: {'players': [...]} or similar
+    current_club_players = None
+    players_source_key = None # To log where players were found
+
+    # 1. Check if player_data is a dictionary and if player_data.get('players') is a list.
+    if isinstance(player_data, dict) and 'players' in player_data:
+        if isinstance(player_data['players'], list):
+            current_club_players = player_data['players']
+            players_source_key = "'players'"
+        # If 'players' key exists but is not a list, it's an unexpected structure for this primary key.
+        # We will then fall through to check other keys or if player_data itself is a list.
+
+    # 2. Else, if player_data itself is a list, use it.
+    if current_club_players is None and isinstance(player_data, list):
+        current_club_players = player_data
+        players_source_key = "root list"
+
+    # 3. Else, if player_data is a dictionary and players not found yet, iterate through its values.
+    if current_club_players is None and isinstance(player_data, dict):
+        for key, value in player_data.items():
+            if key == 'players': # Already checked above, skip
+                continue
+            if isinstance(value, list):
+                current_club_players = value
+                players_source_key = f"'{key}'"
+                progress_prefix += f" (using key {players_source_key})"
+                break
+
+    # 4. If none of the above, then it means no players were found or the structure is unexpected.
+    if current_club_players is None:
+        # This means no list of players was found anywhere.
+        # Could be an error in API response, or genuinely 0 players and API sends e.g. {} or {'players': null}
+        print(f"{progress_prefix}\nWarning: [{league_name}] Could not find a list of players for {club_name} (ID: {club_id}). Response sample: {str(player_data)[:100]}...")
+        return [] # Assume 0 players and continue, or one could choose to skip the club.
+
+    # Only print "Found X players" if we successfully identified a player list.
+    print(f"{progress_prefix} Found {len(current_club_players)} players" + (f" in {players_source_key}." if players_source_key != "'players'" else "."))
+
+    # Keep the raw player dicts only until they have been turned into compact records
+    club_players = []
+    for player in current_club_players:
+        if isinstance(player, dict): # Make sure player entries are dicts
+            club_players.append(player)
+        else:
+            print(f"Warning: [{league_name}] Unexpected item in player list for {club_name}: {str(player)[:100]}. Skipping item.")
+    if manifest is not None:
+        manifest.record_roster(club_id, club_name, club_players) # The manifest keeps the raw API roster
+    return [PlayerRecord.from_api(player, club_name) for player in club_players]
+
+
 # --- Main Data Fetching Function ---
-def get_top_league_players_by_value(league_name: str, league_code: str, num_players: int = 100):
-    league_all_players = []
+def get_top_league_players_by_value(league_name: str, league_code: str, num_players: int = 100, max_workers: int = MAX_CONCURRENT_REQUESTS):
     print(f"[{league_name}] Fetching competition details to find clubs...")
 
     clubs = None
@@ -177,164 +686,216 @@ def get_top_league_players_by_value(league_name: str, league_code: str, num_play
 
     print(f"[{league_name}] Found {len(clubs)} clubs. Fetching players for each club (this may take a while)...")
 
-    # 2. Get players for each club (This part remains unchanged from before)
-    club_count = 0
-    for club in clubs:
-        club_count += 1
-        club_id = club.get('id')
-        club_name = club.get('name', 'Unknown Club')
-        if not club_id:
-            print(f"Warning: [{league_name}] Skipping club with missing ID: {club}")
-            continue
-
-        print(f"  [{league_name}] Fetching players for \"{club_name}\" ({club_count}/{len(clubs)})...", end='')
-        players_url = f"{API_BASE_URL}/clubs/{club_id}/players"
-        players_response = None
-        try:
-            players_response = make_request_with_retry(players_url, headers=HEADERS, timeout=REQUEST_TIMEOUT_PLAYERS)
-            # If make_request_with_retry re-raises, this part won't be reached on failure.
-            player_data = players_response.json()
-
-            # Structure based on screenshot: {'players': [...]} or similar
-            current_club_players = None
-            players_source_key = None # To log where players were found
-
-            # 1. Check if player_data is a dictionary and if player_data.get('players') is a list.
-            if isinstance(player_data, dict) and 'players' in player_data:
-                if isinstance(player_data['players'], list):
-                    current_club_players = player_data['players']
-                    players_source_key = "'players'"
-                # If 'players' key exists but is not a list, it's an unexpected structure for this primary key.
-                # We will then fall through to check other keys or if player_data itself is a list.
-            
-            # 2. Else, if player_data itself is a list, use it.
-            if current_club_players is None and isinstance(player_data, list):
-                current_club_players = player_data
-                players_source_key = "root list"
-
-            # 3. Else, if player_data is a dictionary and players not found yet, iterate through its values.
-            if current_club_players is None and isinstance(player_data, dict):
-                for key, value in player_data.items():
-                    if key == 'players': # Already checked above, skip
-                        continue
-                    if isinstance(value, list):
-                        current_club_players = value
-                        players_source_key = f"'{key}'"
-                        print(f" (using key {players_source_key})", end='')
-                        break
-            
-            # 4. If none of the above, then it means no players were found or the structure is unexpected.
-            if current_club_players is None:
-                # This means no list of players was found anywhere.
-                # Could be an error in API response, or genuinely 0 players and API sends e.g. {} or {'players': null}
-                print(f"\nWarning: [{league_name}] Could not find a list of players for {club_name} (ID: {club_id}). Response sample: {str(player_data)[:100]}...")
-                current_club_players = [] # Assume 0 players and continue, or one could choose to skip the club.
-            
-            if players_source_key and current_club_players is not None:
-                 # Only print "Found X players" if we successfully identified a player list.
-                 # If current_club_players is an empty list [], len() is 0.
-                 print(f" Found {len(current_club_players)} players" + (f" in {players_source_key}." if players_source_key != "'players'" else "."))
-
-
-            # Add club name and store raw player data
-            player_count_for_club = 0
-            if current_club_players: # Ensure it's not None and is a list (even if empty)
-                for player in current_club_players:
-                    if isinstance(player, dict): # Make sure player entries are dicts
-                        player['clubName'] = club_name # Add team context
-                        league_all_players.append(player)
-                        player_count_for_club += 1
-                    else:
-                        print(f"\nWarning: [{league_name}] Unexpected item in player list for {club_name}: {str(player)[:100]}. Skipping item.")
-            
-            # No need to print "Found X players" again here, it's covered above or implicitly by lack of players.
-            # if player_count_for_club > 0:
-            #      print(f" Found {player_count_for_club} players.")
-
-
-            time.sleep(CLUB_REQUEST_DELAY) # Delay between club requests
-
-        except requests.exceptions.RequestException as e: # Catches re-raised from make_request_with_retry
-            print(f"\nWarning: [{league_name}] Error fetching players for {club_name} (ID: {club_id}): {e}. Skipping club.")
-            # time.sleep(1.0) # Longer delay on error - retry logic handles delays
-            continue
-        except requests.exceptions.JSONDecodeError as e_json_players:
-            print(f"\nWarning: [{league_name}] Error decoding player JSON for {club_name} (ID: {club_id}): {e_json_players}")
-            if players_response:
-                 print(f"  Player Response text sample: {players_response.text[:200]}")
-            continue
-
-    if not league_all_players:
+    # 2-5. Stream the league through the pipeline: rosters are fetched concurrently (in club order),
+    # flattened, reduced to the top N on the fly, and only the survivors are formatted.
+    # Peak memory is the in-flight rosters plus the top-N heap, not the whole league.
+    pipeline_stats = {'players': 0}
+    rosters = iter_club_rosters(league_name, league_code, clubs, max_workers)
+    top_players_raw = select_top_players(iter_players(rosters, pipeline_stats), num_players, value_key=attrgetter('market_value'))
+
+    if not top_players_raw:
         print(f"[{league_name}] No players collected for any club.")
         return []
 
-    print(f"[{league_name}] Collected {len(league_all_players)} total players. Sorting by market value...")
-
-    # 3. Sort all players by market value
-    # Handle None values in sort key: treat None as negative infinity for descending sort (None will be last)
-    league_all_players.sort(key=lambda p: get_market_value_int(p) if get_market_value_int(p) is not None else float('-inf'), reverse=True)
+    print(f"[{league_name}] Collected {pipeline_stats['players']} total players. "
+          f"Extracting details for top {len(top_players_raw)} players by market value...")
 
-    # 4. Get top N players
-    top_players_raw = league_all_players[:num_players]
+    final_players_data = list(iter_output_rows(league_name, top_players_raw))
 
-    print(f"[{league_name}] Extracting details for top {len(top_players_raw)} players...")
+    print(f"[{league_name}] Finished processing.")
+    return final_players_data
 
-    # 5. Format final output list
-    final_players_data = []
-    for player in top_players_raw:
-        market_val_int = get_market_value_int(player)
-        player_id = player.get('id') # *** CONFIRM THIS KEY ('id', 'playerID', etc.) ***
-        if player_id is None:
-             print(f"Warning: Skipping player with missing ID in raw data: {player.get('name')}")
+# --- Streaming Pipeline Stages ---
+def iter_club_rosters(league_name: str, league_code: str, clubs: list, max_workers: int = MAX_CONCURRENT_REQUESTS):
+    """
+    Fetch stage: yields each club's player list, in club order, as soon as it is available.
+    Rosters are fetched on a bounded worker pool; every request still goes through the shared
+    rate limiter, so wall time scales with MAX_REQUESTS_PER_SECOND rather than with the sum
+    of per-club latencies. executor.map preserves input order, so the stream matches a
+    sequential run exactly.
+    """
+    total_clubs = len(clubs)
+    if total_clubs == 0:
+        return
+    max_workers = max(1, min(max_workers, total_clubs))
+    club_jobs = [(league_name, club, index, total_clubs) for index, club in enumerate(clubs, start=1)]
+    if max_workers == 1:
+        for job in club_jobs:
+            yield _fetch_club_players(*job)
+        return
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"clubs-{league_code}") as executor:
+        yield from executor.map(lambda job: _fetch_club_players(*job), club_jobs)
+
+def iter_players(rosters, stats: dict | None = None):
+    """Extract stage: flattens club rosters into a single stream of PlayerRecords, counting them in stats['players']."""
+    for club_players in rosters:
+        for player in club_players:
+            if stats is not None:
+                stats['players'] += 1
+            yield player
+
+def iter_output_rows(league_name: str, top_players):
+    """Normalize stage: turns (market_value_int, PlayerRecord) pairs from select_top_players into output rows."""
+    for _market_val_int, record in top_players:
+        if record.player_id is None:
+             print(f"Warning: Skipping player with missing ID in raw data: {record.name}")
              continue # Skip players without an ID
-             
-        final_players_data.append({
-            # *** ADD player_id HERE ***
-            'player_id': player_id, 
-            'League': league_name,
-            'Name': player.get('name', 'N/A'),
-            'Position': player.get('position', 'N/A'),
-            'Team': player.get('clubName', 'N/A'), 
-            'Age': calculate_age(player.get('dateOfBirth')), 
-            'Market Value': format_market_value(market_val_int),
-            'Market Value Int': market_val_int # Also save the integer value for easier sorting in API
-        })
+        yield record.to_output_row(league_name)
 
-    print(f"[{league_name}] Finished processing.")
-    return final_players_data
+class CsvPlayerSink:
+    """
+    Write stage: appends output rows to a CSV file and flushes after every batch, so the rows of
+    each finished league are on disk even if a later league crashes the run.
+    The file is only created once the first row arrives; the header comes from that row's keys.
+    Matches the old whole-file DataFrame.to_csv output, except that a missing Age or Market Value
+    Int no longer turns that column's other values into floats (24 stays 24, not 24.0).
+    Any object with write_rows(rows) -> int and close() can be used as a sink instead.
+    """
+    def __init__(self, path: str, encoding: str = 'utf-8'):
+        self.path = path
+        self.encoding = encoding
+        self.rows_written = 0
+        self._file = None
+        self._writer = None
+
+    def write_rows(self, rows):
+        count = 0
+        for row in rows:
+            if self._writer is None:
+                self._file = open(self.path, 'w', newline='', encoding=self.encoding)
+                self._writer = csv.DictWriter(self._file, fieldnames=list(row.keys()), lineterminator=os.linesep)
+                self._writer.writeheader()
+            self._writer.writerow(row)
+            count += 1
+        if self._file is not None:
+            self._file.flush()
+        self.rows_written += count
+        return count
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+# --- Multi-League Orchestrator ---
+def _timed_league_fetch(league_name: str, league_code: str, num_players: int):
+    """Runs get_top_league_players_by_value for one league and returns (players, duration_seconds)."""
+    league_start_time = time.time()
+    top_players = get_top_league_players_by_value(league_name, league_code, num_players)
+    return top_players, time.time() - league_start_time
+
+def iter_league_results(leagues: dict, num_players: int = 100, max_parallel_leagues: int = MAX_PARALLEL_LEAGUES):
+    """
+    Fetches the top players of several leagues concurrently. All leagues draw on the same
+    request budget (rate limiter + in-flight slots), so running them in parallel does not
+    increase the load on the API, it only overlaps the waiting.
+    Yields (league_name, players, duration_seconds) in the iteration order of `leagues` as soon
+    as each league (and every league before it) has finished, so output written per league is
+    identical to processing them one after another.
+    """
+    league_items = list(leagues.items())
+    if not league_items:
+        return
+
+    max_parallel_leagues = max(1, min(max_parallel_leagues, len(league_items)))
+    with ThreadPoolExecutor(max_workers=max_parallel_leagues, thread_name_prefix="league") as executor:
+        futures = [executor.submit(_timed_league_fetch, name, code, num_players) for name, code in league_items]
+        for (name, _code), future in zip(league_items, futures):
+            top_players, league_duration = future.result()
+            print(f"[{name}] Processing took {league_duration:.2f} seconds.")
+            yield name, top_players, league_duration
+
+def scrape_leagues(leagues: dict, num_players: int = 100, max_parallel_leagues: int = MAX_PARALLEL_LEAGUES):
+    """
+    Collects iter_league_results into one list.
+    Returns (all_players, league_durations) where league_durations maps league name -> seconds.
+    """
+    all_players = []
+    league_durations = {}
+    for name, top_players, league_duration in iter_league_results(leagues, num_players, max_parallel_leagues):
+        all_players.extend(top_players)
+        league_durations[name] = league_duration
+    return all_players, league_durations
 
 # --- Main execution block ---
 if __name__ == "__main__":
-    all_leagues_top_players = []
+    parser = argparse.ArgumentParser(description="Scrape the most valuable players of the top European leagues.")
+    parser.add_argument("--offline", action="store_true",
+                        help="Replay responses from the local cache only; never touch the network.")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the on-disk response cache.")
+    parser.add_argument("--cache-file", default=DEFAULT_CACHE_FILE, help="Path of the SQLite response cache.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only re-fetch clubs whose stored roster is older than --refresh-hours.")
+    parser.add_argument("--manifest-file", default=DEFAULT_MANIFEST_FILE, help="Path of the per-club roster manifest.")
+    parser.add_argument("--refresh-hours", type=float, default=CLUB_REFRESH_INTERVAL_HOURS,
+                        help="Age after which a club's roster is considered stale in --incremental mode.")
+    parser.add_argument("--max-concurrent-requests", type=int, default=MAX_CONCURRENT_REQUESTS,
+                        help="Maximum number of HTTP requests in flight at once.")
+    parser.add_argument("--requests-per-second", type=float, default=MAX_REQUESTS_PER_SECOND,
+                        help="Global request rate limit (0 disables it, e.g. against a local mock server).")
+    args = parser.parse_args()
+
+    configure_request_budget(args.max_concurrent_requests, args.requests_per_second)
+    configure_http_session(pool_size=args.max_concurrent_requests)
+
+    response_cache = None
+    if args.offline and args.no_cache:
+        parser.error("--offline requires the response cache; drop --no-cache.")
+    if not args.no_cache:
+        response_cache = ResponseCache(args.cache_file, offline=args.offline)
+        configure_response_cache(response_cache)
+
+    club_manifest = None
+    if args.incremental:
+        club_manifest = ClubManifest(args.manifest_file, refresh_interval_hours=args.refresh_hours)
+        configure_club_manifest(club_manifest)
+
     num_players_per_league = 100
 
     start_total_time = time.time()
 
-    for name, code in LEAGUES.items():
-        league_start_time = time.time()
-        # Call the updated function
-        top_players = get_top_league_players_by_value(name, code, num_players_per_league)
-        all_leagues_top_players.extend(top_players)
-        league_duration = time.time() - league_start_time
-        print(f"[{name}] Processing took {league_duration:.2f} seconds.")
-        # Add a small delay between leagues if needed
-        time.sleep(LEAGUE_REQUEST_DELAY)
+    # Use a new filename to avoid confusion
+    output_filename = "top_players_by_market_value_api_v2.csv"
+    sink = CsvPlayerSink(output_filename)
+    sample_rows = [] # Only the first few rows are kept in memory, for the preview below
+    sink_error = None
+    try:
+        for _name, top_players, _duration in iter_league_results(LEAGUES, num_players_per_league):
+            sample_rows.extend(top_players[:max(0, 10 - len(sample_rows))])
+            if sink_error is None:
+                try:
+                    sink.write_rows(top_players)
+                except Exception as e:
+                    sink_error = e
+                    print(f"\nError saving data to CSV: {e}")
+            if club_manifest is not None:
+                club_manifest.save() # Per league, so an interrupted run keeps the rosters it already fetched
+    finally:
+        sink.close()
+        if club_manifest is not None:
+            club_manifest.save()
 
     total_duration = time.time() - start_total_time
     print(f"\nTotal execution time: {total_duration:.2f} seconds.")
-
-    if not all_leagues_top_players:
+    connection_stats = get_connection_stats()
+    print(f"HTTP requests: {connection_stats['requests']} "
+          f"(new connections: {connection_stats['new_connections']}, reused: {connection_stats['reused_connections']})")
+    if club_manifest is not None:
+        manifest_stats = club_manifest.stats()
+        print(f"Clubs: {manifest_stats['reused']} reused from manifest, {manifest_stats['refetched']} re-fetched "
+              f"({manifest_stats['changed']} changed, {manifest_stats['unchanged']} unchanged)")
+    if response_cache is not None:
+        cache_stats = response_cache.stats()
+        print(f"Response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+              f"{cache_stats['revalidated']} revalidated, {cache_stats['entries']} entries ({cache_stats['bytes']:,} bytes)")
+
+    if not sample_rows:
         print("\nNo players were collected overall. Please check API availability, endpoints, league codes, and club/player data structure in API responses.")
     else:
-        # Convert to DataFrame and save
-        df = pd.DataFrame(all_leagues_top_players)
         print("\n--- Sample Data (First 10 rows) ---")
-        print(df.head(10))
+        print(pd.DataFrame(sample_rows).head(10))
 
-        # Use a new filename to avoid confusion
-        output_filename = "top_players_by_market_value_api_v2.csv"
-        try:
-            df.to_csv(output_filename, index=False, encoding='utf-8')
-            print(f"\nSuccessfully saved data for {len(all_leagues_top_players)} players to {output_filename}")
-        except Exception as e:
-            print(f"\nError saving data to CSV: {e}") 
\ No newline at end of file
+        if sink_error is None:
+            print(f"\nSuccessfully saved data for {sink.rows_written} players to {output_filename}")
+    if response_cache is not None:
+        response_cache.close()
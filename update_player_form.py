@@ -7,6 +7,7 @@ import pandas as pd
 from datetime import datetime, timedelta
 import time
 import warnings 
+from load_data import bump_data_version # Invalidates the API's cached responses after an update
 
 # Suppress specific pandas warnings if they become noisy, use with caution
 # warnings.filterwarnings('ignore', category=FutureWarning)
@@ -335,6 +336,8 @@ if __name__ == "__main__":
         print("------------------------------------")
         time.sleep(1.0) # Be respectful to FotMob API - adjust as needed
 
+    if updated_count:
+        bump_data_version(conn)
     conn.close()
     end_time = time.time()
     print(f"\nForm update process finished at {datetime.now()}")
@@ -0,0 +1,16 @@
+"""
+Production WSGI entry point for the Transfermarkt Data API.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gunicorn.conf.py sizes the worker processes/threads and can be tuned with environment variables
+(API_BIND, API_WORKERS, API_THREADS, ...). Point the API at a database with TRANSFERMARKT_DB.
+It also routes the api loggers (sampled request lines, slow queries) to stderr at API_LOG_LEVEL.
+
+Every worker process gets its own read-only SQLite connection pool and response cache; both are
+created lazily after the fork, and the loaders' data_version bump invalidates each worker's cache
+on its own, so workers need no coordination with each other.
+"""
+from api import app
+
+application = app # The name most WSGI servers look for by default